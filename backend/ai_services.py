@@ -1,39 +1,59 @@
 # ai_services.py (New "Deep Dive" Version)
 
 import os
-import google.generativeai as genai
-from typing import Dict, List, Any
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple
 from dotenv import load_dotenv
+import asyncio
 import json
-import re
+import time
+from collections import Counter, deque
+
+import schemas
+from feedback_cache import feedback_cache, make_feedback_key
+from llm_scheduler import llm_scheduler, model_label
+from llm_json import FeedbackStreamParser, SCORE_FIELDS, extract_json_object, salvage_feedback
+from providers import generative_model
 
 load_dotenv()
 
+# Feedback models in order of preference; later entries are hedges/fallbacks.
+FEEDBACK_MODEL_CHAIN = [
+    name.strip() for name in os.getenv("FEEDBACK_MODEL_CHAIN", "gemini-1.5-flash,gemini-1.5-flash-8b").split(",") if name.strip()
+]
+MODEL_NAME = FEEDBACK_MODEL_CHAIN[0]
+# Bump whenever the feedback prompt changes so cached results are not reused.
+PROMPT_VERSION = "deep-dive-v1"
+
+# Conversations with at least this many answers are analysed per batch, concurrently.
+FEEDBACK_FANOUT_MIN_ANSWERS = int(os.getenv("FEEDBACK_FANOUT_MIN_ANSWERS", "6"))
+FEEDBACK_FANOUT_BATCH_SIZE = int(os.getenv("FEEDBACK_FANOUT_BATCH_SIZE", "1"))
+FEEDBACK_FANOUT_CONCURRENCY = int(os.getenv("FEEDBACK_FANOUT_CONCURRENCY", "8"))
+
+# Hard deadline for one model's attempt, and the bounds of the adaptive hedge delay.
+# The hedge fires at the p95 of recent primary latencies, clamped to [min, max].
+FEEDBACK_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("FEEDBACK_ATTEMPT_TIMEOUT_SECONDS", "45"))
+FEEDBACK_HEDGE_MIN_SECONDS = float(os.getenv("FEEDBACK_HEDGE_MIN_SECONDS", "8"))
+FEEDBACK_HEDGE_MAX_SECONDS = float(os.getenv("FEEDBACK_HEDGE_MAX_SECONDS", "20"))
+FEEDBACK_HEDGE_MIN_SAMPLES = 20
+
 try:
-    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-    model = genai.GenerativeModel('gemini-1.5-flash')
+    models = {name: generative_model(name) for name in FEEDBACK_MODEL_CHAIN}
+    model = models[MODEL_NAME]
 except Exception as e:
     print(f"❌ AI Service Error: Failed to configure Google AI. Check API Key. Error: {e}")
+    models = {}
     model = None
 
-def clean_json_response(text: str) -> str:
-    start = text.find('{')
-    end = text.rfind('}')
-    if start == -1 or end == -1: return "{}"
-    json_str = text[start:end+1]
-    json_str = re.sub(r',\s*([}\]])', r'\1', json_str)
-    return json_str
+_primary_latencies: deque = deque(maxlen=200)
+served_by: Counter = Counter()
 
-async def get_ai_final_feedback(conversation: List[Dict[str, Any]]) -> Dict:
-    if not model:
-        # Return a structure that matches the new schema
-        return { "overall_band_score": 0, "fluency_score": 0, "lexical_score": 0, "grammar_score": 0, "pronunciation_score": 0, "general_summary": "AI service is not configured.", "answer_analyses": [] }
+def error_feedback(summary: str) -> Dict:
+    """A zero-score response that matches the FeedbackResponse schema."""
+    return { "overall_band_score": 0, "fluency_score": 0, "lexical_score": 0, "grammar_score": 0, "pronunciation_score": 0, "general_summary": summary, "answer_analyses": [] }
+
+def build_feedback_prompt(conversation: List[Dict[str, Any]]) -> str:
+    transcript = build_transcript(conversation)
 
-    transcript = "\n".join([
-        f"Examiner: {msg.get('question', 'N/A')}\nStudent: {msg.get('answer', 'N/A')}"
-        for msg in conversation
-    ])
-    
     # --- The New, "Deep Dive" Prompt ---
     prompt = f"""
     You are an expert IELTS examiner providing a detailed, sentence-by-sentence analysis of a student's performance.
@@ -80,13 +100,333 @@ async def get_ai_final_feedback(conversation: List[Dict[str, Any]]) -> Dict:
     2.  For "grammar_feedback" and "vocabulary_feedback", if you find NO errors or areas for improvement for a specific answer, you MUST return an empty array: [].
     3.  DO NOT invent errors. If the grammar or vocabulary is perfect for an answer, the corresponding arrays should be empty.
     """
+    return prompt
+
+def build_transcript(conversation: List[Dict[str, Any]]) -> str:
+    return "\n".join([
+        f"Examiner: {msg.get('question', 'N/A')}\nStudent: {msg.get('answer', 'N/A')}"
+        for msg in conversation
+    ])
+
+def build_scores_prompt(conversation: List[Dict[str, Any]]) -> str:
+    """Band scores and summary only; the per-answer analyses are requested separately."""
+    return f"""
+    You are an expert IELTS examiner. Score the student's overall performance in the following transcript.
+
+    --- TRANSCRIPT ---
+    {build_transcript(conversation)}
+    --- END TRANSCRIPT ---
+
+    Your task is to return ONLY a JSON object with the following structure. Do not include any text before or after the JSON.
+
+    {{
+      "overall_band_score": <float from 4.0-9.0>,
+      "fluency_score": <integer from 4-9>,
+      "lexical_score": <integer from 4-9>,
+      "grammar_score": <integer from 4-9>,
+      "pronunciation_score": <integer from 4-9>,
+      "general_summary": "<A concise summary of the student's overall performance.>"
+    }}
+    """
+
+def build_analysis_prompt(batch: List[Dict[str, Any]]) -> str:
+    """Sentence-level analysis for a small batch of question/answer pairs."""
+    return f"""
+    You are an expert IELTS examiner providing a detailed, sentence-by-sentence analysis of a student's answers.
+    Analyze ONLY the following question and answer pairs.
+
+    --- TRANSCRIPT ---
+    {build_transcript(batch)}
+    --- END TRANSCRIPT ---
+
+    Your task is to return ONLY a JSON object with the following structure. Do not include any text before or after the JSON.
+
+    {{
+      "answer_analyses": [
+        {{
+          "question": "<The examiner question>",
+          "answer": "<The student's full answer>",
+          "grammar_feedback": [
+            {{
+              "sentence": "<The specific sentence from the student's answer with a grammatical error>",
+              "feedback": "<A brief explanation of the error (e.g., 'Incorrect verb tense')>",
+              "suggestion": "<The corrected version of the sentence>"
+            }}
+          ],
+          "vocabulary_feedback": [
+            {{
+              "sentence": "<The specific sentence where vocabulary could be improved>",
+              "feedback": "<Explanation of why it could be improved (e.g., 'Repetitive word choice')>",
+              "suggestion": "<The same sentence but with more advanced or appropriate vocabulary>"
+            }}
+          ],
+          "fluency_feedback": "<A brief comment on the fluency and coherence of this specific answer>"
+        }}
+      ]
+    }}
+
+    VERY IMPORTANT INSTRUCTIONS:
+    1.  Return exactly {len(batch)} entries in "answer_analyses", one per question and answer pair, in the same order.
+    2.  For "grammar_feedback" and "vocabulary_feedback", if you find NO errors or areas for improvement for a specific answer, you MUST return an empty array: [].
+    3.  DO NOT invent errors. If the grammar or vocabulary is perfect for an answer, the corresponding arrays should be empty.
+    """
+
+async def _generate_json(llm: Any, prompt: str) -> Dict:
+    response = await llm_scheduler.generate(llm, prompt)
+    return extract_json_object(response.text)
+
+async def _analyse_batch(llm: Any, batch: List[Dict[str, Any]], semaphore: asyncio.Semaphore) -> List[Dict]:
+    async with semaphore:
+        data = await _generate_json(llm, build_analysis_prompt(batch))
+    analyses = data.get("answer_analyses", [])
+    if len(analyses) != len(batch):
+        raise ValueError(f"Expected {len(batch)} answer analyses, got {len(analyses)}")
+    results = []
+    for msg, analysis in zip(batch, analyses):
+        # Keep the original wording; the model sometimes paraphrases the pair.
+        analysis["question"] = msg.get("question", "")
+        analysis["answer"] = msg.get("answer", "")
+        results.append(schemas.AnswerAnalysis.model_validate(analysis).model_dump())
+    return results
+
+def _normalize(text: Any) -> str:
+    return " ".join(str(text).split()).lower()
+
+def _align_analyses(conversation: List[Dict[str, Any]], analyses: List[Optional[Dict]]) -> List[Optional[Dict]]:
+    """
+    Maps salvaged analyses onto conversation slots, by question text first and
+    by position when the counts line up. Unmatched slots stay None.
+    """
+    by_question: Dict[str, List[int]] = {}
+    for index, analysis in enumerate(analyses):
+        if analysis is not None:
+            by_question.setdefault(_normalize(analysis["question"]), []).append(index)
+
+    used = set()
+    aligned: List[Optional[Dict]] = []
+    for position, msg in enumerate(conversation):
+        candidates = [i for i in by_question.get(_normalize(msg.get("question", "")), []) if i not in used]
+        if candidates:
+            index = candidates[0]
+        elif len(analyses) == len(conversation) and analyses[position] is not None and position not in used:
+            index = position
+        else:
+            aligned.append(None)
+            continue
+        used.add(index)
+        aligned.append(analyses[index])
+    return aligned
+
+async def _fill_missing(
+    llm: Any, conversation: List[Dict[str, Any]], scores: Dict, analyses: List[Optional[Dict]]
+) -> Dict:
+    """
+    Re-requests only what is missing: the scoring prompt when no valid scores
+    were salvaged, and per-batch analysis prompts for the empty slots.
+    """
+    semaphore = asyncio.Semaphore(FEEDBACK_FANOUT_CONCURRENCY)
+    size = max(1, FEEDBACK_FANOUT_BATCH_SIZE)
+    missing = [i for i, analysis in enumerate(analyses) if analysis is None]
+    batches = [missing[i:i + size] for i in range(0, len(missing), size)]
+
+    async def rescore():
+        async with semaphore:
+            return await _generate_json(llm, build_scores_prompt(conversation))
+
+    if missing or not scores:
+        print(f"ℹ️ AI Service Info: Re-requesting {len(missing)} answer analyses{' and scores' if not scores else ''}.")
+    tasks = [_analyse_batch(llm, [conversation[i] for i in batch], semaphore) for batch in batches]
+    if not scores:
+        tasks.append(rescore())
+    results = await asyncio.gather(*tasks)
+
+    for batch, batch_results in zip(batches, results):
+        for index, analysis in zip(batch, batch_results):
+            analyses[index] = analysis
+    if not scores:
+        scores = results[-1]
+
+    feedback_data = {f: scores.get(f) for f in SCORE_FIELDS + ("general_summary",)}
+    feedback_data["answer_analyses"] = analyses
+    return schemas.FeedbackResponse.model_validate(feedback_data).model_dump()
+
+async def _repair_feedback(llm: Any, conversation: List[Dict[str, Any]], data: Dict) -> Dict:
+    """Keeps every valid part of a (possibly damaged) response and fills the gaps."""
+    scores, analyses = salvage_feedback(data)
+    return await _fill_missing(llm, conversation, scores, _align_analyses(conversation, analyses))
+
+async def _generate_final_feedback_parallel(llm: Any, conversation: List[Dict[str, Any]]) -> Dict:
+    """
+    Fans the conversation out into per-batch analysis prompts that run
+    concurrently with a short scoring prompt, then merges them in order.
+    Wall-clock time tracks the slowest batch rather than the whole transcript.
+    Failed batches get one more attempt through _fill_missing.
+    """
+    semaphore = asyncio.Semaphore(FEEDBACK_FANOUT_CONCURRENCY)
+    size = max(1, FEEDBACK_FANOUT_BATCH_SIZE)
+    batches = [conversation[i:i + size] for i in range(0, len(conversation), size)]
+
+    async def scores():
+        async with semaphore:
+            return await _generate_json(llm, build_scores_prompt(conversation))
+
+    results = await asyncio.gather(
+        scores(), *[_analyse_batch(llm, batch, semaphore) for batch in batches], return_exceptions=True
+    )
+    salvaged_scores, _ = salvage_feedback(results[0]) if isinstance(results[0], dict) else ({}, [])
+    analyses: List[Optional[Dict]] = []
+    for batch, batch_results in zip(batches, results[1:]):
+        if isinstance(batch_results, BaseException):
+            print(f"⚠️ AI Service Warning: Analysis batch failed: {batch_results}")
+            analyses.extend([None] * len(batch))
+        else:
+            analyses.extend(batch_results)
+    return await _fill_missing(llm, conversation, salvaged_scores, analyses)
 
+async def _generate_final_feedback(llm: Any, conversation: List[Dict[str, Any]]) -> Dict:
+    """Calls one Gemini model and returns validated feedback; raises on any failure."""
+    if len(conversation) >= FEEDBACK_FANOUT_MIN_ANSWERS:
+        return await _generate_final_feedback_parallel(llm, conversation)
+
+    prompt = build_feedback_prompt(conversation)
+    response = await llm_scheduler.generate(llm, prompt)
+    # Salvage whatever is valid and only re-request the rest; the result is
+    # validated, so malformed output is treated as an error and never cached.
+    return await _repair_feedback(llm, conversation, extract_json_object(response.text))
+
+def _hedge_delay() -> float:
+    """p95 of recent primary-model latencies, clamped to the configured bounds."""
+    if len(_primary_latencies) < FEEDBACK_HEDGE_MIN_SAMPLES:
+        return FEEDBACK_HEDGE_MAX_SECONDS
+    latencies = sorted(_primary_latencies)
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    return min(FEEDBACK_HEDGE_MAX_SECONDS, max(FEEDBACK_HEDGE_MIN_SECONDS, p95))
+
+async def _timed_attempt(model_name: str, conversation: List[Dict[str, Any]]) -> Dict:
+    started = time.monotonic()
+    try:
+        result = await asyncio.wait_for(
+            _generate_final_feedback(models[model_name], conversation), timeout=FEEDBACK_ATTEMPT_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        # Only our own deadline; a provider timeout was already counted by the scheduler.
+        if time.monotonic() - started >= FEEDBACK_ATTEMPT_TIMEOUT_SECONDS:
+            llm_scheduler.record_deadline_exceeded(model_label(models[model_name]))
+        raise
+    if model_name == MODEL_NAME:
+        _primary_latencies.append(time.monotonic() - started)
+    return result
+
+async def _generate_with_fallbacks(conversation: List[Dict[str, Any]]) -> Dict:
+    """
+    Runs the model chain with hedging: the primary starts immediately, and the
+    next model is launched when the current attempts outlive the hedge delay
+    or one of them fails. The first valid FeedbackResponse wins and the other
+    attempts are cancelled. `model_used` records which model served it.
+    """
+    pending: Dict[asyncio.Task, str] = {}
+    errors: List[str] = []
+    next_index = 0
+
+    def launch() -> None:
+        nonlocal next_index
+        name = FEEDBACK_MODEL_CHAIN[next_index]
+        next_index += 1
+        pending[asyncio.create_task(_timed_attempt(name, conversation))] = name
+
+    launch()
     try:
-        response = await model.generate_content_async(prompt)
-        cleaned_text = clean_json_response(response.text)
-        feedback_data = json.loads(cleaned_text)
-        return feedback_data
+        while pending:
+            can_hedge = next_index < len(FEEDBACK_MODEL_CHAIN)
+            done, _ = await asyncio.wait(
+                pending.keys(), timeout=_hedge_delay() if can_hedge else None, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                print(f"ℹ️ AI Service Info: Hedging feedback request with {FEEDBACK_MODEL_CHAIN[next_index]}.")
+                launch()
+                continue
+            for task in done:
+                name = pending.pop(task)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    errors.append(f"{name}: {type(e).__name__}: {e}")
+                    print(f"⚠️ AI Service Warning: Feedback attempt with {name} failed: {e}")
+                    if next_index < len(FEEDBACK_MODEL_CHAIN):
+                        launch()
+                    continue
+                served_by[name] += 1
+                print(f"✅ AI Service Info: Feedback served by {name}.")
+                result["model_used"] = name
+                return result
+        raise RuntimeError(f"All feedback models failed: {'; '.join(errors)}")
+    finally:
+        for task in pending:
+            task.cancel()
+
+def feedback_key(conversation: List[Dict[str, Any]]) -> str:
+    """Hash of the normalized transcript plus prompt/model version."""
+    return make_feedback_key(conversation, PROMPT_VERSION, ",".join(FEEDBACK_MODEL_CHAIN))
+
+async def generate_final_feedback(conversation: List[Dict[str, Any]]) -> Dict:
+    """Cached feedback generation that raises instead of returning the fallback dict."""
+    if not model:
+        raise RuntimeError("AI service is not configured.")
+    return await feedback_cache.get_or_create(feedback_key(conversation), lambda: _generate_with_fallbacks(conversation))
+
+async def get_ai_final_feedback(conversation: List[Dict[str, Any]]) -> Dict:
+    if not model:
+        # Return a structure that matches the new schema
+        return error_feedback("AI service is not configured.")
+
+    try:
+        return await generate_final_feedback(conversation)
     except Exception as e:
         print(f"❌ AI Service Error: Could not parse deep feedback response. Error: {str(e)}")
         # Return a default error response that matches the new schema
-        return { "overall_band_score": 0, "fluency_score": 0, "lexical_score": 0, "grammar_score": 0, "pronunciation_score": 0, "general_summary": "An error occurred generating feedback.", "answer_analyses": [] }
\ No newline at end of file
+        return error_feedback("An error occurred generating feedback.")
+
+async def stream_ai_final_feedback(conversation: List[Dict[str, Any]]) -> AsyncIterator[Tuple[str, Dict]]:
+    """
+    Streams feedback as (event, data) pairs: "scores" once the band scores are
+    parsed, one "answer_analysis" per completed analysis, then "done" with the
+    full FeedbackResponse (or "error" with the fallback dict).
+    """
+    if not model:
+        yield "error", error_feedback("AI service is not configured.")
+        return
+
+    cache_key = feedback_key(conversation)
+    cached = feedback_cache.get(cache_key)
+    if cached is not None:
+        yield "scores", {f: cached[f] for f in SCORE_FIELDS + ("general_summary",)}
+        for analysis in cached["answer_analyses"]:
+            yield "answer_analysis", analysis
+        yield "done", cached
+        return
+
+    parser = FeedbackStreamParser()
+    try:
+        async for chunk in llm_scheduler.stream(model, build_feedback_prompt(conversation)):
+            for event in parser.feed(chunk.text):
+                yield event
+        try:
+            feedback_data = parser.result()
+            if len(feedback_data["answer_analyses"]) != len(conversation):
+                raise ValueError("Streamed response is missing answer analyses")
+        except ValueError:
+            feedback_data = await _repair_feedback(model, conversation, extract_json_object(parser.buffer))
+            if not parser.scores_emitted:
+                yield "scores", {f: feedback_data[f] for f in SCORE_FIELDS + ("general_summary",)}
+            for analysis in feedback_data["answer_analyses"]:
+                if analysis not in parser.analyses:
+                    yield "answer_analysis", analysis
+    except Exception as e:
+        print(f"❌ AI Service Error: Could not stream deep feedback response. Error: {str(e)}")
+        yield "error", error_feedback("An error occurred generating feedback.")
+        return
+
+    served_by[MODEL_NAME] += 1
+    feedback_data["model_used"] = MODEL_NAME
+    feedback_cache.put(cache_key, feedback_data)
+    yield "done", feedback_data
@@ -6,6 +6,15 @@ import azure.cognitiveservices.speech as speechsdk
 import asyncio # 👈 Make sure this import is added
 import io
 
+import struct
+from typing import AsyncIterator
+
+from tts_cache import tts_cache, make_cache_key
+from speech_executor import speech_executor
+from synthesizer_pool import SynthesizerPool, TTS_POOL_SIZE_PER_VOICE, TTS_POOL_WARM_PER_VOICE
+from providers import FakeProviderError, fake_speech
+from metrics import track_dependency
+
 load_dotenv()
 
 speech_key = os.getenv("AZURE_SPEECH_KEY")
@@ -19,18 +28,55 @@ VOICE_PRESETS = {
     "female_au": "en-AU-NatashaNeural",
 }
 DEFAULT_VOICE = "en-US-JennyNeural"
+STREAM_CACHED_CHUNK_BYTES = 16 * 1024
+STT_MAX_UPLOAD_BYTES = int(os.getenv("STT_MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+STT_UPLOAD_CHUNK_BYTES = int(os.getenv("STT_UPLOAD_CHUNK_BYTES", str(64 * 1024)))
+OUTPUT_FORMAT = speechsdk.SpeechSynthesisOutputFormat.Audio16Khz64KBitRateMonoMp3
 
-if not speech_key or not speech_region:
+if fake_speech:
+    print("ℹ️ AZURE TTS INFO: PROVIDER_MODE=fake, using the local speech stand-in.")
+    speech_config = None
+    synthesizer_pool = None
+elif not speech_key or not speech_region:
     print("⚠️ AZURE TTS WARNING: Azure Speech key or region not found in .env file.")
     speech_config = None
+    synthesizer_pool = None
 else:
     print("✅ AZURE TTS INFO: Azure credentials loaded successfully.")
     speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=speech_region)
-    speech_config.set_speech_synthesis_output_format(speechsdk.SpeechSynthesisOutputFormat.Audio16Khz64KBitRateMonoMp3)
+    speech_config.set_speech_synthesis_output_format(OUTPUT_FORMAT)
+    # Synthesis never touches the shared speech_config: every voice gets its own
+    # config inside the pool, so concurrent requests cannot swap voices.
+    synthesizer_pool = SynthesizerPool(speech_key, speech_region, OUTPUT_FORMAT, TTS_POOL_SIZE_PER_VOICE)
+
+
+async def warm_up_synthesizers():
+    """Pre-connects pooled synthesizers for every preset voice."""
+    if synthesizer_pool and TTS_POOL_WARM_PER_VOICE > 0:
+        await synthesizer_pool.warm_up(list(VOICE_PRESETS.values()), TTS_POOL_WARM_PER_VOICE)
+        print(f"✅ AZURE TTS INFO: Synthesizer pool warmed: {synthesizer_pool.stats()}")
+
+
+def shutdown_synthesizers():
+    if synthesizer_pool:
+        synthesizer_pool.close()
+    speech_executor.shutdown()
+
+
+async def _fake_synthesize(text: str, voice_name: str, cache_key: str) -> bytes | None:
+    try:
+        async with track_dependency("azure_tts", "synthesize"):
+            audio = await speech_executor.run(fake_speech.synthesize, text, voice_name)
+    except FakeProviderError as e:
+        print(f"❌ AZURE TTS CANCELED: {e}")
+        return None
+    if tts_cache:
+        await tts_cache.put(cache_key, audio)
+    return audio
 
 
 async def text_to_speech_async(text: str, voice_id: str | None = None) -> bytes | None:
-    if not speech_config:
+    if not speech_config and not fake_speech:
         print("❌ AZURE TTS ERROR: speech_config is not available. Check .env file.")
         return None
     if not text.strip():
@@ -38,21 +84,34 @@ async def text_to_speech_async(text: str, voice_id: str | None = None) -> bytes
         return None
 
     voice_name = VOICE_PRESETS.get(voice_id, DEFAULT_VOICE) if voice_id else DEFAULT_VOICE
-    speech_config.speech_synthesis_voice_name = voice_name
-    
-    synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
-    
+
+    cache_key = make_cache_key(text, voice_name, OUTPUT_FORMAT.name)
+    if tts_cache:
+        cached_audio = await tts_cache.get(cache_key)
+        if cached_audio is not None:
+            print(f"✅ AZURE TTS CACHE HIT: Returning {len(cached_audio)} cached bytes.")
+            return cached_audio
+
+    if fake_speech:
+        return await _fake_synthesize(text, voice_name, cache_key)
+
     print(f"🎤 AZURE TTS INFO: Synthesizing speech with voice: {voice_name}")
-    
-    # --- THIS IS THE CORRECT AND FINAL FIX ---
-    # The SDK's '.get()' method is a blocking call. We must run it in a 
-    # separate thread to avoid freezing the server. `asyncio.to_thread`
-    # is the standard and correct way to do this in an async application.
-    future = synthesizer.speak_text_async(text)
-    result = await asyncio.to_thread(future.get)
-    
+
+    async with synthesizer_pool.checkout(voice_name) as pooled:
+        # The SDK's '.get()' method is a blocking call, so it runs on the dedicated
+        # speech executor. Synthesis is only started once a worker slot is free,
+        # which lets a saturated executor fail fast instead of piling up calls.
+        synthesizer = pooled.synthesizer
+        async with track_dependency("azure_tts", "synthesize") as tracker:
+            result = await speech_executor.run(lambda: synthesizer.speak_text_async(text).get())
+            if result.reason == speechsdk.ResultReason.Canceled:
+                tracker.outcome = "canceled"
+                pooled.mark_unhealthy()
+
     if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
         print(f"✅ AZURE TTS SUCCESS: Synthesis successful, returning {len(result.audio_data)} bytes.")
+        if tts_cache:
+            await tts_cache.put(cache_key, result.audio_data)
         return result.audio_data
     elif result.reason == speechsdk.ResultReason.Canceled:
         cancellation_details = result.cancellation_details
@@ -62,9 +121,109 @@ async def text_to_speech_async(text: str, voice_id: str | None = None) -> bytes
         return None
     return None
 
+async def text_to_speech_stream(text: str, voice_id: str | None = None) -> AsyncIterator[bytes]:
+    """
+    Yields MP3 chunks as Azure produces them instead of waiting for the whole clip.
+    The SDK fires `synthesizing` events from its own thread, so they are bridged
+    into an asyncio.Queue. Completed clips are written to the TTS cache.
+    """
+    if not speech_config and not fake_speech:
+        print("❌ AZURE TTS ERROR: speech_config is not available. Check .env file.")
+        return
+    if not text.strip():
+        print("❌ AZURE TTS ERROR: Input text is empty.")
+        return
+
+    voice_name = VOICE_PRESETS.get(voice_id, DEFAULT_VOICE) if voice_id else DEFAULT_VOICE
+
+    cache_key = make_cache_key(text, voice_name, OUTPUT_FORMAT.name)
+    if tts_cache:
+        cached_audio = await tts_cache.get(cache_key)
+        if cached_audio is not None:
+            print(f"✅ AZURE TTS CACHE HIT: Streaming {len(cached_audio)} cached bytes.")
+            for i in range(0, len(cached_audio), STREAM_CACHED_CHUNK_BYTES):
+                yield cached_audio[i:i + STREAM_CACHED_CHUNK_BYTES]
+            return
+
+    if fake_speech:
+        audio = await _fake_synthesize(text, voice_name, cache_key) or b""
+        for i in range(0, len(audio), STREAM_CACHED_CHUNK_BYTES):
+            yield audio[i:i + STREAM_CACHED_CHUNK_BYTES]
+        return
+
+    async with synthesizer_pool.checkout(voice_name) as pooled:
+        synthesizer = pooled.synthesizer
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        def on_synthesizing(evt):
+            chunk = evt.result.audio_data
+            if chunk:
+                loop.call_soon_threadsafe(queue.put_nowait, bytes(chunk))
+
+        def on_completed(evt):
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        def on_canceled(evt):
+            cancellation_details = evt.result.cancellation_details
+            print(f"❌ AZURE TTS CANCELED: {cancellation_details.reason}")
+            if cancellation_details.reason == speechsdk.CancellationReason.Error:
+                print(f"❌ AZURE TTS ERROR DETAILS: {cancellation_details.error_details}")
+            pooled.mark_unhealthy()
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        synthesizer.synthesizing.connect(on_synthesizing)
+        synthesizer.synthesis_completed.connect(on_completed)
+        synthesizer.synthesis_canceled.connect(on_canceled)
+
+        print(f"🎤 AZURE TTS INFO: Streaming speech with voice: {voice_name}")
+        async with track_dependency("azure_tts", "stream") as tracker:
+            future = synthesizer.speak_text_async(text)
+
+            chunks = []
+            completed = False
+            try:
+                while True:
+                    item = await queue.get()
+                    if item is done:
+                        completed = True
+                        break
+                    if item is None:
+                        break
+                    chunks.append(item)
+                    yield item
+            finally:
+                if not completed:
+                    # Client went away or synthesis failed; stop Azure from producing more audio.
+                    synthesizer.stop_speaking_async()
+                try:
+                    await speech_executor.run(future.get)
+                except BaseException:
+                    # Synthesis may still be running; don't hand this instance to the next request.
+                    pooled.mark_unhealthy()
+                    raise
+                tracker.outcome = "success" if completed else "aborted"
+
+    if completed:
+        audio = b"".join(chunks)
+        print(f"✅ AZURE TTS SUCCESS: Streamed {len(audio)} bytes.")
+        if tts_cache:
+            await tts_cache.put(cache_key, audio)
+
+async def _fake_recognize(audio_size: int) -> str:
+    try:
+        async with track_dependency("azure_stt", "recognize"):
+            return await speech_executor.run(fake_speech.recognize, audio_size)
+    except FakeProviderError as e:
+        print(f"❌ AZURE STT CANCELED: {e}")
+        return "Error during transcription."
+
 # ✅ ADD THIS NEW FUNCTION
 async def speech_to_text_from_bytes(audio_bytes: bytes) -> str:
     """Transcribes speech from in-memory audio bytes using Azure."""
+    if fake_speech:
+        return await _fake_recognize(len(audio_bytes))
     if not speech_config:
         print("❌ AZURE STT ERROR: speech_config is not available.")
         return "Error: Speech service not configured."
@@ -82,9 +241,10 @@ async def speech_to_text_from_bytes(audio_bytes: bytes) -> str:
 
     print("🎤 AZURE STT INFO: Transcribing audio...")
 
-   # This is the corrected code
-    future = speech_recognizer.recognize_once_async()
-    result = await asyncio.to_thread(future.get)
+    async with track_dependency("azure_stt", "recognize") as tracker:
+        result = await speech_executor.run(lambda: speech_recognizer.recognize_once_async().get())
+        if result.reason == speechsdk.ResultReason.Canceled:
+            tracker.outcome = "canceled"
 
     # Check the result
     if result.reason == speechsdk.ResultReason.RecognizedSpeech:
@@ -100,4 +260,152 @@ async def speech_to_text_from_bytes(audio_bytes: bytes) -> str:
             print(f"❌ AZURE STT ERROR DETAILS: {cancellation_details.error_details}")
         return "Error during transcription."
 
-    return ""
\ No newline at end of file
+    return ""
+
+class ContinuousRecognition:
+    """
+    Wraps a continuous SpeechRecognizer fed through a PushAudioInputStream.
+    Audio is written as it arrives; `recognizing` (partial) and `recognized`
+    (final segment) results are bridged from SDK threads into an asyncio.Queue
+    and consumed with `async for event_type, text in recognition.events()`.
+    """
+
+    def __init__(self, sample_rate: int = 16000):
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._stream_closed = False
+        self.error: str | None = None
+
+        stream_format = speechsdk.audio.AudioStreamFormat(
+            samples_per_second=sample_rate, bits_per_sample=16, channels=1
+        )
+        self.push_stream = speechsdk.audio.PushAudioInputStream(stream_format=stream_format)
+        audio_config = speechsdk.audio.AudioConfig(stream=self.push_stream)
+        self.recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=audio_config)
+
+        self.recognizer.recognizing.connect(self._on_recognizing)
+        self.recognizer.recognized.connect(self._on_recognized)
+        self.recognizer.canceled.connect(self._on_canceled)
+        self.recognizer.session_stopped.connect(self._on_session_stopped)
+
+    def _emit(self, item):
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+
+    def _on_recognizing(self, evt):
+        if evt.result.text:
+            self._emit(("recognizing", evt.result.text))
+
+    def _on_recognized(self, evt):
+        if evt.result.reason == speechsdk.ResultReason.RecognizedSpeech and evt.result.text:
+            self._emit(("recognized", evt.result.text))
+
+    def _on_canceled(self, evt):
+        details = evt.cancellation_details
+        if details.reason == speechsdk.CancellationReason.Error:
+            print(f"❌ AZURE STT ERROR DETAILS: {details.error_details}")
+            self.error = details.error_details or "Error during transcription."
+        self._emit(None)
+
+    def _on_session_stopped(self, evt):
+        self._emit(None)
+
+    async def start(self) -> None:
+        await speech_executor.run(lambda: self.recognizer.start_continuous_recognition_async().get())
+
+    def write(self, chunk: bytes) -> None:
+        self.push_stream.write(chunk)
+
+    def end_of_stream(self) -> None:
+        """Signals that no more audio will arrive; recognition drains and stops."""
+        if not self._stream_closed:
+            self._stream_closed = True
+            self.push_stream.close()
+
+    async def stop(self) -> None:
+        await speech_executor.run(lambda: self.recognizer.stop_continuous_recognition_async().get())
+
+    async def events(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            yield item
+
+
+def parse_wav_header(data: bytes) -> tuple[int, int] | None:
+    """
+    Returns (pcm_offset, sample_rate) if `data` starts with a RIFF/WAVE header,
+    so the header bytes are not pushed into the recognizer as audio.
+    """
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+    offset = 12
+    sample_rate = 16000
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        chunk_size = struct.unpack("<I", data[offset + 4:offset + 8])[0]
+        if chunk_id == b"fmt " and offset + 16 <= len(data):
+            sample_rate = struct.unpack("<I", data[offset + 12:offset + 16])[0]
+        if chunk_id == b"data":
+            return offset + 8, sample_rate
+        offset += 8 + chunk_size + (chunk_size % 2)
+    return None
+
+
+async def speech_to_text_long_form(chunks: AsyncIterator[bytes]) -> str:
+    """
+    Transcribes an arbitrarily long recording (e.g. a 2-minute Part 2 answer).
+    Unlike recognize_once_async, continuous recognition keeps going past the
+    first utterance; chunks are pushed as they are read so memory stays flat.
+    """
+    if fake_speech:
+        audio_size = 0
+        async for chunk in chunks:
+            audio_size += len(chunk)
+        return await _fake_recognize(audio_size) if audio_size else ""
+    if not speech_config:
+        print("❌ AZURE STT ERROR: speech_config is not available.")
+        return "Error: Speech service not configured."
+
+    chunk_iter = chunks.__aiter__()
+    first_chunk = await anext(chunk_iter, b"")
+    if not first_chunk:
+        return ""
+
+    sample_rate = 16000
+    wav_header = parse_wav_header(first_chunk)
+    if wav_header:
+        pcm_offset, sample_rate = wav_header
+        first_chunk = first_chunk[pcm_offset:]
+
+    recognition = ContinuousRecognition(sample_rate=sample_rate)
+    await recognition.start()
+    print("🎤 AZURE STT INFO: Transcribing long-form audio...")
+
+    async def feed_audio():
+        try:
+            recognition.write(first_chunk)
+            async for chunk in chunk_iter:
+                recognition.write(chunk)
+        finally:
+            recognition.end_of_stream()
+
+    feeder = asyncio.create_task(feed_audio())
+    segments = []
+    try:
+        async with track_dependency("azure_stt", "recognize_long_form") as tracker:
+            async for event_type, text in recognition.events():
+                if event_type == "recognized":
+                    segments.append(text)
+            await feeder
+            if recognition.error:
+                tracker.outcome = "canceled"
+    finally:
+        feeder.cancel()
+        await recognition.stop()
+
+    if recognition.error:
+        return "Error during transcription."
+    transcript = " ".join(segments)
+    print(f"✅ AZURE STT SUCCESS: Recognized {len(segments)} segments, {len(transcript)} characters.")
+    return transcript
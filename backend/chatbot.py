@@ -1,42 +1,228 @@
 # assistant/chatbot.py (Full Version)
+import asyncio
+import json
 import os
-import google.generativeai as genai
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 
-chat_session = None
+from sqlalchemy.ext.asyncio import AsyncSession
 
-def configure_ai():
-    """Initializes the AI model using the API key from the environment."""
-    global chat_session
-    try:
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            print("Error: GOOGLE_API_KEY environment variable not set.")
+import crud
+from llm_scheduler import estimate_tokens, llm_scheduler
+from providers import generative_model
+
+EXAMINER_MODEL_NAME = os.getenv("EXAMINER_MODEL_NAME", "gemini-1.5-flash")
+EXAMINER_SESSION_TTL_SECONDS = float(os.getenv("EXAMINER_SESSION_TTL_SECONDS", "1800"))
+EXAMINER_MAX_SESSIONS = int(os.getenv("EXAMINER_MAX_SESSIONS", "2000"))
+# Rough cap on the text held in memory across all resident sessions.
+EXAMINER_MAX_RESIDENT_BYTES = int(os.getenv("EXAMINER_MAX_RESIDENT_BYTES", str(32 * 1024 * 1024)))
+# Once summary + verbatim turns exceed this, older turns are folded into the summary.
+EXAMINER_HISTORY_TOKEN_BUDGET = int(os.getenv("EXAMINER_HISTORY_TOKEN_BUDGET", "2000"))
+EXAMINER_KEEP_RECENT_MESSAGES = int(os.getenv("EXAMINER_KEEP_RECENT_MESSAGES", "6"))
+
+EXAMINER_PREAMBLE = (
+    "You are an IELTS Speaking examiner running a live practice test. Ask one question at a time, "
+    "follow up naturally on the student's answers, keep your turns short, and do not give feedback "
+    "or scores during the test."
+)
+
+
+class ExaminerSessionNotFound(Exception):
+    pass
+
+
+class ExaminerSession:
+    """
+    One student's live examiner chat. Only a rolling summary and the most
+    recent messages are kept verbatim; `chat` is rebuilt from them whenever
+    the history is compacted or the session is restored from the database.
+    """
+
+    def __init__(self, session_id: str, user_id: int, summary: Optional[str], turns: List[Dict[str, str]], turn_count: int):
+        self.id = session_id
+        self.user_id = user_id
+        self.summary = summary
+        self.turns = turns
+        self.turn_count = turn_count
+        self.last_used = time.monotonic()
+        self.resident_bytes = 0
+        # Serializes turns so concurrent messages can't interleave the history.
+        self.lock = asyncio.Lock()
+        # Sends holding or waiting for `lock`; a busy session is never evicted,
+        # or a concurrent get would restore a second copy that diverges from it.
+        self.busy = 0
+        self.chat = None
+        self.rebuild_chat()
+
+    def contents(self) -> List[Dict[str, Any]]:
+        contents = [
+            {"role": "user", "parts": [EXAMINER_PREAMBLE]},
+            {"role": "model", "parts": ["Understood."]},
+        ]
+        if self.summary:
+            contents += [
+                {"role": "user", "parts": [f"Summary of the test so far: {self.summary}"]},
+                {"role": "model", "parts": ["Noted, I'll continue from there."]},
+            ]
+        return contents + [{"role": turn["role"], "parts": [turn["text"]]} for turn in self.turns]
+
+    def rebuild_chat(self) -> None:
+        self.chat = generative_model(EXAMINER_MODEL_NAME).start_chat(history=self.contents())
+
+    def history_text(self) -> str:
+        return "\n".join([self.summary or ""] + [turn["text"] for turn in self.turns])
+
+    def measure(self) -> int:
+        # Turns are held twice: in `turns` and in the chat's own history.
+        return len(self.summary or "") + 2 * sum(len(turn["text"]) for turn in self.turns)
+
+
+class ExaminerSessionManager:
+    """
+    Resident examiner sessions, most recently used last. Sessions idle past
+    the TTL are dropped, and the least recently used are evicted while the
+    count or resident-byte caps are exceeded; sessions with a send in
+    progress are skipped by both. Every turn is written through
+    to examiner_sessions, so eviction never loses history: the next message
+    restores the session from the database.
+    """
+
+    def __init__(self, ttl_seconds: float, max_sessions: int, max_resident_bytes: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_resident_bytes = max_resident_bytes
+        self._sessions: "OrderedDict[str, ExaminerSession]" = OrderedDict()
+        self.resident_bytes = 0
+
+        self.created = 0
+        self.restored = 0
+        self.evicted = 0
+        self.summarized = 0
+
+    async def create(self, db: AsyncSession, user_id: int) -> ExaminerSession:
+        db_session = await crud.create_examiner_session(db, user_id=user_id)
+        session = ExaminerSession(db_session.id, user_id, None, [], 0)
+        self.created += 1
+        self._admit(session)
+        return session
+
+    async def get(self, db: AsyncSession, user_id: int, session_id: str) -> ExaminerSession:
+        self._evict_expired()
+        session = self._sessions.get(session_id)
+        if session is not None and session.user_id == user_id:
+            return session
+        db_session = await crud.get_examiner_session(db, user_id=user_id, session_id=session_id)
+        if db_session is None:
+            raise ExaminerSessionNotFound(session_id)
+        session = self._sessions.get(session_id)  # restored concurrently while we waited
+        if session is None:
+            session = ExaminerSession(
+                db_session.id, user_id, db_session.summary, json.loads(db_session.turns), db_session.turn_count
+            )
+            self.restored += 1
+            self._admit(session)
+        return session
+
+    async def send(self, db: AsyncSession, user_id: int, session_id: str, message: str) -> Tuple[str, int]:
+        """Sends the student's message; returns the examiner's reply and the session's turn count."""
+        session = await self.get(db, user_id, session_id)
+        session.busy += 1
+        try:
+            async with session.lock:
+                response = await llm_scheduler.run(
+                    lambda: session.chat.send_message_async(message), session.history_text() + message, EXAMINER_MODEL_NAME
+                )
+                session.turns += [{"role": "user", "text": message}, {"role": "model", "text": response.text}]
+                session.turn_count += 1
+                reply, turn_count = response.text, session.turn_count
+                if estimate_tokens(session.history_text()) > EXAMINER_HISTORY_TOKEN_BUDGET:
+                    await self._compact(session)
+                await crud.save_examiner_session(db, session.id, session.summary, session.turns, session.turn_count)
+        finally:
+            session.busy -= 1
+        self._admit(session)
+        return reply, turn_count
+
+    async def end(self, db: AsyncSession, user_id: int, session_id: str) -> bool:
+        session = self._sessions.get(session_id)
+        if session is not None and session.user_id == user_id:
+            self._remove(session_id)
+        return await crud.delete_examiner_session(db, user_id=user_id, session_id=session_id)
+
+    async def _compact(self, session: ExaminerSession) -> None:
+        """Folds all but the most recent messages into the rolling summary."""
+        older, recent = session.turns[:-EXAMINER_KEEP_RECENT_MESSAGES], session.turns[-EXAMINER_KEEP_RECENT_MESSAGES:]
+        if not older:
             return
+        session.turns = recent
+        transcript = "\n".join(
+            f"{'Examiner' if turn['role'] == 'model' else 'Student'}: {turn['text']}" for turn in older
+        )
+        prompt = (
+            "Summarize this IELTS speaking practice test so far for the examiner's own notes, in under "
+            "150 words: topics and questions already covered, and notable points from the student's answers.\n\n"
+            f"Previous summary: {session.summary or 'none'}\n\n"
+            f"--- TRANSCRIPT ---\n{transcript}\n--- END OF TRANSCRIPT ---"
+        )
+        try:
+            response = await llm_scheduler.generate(generative_model(EXAMINER_MODEL_NAME), prompt)
+            session.summary = response.text.strip()
+            self.summarized += 1
+        except Exception as e:
+            # The older turns are dropped either way so history stays bounded.
+            print(f"⚠️ EXAMINER WARNING: Could not summarize session {session.id}, dropping older turns: {e}")
+        session.rebuild_chat()
 
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        chat_session = model.start_chat(history=[])
-        print("AI model configured successfully.")
-    except Exception as e:
-        print(f"Error configuring Google AI: {e}")
-        chat_session = None
+    def _admit(self, session: ExaminerSession) -> None:
+        if session.id in self._sessions:
+            self.resident_bytes -= self._sessions[session.id].resident_bytes
+        session.resident_bytes = session.measure()
+        session.last_used = time.monotonic()
+        self._sessions[session.id] = session
+        self._sessions.move_to_end(session.id)
+        self.resident_bytes += session.resident_bytes
+        for candidate in list(self._sessions.values()):
+            if len(self._sessions) <= self.max_sessions and self.resident_bytes <= self.max_resident_bytes:
+                break
+            if candidate is session or candidate.busy:
+                continue
+            self._remove(candidate.id)
+            self.evicted += 1
+
+    def _evict_expired(self) -> None:
+        deadline = time.monotonic() - self.ttl_seconds
+        for candidate in list(self._sessions.values()):
+            if candidate.last_used > deadline:
+                break
+            if candidate.busy:
+                continue
+            self._remove(candidate.id)
+            self.evicted += 1
+
+    def _remove(self, session_id: str) -> None:
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self.resident_bytes -= session.resident_bytes
+
+    def stats(self) -> dict:
+        return {
+            "resident_sessions": len(self._sessions),
+            "resident_bytes": self.resident_bytes,
+            "created": self.created,
+            "restored": self.restored,
+            "evicted": self.evicted,
+            "summarized": self.summarized,
+        }
 
-def get_chatbot_response(prompt: str) -> str:
-    """Sends a prompt to the ongoing chat session and gets a response."""
-    if not chat_session:
-        return "AI model is not configured. Please check the server logs for an API key error."
-    try:
-        response = chat_session.send_message(prompt)
-        return response.text
-    except Exception as e:
-        return f"An error occurred while getting a response: {str(e)}"
+
+examiner_sessions = ExaminerSessionManager(
+    EXAMINER_SESSION_TTL_SECONDS, EXAMINER_MAX_SESSIONS, EXAMINER_MAX_RESIDENT_BYTES
+)
 
 # --- NEW FUNCTION TO GENERATE FINAL FEEDBACK ---
-def generate_feedback_from_history(history: str) -> str:
+async def generate_feedback_from_history(history: str) -> str:
     """Sends a full conversation history to the AI and asks for feedback."""
-    if not chat_session:
-        return "AI model is not configured."
-
     # A special prompt that tells the AI what we want it to do
     feedback_prompt = (
         "You are an IELTS speaking examiner. Based on the following conversation transcript, "
@@ -47,11 +233,11 @@ def generate_feedback_from_history(history: str) -> str:
         "--- END OF TRANSCRIPT ---\n\n"
         "FINAL FEEDBACK:"
     )
-    
+
     try:
         # We use generate_content for a one-off request, not the ongoing chat session
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(feedback_prompt)
+        model = generative_model(EXAMINER_MODEL_NAME)
+        response = await llm_scheduler.generate(model, feedback_prompt)
         return response.text
     except Exception as e:
-        return f"An error occurred while generating feedback: {str(e)}"
\ No newline at end of file
+        return f"An error occurred while generating feedback: {str(e)}"
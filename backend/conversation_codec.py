@@ -0,0 +1,87 @@
+# conversation_codec.py
+
+import gzip
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional; gzip is used instead
+    zstandard = None
+
+# How new conversations are stored: "json", "gzip" or "zstd".
+CONVERSATION_STORAGE_FORMAT = os.getenv("CONVERSATION_STORAGE_FORMAT", "gzip").lower()
+# Bodies smaller than this are stored uncompressed; the framing overhead isn't worth it.
+CONVERSATION_COMPRESS_MIN_BYTES = int(os.getenv("CONVERSATION_COMPRESS_MIN_BYTES", "512"))
+
+# Format tags written to conversations.conversation_format. NULL means a legacy
+# row whose JSON text lives in conversation_data.
+FORMAT_JSON = "json-v1"
+FORMAT_GZIP = "gzip-v1"
+FORMAT_ZSTD = "zstd-v1"
+
+# HTTP Content-Encoding for formats that can be passed through as-is.
+CONTENT_ENCODINGS = {FORMAT_GZIP: "gzip", FORMAT_ZSTD: "zstd"}
+
+if CONVERSATION_STORAGE_FORMAT == "zstd" and zstandard is None:
+    print("⚠️ CONVERSATION STORAGE WARNING: zstandard is not installed, storing conversations with gzip.")
+    CONVERSATION_STORAGE_FORMAT = "gzip"
+
+
+def canonical_json(turns: List[Dict[str, Any]]) -> bytes:
+    """Compact UTF-8 JSON, byte-identical to what the API would serialize for the same turns."""
+    return json.dumps(turns, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode_conversation(turns: List[Dict[str, Any]]) -> Tuple[str, bytes]:
+    """Returns (format tag, stored bytes) for already-validated turns."""
+    body = canonical_json(turns)
+    if CONVERSATION_STORAGE_FORMAT == "json" or len(body) < CONVERSATION_COMPRESS_MIN_BYTES:
+        return FORMAT_JSON, body
+    if CONVERSATION_STORAGE_FORMAT == "zstd":
+        return FORMAT_ZSTD, zstandard.ZstdCompressor(level=3).compress(body)
+    return FORMAT_GZIP, gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def decode_conversation(fmt: Optional[str], blob: Optional[bytes], legacy_text: Optional[str] = None) -> bytes:
+    """Canonical JSON bytes for a stored conversation, without building Python objects."""
+    if fmt is None:
+        # Legacy rows predate canonical storage and are re-encoded once here.
+        return canonical_json(json.loads(legacy_text))
+    if fmt == FORMAT_JSON:
+        return blob
+    if fmt == FORMAT_GZIP:
+        return gzip.decompress(blob)
+    if fmt == FORMAT_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Conversation is zstd-compressed but zstandard is not installed.")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    raise ValueError(f"Unknown conversation format: {fmt}")
+
+
+def accepts_encoding(accept_encoding: Optional[str], encoding: str) -> bool:
+    """True if an Accept-Encoding header allows `encoding` (q=0 counts as refusal)."""
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() not in (encoding, "*"):
+            continue
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def conversation_envelope(conversation_id: int, created_at: datetime, turns_json: bytes) -> bytes:
+    """A ConversationRead body assembled around the stored turns bytes."""
+    return b"".join((
+        b'{"id":', str(conversation_id).encode(),
+        b',"conversation":', turns_json,
+        b',"created_at":', json.dumps(created_at.isoformat()).encode(),
+        b"}",
+    ))
@@ -1,13 +1,18 @@
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
-from sqlalchemy import select
+from typing import Optional, Dict, Any, List
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.orm import load_only
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+import base64
 import json
+import uuid
 
 import models
 import schemas
+import conversation_codec
+from user_cache import user_cache
 import security
 from database import get_db
 
@@ -24,7 +29,7 @@ async def get_user_by_email(db: AsyncSession, email: str) -> Optional[models.Use
     return result.scalar_one_or_none()
 
 async def create_user(db: AsyncSession, user: schemas.UserCreate, verification_code: str) -> models.User:
-    hashed_password = security.get_password_hash(user.password)
+    hashed_password = await security.hash_password(user.password)
     db_user = models.User(
         email=user.email,
         name=user.name,
@@ -53,6 +58,7 @@ async def verify_user_code(db: AsyncSession, email: str, code: str) -> Optional[
         user.code_expires_at = None
         await db.commit()
         await db.refresh(user)
+        user_cache.invalidate(user.email)
         return user
     return None
 
@@ -89,31 +95,66 @@ async def check_reset_code(db: AsyncSession, email: str, code: str) -> Optional[
 # Замените старую функцию reset_user_password на эту
 async def reset_user_password(db: AsyncSession, user: models.User, new_password: str):
     """Хеширует и устанавливает новый пароль, а также аннулирует все коды сброса."""
-    user.hashed_password = security.get_password_hash(new_password)
+    user.hashed_password = await security.hash_password(new_password)
     user.verification_code = None
     user.code_expires_at = None
+    # Revokes every access token issued before the reset.
+    user.token_version = (user.token_version or 0) + 1
     await db.commit()
     await db.refresh(user)
+    user_cache.invalidate(user.email)
 
 async def update_user_password(
     db: AsyncSession, user: models.User, form_data: schemas.PasswordChangeRequest
 ):
-    if not security.verify_password(form_data.current_password, user.hashed_password):
+    valid, _ = await security.verify_and_update_password(form_data.current_password, user.hashed_password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
         )
     
-    user.hashed_password = security.get_password_hash(form_data.new_password)
+    user.hashed_password = await security.hash_password(form_data.new_password)
+    user.token_version = (user.token_version or 0) + 1
     await db.commit()
+    user_cache.invalidate(user.email)
 
 # --- Conversation Management ---
 
-async def create_conversation(db: AsyncSession, user_id: int, conversation: Dict[str, Any]) -> models.Conversation:
+def conversation_summary(conversation: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Values for the summary columns, derived from the full conversation."""
+    topics: List[str] = []
+    parts: List[int] = []
+    for turn in conversation:
+        if turn.get("topic") and turn["topic"] not in topics:
+            topics.append(turn["topic"])
+        if turn.get("part") is not None and turn["part"] not in parts:
+            parts.append(turn["part"])
+    return {"turn_count": len(conversation), "topics": json.dumps(topics), "parts": json.dumps(sorted(parts))}
+
+def encode_conversation_cursor(conversation: models.Conversation) -> str:
+    raw = f"{conversation.created_at.isoformat()}|{conversation.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_conversation_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, conversation_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(conversation_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+async def create_conversation(
+    db: AsyncSession, user_id: int, conversation: List[Dict[str, Any]], overall_band_score: Optional[float] = None
+) -> models.Conversation:
+    conversation_format, conversation_blob = conversation_codec.encode_conversation(conversation)
     db_conversation = models.Conversation(
         user_id=user_id,
-        conversation_data=json.dumps(conversation),
-        created_at=datetime.utcnow()
+        conversation_format=conversation_format,
+        conversation_blob=conversation_blob,
+        created_at=datetime.utcnow(),
+        overall_band_score=overall_band_score,
+        **conversation_summary(conversation)
     )
     db.add(db_conversation)
     await db.commit()
@@ -124,10 +165,58 @@ async def get_user_conversations(db: AsyncSession, user_id: int) -> list[models.
     result = await db.execute(
         select(models.Conversation)
         .filter(models.Conversation.user_id == user_id)
-        .order_by(models.Conversation.created_at.desc())
+        .order_by(models.Conversation.created_at.desc(), models.Conversation.id.desc())
     )
     return list(result.scalars().all())
 
+async def get_user_conversation_page(
+    db: AsyncSession, user_id: int, limit: int, cursor: Optional[str] = None
+) -> tuple[list[models.Conversation], Optional[str]]:
+    """
+    One page of a user's conversations, newest first, without the conversation
+    bodies. Keyset pagination on (created_at, id) walks the
+    (user_id, created_at) index, so every page costs the same.
+    """
+    Conversation = models.Conversation
+    query = (
+        select(Conversation)
+        .options(load_only(
+            Conversation.id, Conversation.created_at, Conversation.turn_count,
+            Conversation.topics, Conversation.parts, Conversation.overall_band_score,
+        ))
+        .filter(Conversation.user_id == user_id)
+    )
+    if cursor:
+        created_at, conversation_id = decode_conversation_cursor(cursor)
+        query = query.filter(or_(
+            Conversation.created_at < created_at,
+            and_(Conversation.created_at == created_at, Conversation.id < conversation_id),
+        ))
+    result = await db.execute(
+        query.order_by(Conversation.created_at.desc(), Conversation.id.desc()).limit(limit + 1)
+    )
+    conversations = list(result.scalars().all())
+    next_cursor = None
+    if len(conversations) > limit:
+        conversations = conversations[:limit]
+        next_cursor = encode_conversation_cursor(conversations[-1])
+    return conversations, next_cursor
+
+def conversation_turns_json(conversation: models.Conversation) -> bytes:
+    """The stored turns as canonical JSON bytes (decompressed if needed)."""
+    return conversation_codec.decode_conversation(
+        conversation.conversation_format, conversation.conversation_blob, conversation.conversation_data
+    )
+
+async def get_conversation(db: AsyncSession, user_id: int, conversation_id: int) -> Optional[models.Conversation]:
+    result = await db.execute(
+        select(models.Conversation).filter(
+            models.Conversation.id == conversation_id,
+            models.Conversation.user_id == user_id
+        )
+    )
+    return result.scalar_one_or_none()
+
 async def delete_conversation(
     db: AsyncSession, user_id: int, conversation_id: int
 ) -> schemas.MessageResponse:
@@ -149,41 +238,381 @@ async def delete_conversation(
     await db.commit()
     return {"message": "Conversation deleted successfully"}
 
+# --- Feedback Job Management ---
+
+async def get_feedback_job(db: AsyncSession, job_id: str, user_id: Optional[int] = None) -> Optional[models.FeedbackJob]:
+    query = select(models.FeedbackJob).filter(models.FeedbackJob.id == job_id)
+    if user_id is not None:
+        query = query.filter(models.FeedbackJob.user_id == user_id)
+    result = await db.execute(query)
+    return result.scalar_one_or_none()
+
+async def get_active_feedback_job(db: AsyncSession, user_id: int, transcript_hash: str) -> Optional[models.FeedbackJob]:
+    """Returns a pending, running or completed job for the same transcript, if any."""
+    result = await db.execute(
+        select(models.FeedbackJob)
+        .filter(
+            models.FeedbackJob.user_id == user_id,
+            models.FeedbackJob.transcript_hash == transcript_hash,
+            models.FeedbackJob.status != "failed"
+        )
+        .order_by(models.FeedbackJob.created_at.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+async def create_feedback_job(
+    db: AsyncSession, user_id: int, transcript_hash: str, conversation: list
+) -> models.FeedbackJob:
+    db_job = models.FeedbackJob(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        transcript_hash=transcript_hash,
+        status="pending",
+        request_data=json.dumps(conversation),
+        created_at=datetime.utcnow(),
+        updated_at=datetime.utcnow()
+    )
+    db.add(db_job)
+    await db.commit()
+    await db.refresh(db_job)
+    return db_job
+
+async def claim_feedback_job(db: AsyncSession, job_id: str, worker_token: str) -> bool:
+    """Atomically moves a pending job to running under `worker_token`; False if someone else got it."""
+    result = await db.execute(
+        update(models.FeedbackJob)
+        .where(models.FeedbackJob.id == job_id, models.FeedbackJob.status == "pending")
+        .values(
+            status="running", claimed_by=worker_token, attempts=models.FeedbackJob.attempts + 1,
+            updated_at=datetime.utcnow()
+        )
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+async def renew_feedback_job_claim(db: AsyncSession, job_id: str, worker_token: str) -> bool:
+    """Heartbeat for a running job; False once the claim was lost."""
+    result = await db.execute(
+        update(models.FeedbackJob)
+        .where(
+            models.FeedbackJob.id == job_id,
+            models.FeedbackJob.status == "running",
+            models.FeedbackJob.claimed_by == worker_token,
+        )
+        .values(updated_at=datetime.utcnow())
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+async def finish_feedback_job(
+    db: AsyncSession, job_id: str, worker_token: str, job_status: str,
+    result_data: Optional[Dict[str, Any]] = None, error: Optional[str] = None
+) -> bool:
+    """Records the outcome only if `worker_token` still holds the claim; a reclaimed job's late result is dropped."""
+    result = await db.execute(
+        update(models.FeedbackJob)
+        .where(
+            models.FeedbackJob.id == job_id,
+            models.FeedbackJob.status == "running",
+            models.FeedbackJob.claimed_by == worker_token,
+        )
+        .values(
+            status=job_status,
+            claimed_by=None,
+            result_data=json.dumps(result_data) if result_data is not None else None,
+            error=error,
+            updated_at=datetime.utcnow()
+        )
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+async def release_stale_feedback_jobs(db: AsyncSession, older_than: datetime) -> int:
+    """Returns running jobs whose lease was not renewed since `older_than` (their worker died) to pending."""
+    result = await db.execute(
+        update(models.FeedbackJob)
+        .where(models.FeedbackJob.status == "running", models.FeedbackJob.updated_at < older_than)
+        .values(status="pending", claimed_by=None, updated_at=datetime.utcnow())
+    )
+    await db.commit()
+    return result.rowcount
+
+async def get_pending_feedback_job_ids(db: AsyncSession) -> list[str]:
+    """Every pending job id, oldest first."""
+    result = await db.execute(
+        select(models.FeedbackJob.id)
+        .filter(models.FeedbackJob.status == "pending")
+        .order_by(models.FeedbackJob.created_at)
+    )
+    return list(result.scalars().all())
+
+# --- Email Outbox ---
+
+def queue_email(
+    db: AsyncSession, kind: str, recipient: str, subject: str, body: str, expires_at: Optional[datetime] = None
+) -> models.EmailOutbox:
+    """Adds a message to the outbox; it is sent once the caller's transaction commits."""
+    db_email = models.EmailOutbox(
+        kind=kind,
+        recipient=recipient,
+        subject=subject,
+        body=body,
+        status="pending",
+        attempts=0,
+        next_attempt_at=datetime.utcnow(),
+        expires_at=expires_at,
+        created_at=datetime.utcnow(),
+        updated_at=datetime.utcnow()
+    )
+    db.add(db_email)
+    return db_email
+
+async def claim_outbox_batch(db: AsyncSession, worker_token: str, limit: int) -> List[models.EmailOutbox]:
+    """
+    Moves up to `limit` due messages to "sending" under `worker_token` in one
+    UPDATE, so concurrent workers never claim the same row. Messages whose
+    code has already expired are retired instead of sent.
+    """
+    now = datetime.utcnow()
+    await db.execute(
+        update(models.EmailOutbox)
+        .where(models.EmailOutbox.status == "pending", models.EmailOutbox.expires_at < now)
+        .values(status="expired", updated_at=now)
+    )
+    due = (
+        select(models.EmailOutbox.id)
+        .where(models.EmailOutbox.status == "pending", models.EmailOutbox.next_attempt_at <= now)
+        .order_by(models.EmailOutbox.next_attempt_at, models.EmailOutbox.id)
+        .limit(limit)
+        .scalar_subquery()
+    )
+    await db.execute(
+        update(models.EmailOutbox)
+        .where(models.EmailOutbox.id.in_(due), models.EmailOutbox.status == "pending")
+        .values(status="sending", claimed_by=worker_token, attempts=models.EmailOutbox.attempts + 1, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    result = await db.execute(
+        select(models.EmailOutbox)
+        .filter(models.EmailOutbox.status == "sending", models.EmailOutbox.claimed_by == worker_token)
+        .order_by(models.EmailOutbox.id)
+    )
+    return list(result.scalars().all())
+
+async def mark_outbox_sent(db: AsyncSession, email_ids: List[int]):
+    if not email_ids:
+        return
+    now = datetime.utcnow()
+    await db.execute(
+        update(models.EmailOutbox)
+        .where(models.EmailOutbox.id.in_(email_ids))
+        .values(status="sent", claimed_by=None, last_error=None, sent_at=now, updated_at=now)
+    )
+    await db.commit()
+
+async def mark_outbox_failed(db: AsyncSession, email_id: int, error: str, retry_at: Optional[datetime]):
+    """Schedules another attempt at `retry_at`, or gives up for good if it is None."""
+    await db.execute(
+        update(models.EmailOutbox)
+        .where(models.EmailOutbox.id == email_id)
+        .values(
+            status="pending" if retry_at else "failed",
+            claimed_by=None,
+            last_error=error[:500],
+            next_attempt_at=retry_at or datetime.utcnow(),
+            updated_at=datetime.utcnow()
+        )
+    )
+    await db.commit()
+
+async def release_stale_outbox_claims(db: AsyncSession, older_than: datetime) -> int:
+    """Returns messages stuck in "sending" (their worker died) to the queue."""
+    result = await db.execute(
+        update(models.EmailOutbox)
+        .where(models.EmailOutbox.status == "sending", models.EmailOutbox.updated_at < older_than)
+        .values(status="pending", claimed_by=None, next_attempt_at=datetime.utcnow(), updated_at=datetime.utcnow())
+    )
+    await db.commit()
+    return result.rowcount
+
+async def purge_outbox(db: AsyncSession, older_than: datetime) -> int:
+    """Deletes delivered, failed and expired messages created before `older_than`."""
+    result = await db.execute(
+        delete(models.EmailOutbox)
+        .where(models.EmailOutbox.status.in_(("sent", "failed", "expired")), models.EmailOutbox.created_at < older_than)
+    )
+    await db.commit()
+    return result.rowcount
+
+# --- Question Bank ---
+
+async def get_questions(db: AsyncSession) -> List[models.Question]:
+    result = await db.execute(select(models.Question).order_by(models.Question.id))
+    return list(result.scalars().all())
+
+async def get_question_bank_fingerprint(db: AsyncSession) -> tuple[int, int]:
+    """(row count, max id): cheap to read, and changes whenever ingestion adds or removes rows."""
+    result = await db.execute(select(func.count(models.Question.id), func.coalesce(func.max(models.Question.id), 0)))
+    count, max_id = result.one()
+    return count, max_id
+
+async def get_question_keys(db: AsyncSession) -> set[tuple[int, str]]:
+    result = await db.execute(select(models.Question.part, models.Question.normalized_text))
+    return set(result.tuples().all())
+
+async def add_questions(db: AsyncSession, questions: List[Dict[str, Any]]):
+    db.add_all([models.Question(**question, created_at=datetime.utcnow()) for question in questions])
+    await db.commit()
+
+async def get_seen_questions(db: AsyncSession, user_id: int) -> Optional[bytes]:
+    result = await db.execute(select(models.User.seen_questions).filter(models.User.id == user_id))
+    return result.scalar_one_or_none()
+
+def _merge_bitsets(a: bytes, b: bytes) -> bytes:
+    if len(a) < len(b):
+        a, b = b, a
+    return bytes(x | y for x, y in zip(a, b)) + a[len(b):]
+
+async def add_seen_questions(db: AsyncSession, user_id: int, seen_questions: bytes):
+    """
+    ORs `seen_questions` into the stored bitset, so concurrent sessions for
+    the same user can't overwrite each other's bits. The row is locked where
+    the database supports FOR UPDATE; the compare-and-swap covers SQLite.
+    """
+    while True:
+        result = await db.execute(
+            select(models.User.seen_questions).filter(models.User.id == user_id).with_for_update()
+        )
+        row = result.first()
+        if row is None:
+            return
+        current = row[0]
+        unchanged = models.User.seen_questions.is_(None) if current is None else models.User.seen_questions == current
+        result = await db.execute(
+            update(models.User)
+            .where(models.User.id == user_id, unchanged)
+            .values(seen_questions=_merge_bitsets(current or b"", seen_questions))
+        )
+        await db.commit()
+        if result.rowcount:
+            return
+
+# --- Examiner Sessions ---
+
+async def create_examiner_session(db: AsyncSession, user_id: int) -> models.ExaminerSession:
+    db_session = models.ExaminerSession(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        turns="[]",
+        turn_count=0,
+        created_at=datetime.utcnow(),
+        updated_at=datetime.utcnow()
+    )
+    db.add(db_session)
+    await db.commit()
+    return db_session
+
+async def get_examiner_session(db: AsyncSession, user_id: int, session_id: str) -> Optional[models.ExaminerSession]:
+    result = await db.execute(
+        select(models.ExaminerSession).filter(
+            models.ExaminerSession.id == session_id,
+            models.ExaminerSession.user_id == user_id
+        )
+    )
+    return result.scalar_one_or_none()
+
+async def save_examiner_session(
+    db: AsyncSession, session_id: str, summary: Optional[str], turns: List[Dict[str, str]], turn_count: int
+):
+    await db.execute(
+        update(models.ExaminerSession)
+        .where(models.ExaminerSession.id == session_id)
+        .values(summary=summary, turns=json.dumps(turns), turn_count=turn_count, updated_at=datetime.utcnow())
+    )
+    await db.commit()
+
+async def delete_examiner_session(db: AsyncSession, user_id: int, session_id: str) -> bool:
+    result = await db.execute(
+        delete(models.ExaminerSession).where(
+            models.ExaminerSession.id == session_id,
+            models.ExaminerSession.user_id == user_id
+        )
+    )
+    await db.commit()
+    return result.rowcount == 1
+
 # --- Authentication Helpers ---
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_db)
-) -> models.User:
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+def _token_subject(token: str) -> tuple[str, int]:
+    """(email, token version) from an access token; tokens issued before versioning count as 0."""
     try:
         payload = security.decode_access_token(token)
         email: str = payload.get("sub")
         if email is None:
-            raise credentials_exception
+            raise _credentials_exception()
+        return email, int(payload.get("ver", 0))
     except Exception:
-        raise credentials_exception
-    
+        raise _credentials_exception()
+
+async def _load_current_user(db: AsyncSession, email: str, token_version: int) -> models.User:
     user = await get_user_by_email(db, email=email)
-    if user is None:
-        raise credentials_exception
+    if user is None or (user.token_version or 0) != token_version:
+        raise _credentials_exception()
+    user_cache.put(user)
     return user
 
-async def get_current_active_user(
-    current_user: models.User = Depends(get_current_user)
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+) -> models.User:
+    """
+    Served from the user cache when possible, so most requests don't touch the
+    database for auth. The returned User is not attached to `db`; endpoints
+    that modify the user must depend on get_current_user_for_update instead.
+    """
+    email, token_version = _token_subject(token)
+    cached = user_cache.get(email)
+    if cached is not None and (cached.token_version or 0) == token_version:
+        return cached
+    # Cache miss, or the token is newer than the cached entry: ask the database.
+    return await _load_current_user(db, email, token_version)
+
+async def get_current_user_for_update(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
 ) -> models.User:
-    if not current_user.is_verified:
+    """Always loads the user through `db`, so changes can be committed."""
+    email, token_version = _token_subject(token)
+    return await _load_current_user(db, email, token_version)
+
+def _require_verified(user: models.User) -> models.User:
+    if not user.is_verified:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Account is not verified"
         )
-    return current_user
+    return user
+
+async def get_current_active_user(
+    current_user: models.User = Depends(get_current_user)
+) -> models.User:
+    return _require_verified(current_user)
+
+async def get_current_active_user_for_update(
+    current_user: models.User = Depends(get_current_user_for_update)
+) -> models.User:
+    return _require_verified(current_user)
 
 async def delete_current_user(db: AsyncSession, user: models.User):
     await db.delete(user)
     await db.commit()
+    user_cache.invalidate(user.email)
@@ -1,31 +1,115 @@
+import os
+
+from sqlalchemy import event, inspect
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 
-# This is the correct line for a simple, local SQLite database.
-# It will create a file named 'test.db' in your project folder.
-SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
+from metrics import instrument_engine
 
-# We add echo=True for local development so we can see the SQL commands in the terminal.
-engine = create_async_engine(SQLALCHEMY_DATABASE_URL, echo=True)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# The rest of the file defines how to talk to the database.
-AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
-Base = declarative_base()
+# Defaults to the local SQLite file; set DATABASE_URL to a postgres:// URL in production.
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+RUN_MIGRATIONS_ON_STARTUP = os.getenv("RUN_MIGRATIONS_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+
+def normalize_database_url(url: str) -> str:
+    """Hosting providers hand out postgres:// URLs; SQLAlchemy needs the async driver spelled out."""
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
 
-# В файле database.py
 
-# from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
-# from sqlalchemy.orm import declarative_base
+SQLALCHEMY_DATABASE_URL = normalize_database_url(SQLALCHEMY_DATABASE_URL)
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
 
-SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
-engine = create_async_engine(SQLALCHEMY_DATABASE_URL, echo=True)
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers proceed while a write is in progress; NORMAL sync is
+    # durable across application crashes and much cheaper than FULL under WAL.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.close()
+
+
+def build_engine(url: str):
+    if url.startswith("sqlite"):
+        sqlite_engine = create_async_engine(
+            url,
+            echo=DB_ECHO,
+            connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        )
+        event.listen(sqlite_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+        return sqlite_engine
+    return create_async_engine(
+        url,
+        echo=DB_ECHO,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+
+engine = build_engine(SQLALCHEMY_DATABASE_URL)
+instrument_engine(engine)
 
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 Base = declarative_base()
 
-# --- ДОБАВЬТЕ ЭТУ ФУНКЦИЮ В КОНЕЦ ФАЙЛА ---
 # Эта функция будет нашим единым источником сессий БД для всего приложения
 async def get_db():
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+# --- Migrations ---
+
+# Databases created by the old create_all() startup have no alembic_version
+# table. They are stamped at the newest revision whose tables all exist.
+LEGACY_BASELINES = [
+    ("0002_feedback_jobs", {"users", "conversations", "feedback_jobs"}),
+    ("0001_initial", {"users", "conversations"}),
+]
+
+
+def alembic_config(connection=None):
+    from alembic.config import Config
+
+    config = Config(os.path.join(BASE_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BASE_DIR, "migrations"))
+    config.set_main_option("sqlalchemy.url", SQLALCHEMY_DATABASE_URL)
+    config.attributes["connection"] = connection
+    return config
+
+
+def _upgrade(sync_connection) -> None:
+    from alembic import command
+
+    config = alembic_config(sync_connection)
+    tables = set(inspect(sync_connection).get_table_names())
+    if "alembic_version" not in tables:
+        for revision, required in LEGACY_BASELINES:
+            if required <= tables:
+                print(f"ℹ️ DATABASE INFO: Stamping existing schema at revision {revision}.")
+                command.stamp(config, revision)
+                break
+    command.upgrade(config, "head")
+
+
+async def run_migrations() -> None:
+    """Brings the schema to the latest revision (alembic upgrade head)."""
+    async with engine.begin() as connection:
+        await connection.run_sync(_upgrade)
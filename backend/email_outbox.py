@@ -0,0 +1,133 @@
+# email_outbox.py
+
+import asyncio
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+import aiosmtplib
+
+import crud
+from database import AsyncSessionLocal
+from mail_services import build_message, smtp_pool
+
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", "20"))
+EMAIL_OUTBOX_POLL_SECONDS = float(os.getenv("EMAIL_OUTBOX_POLL_SECONDS", "5"))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "6"))
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_OUTBOX_RETRY_BASE_SECONDS", "5"))
+EMAIL_OUTBOX_RETRY_MAX_SECONDS = float(os.getenv("EMAIL_OUTBOX_RETRY_MAX_SECONDS", "300"))
+# A claim older than this belongs to a worker that died mid-send.
+EMAIL_OUTBOX_CLAIM_TIMEOUT_SECONDS = float(os.getenv("EMAIL_OUTBOX_CLAIM_TIMEOUT_SECONDS", "120"))
+EMAIL_OUTBOX_RETENTION_DAYS = float(os.getenv("EMAIL_OUTBOX_RETENTION_DAYS", "7"))
+EMAIL_OUTBOX_HOUSEKEEPING_SECONDS = 60
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter (half to full delay), capped at EMAIL_OUTBOX_RETRY_MAX_SECONDS."""
+    ceiling = min(EMAIL_OUTBOX_RETRY_MAX_SECONDS, EMAIL_OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+class EmailOutboxWorker:
+    """
+    Sends messages queued in the email_outbox table over the shared SMTP pool.
+    Endpoints commit the message with the code it carries and call notify();
+    the worker also polls, so rows written by other processes, retries that
+    come due and anything left over from a restart are picked up without it.
+    Each process claims rows under its own token, so several can run at once.
+    """
+
+    def __init__(self):
+        self.worker_token = uuid.uuid4().hex
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._last_housekeeping = 0.0
+
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await smtp_pool.close()
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            # Cleared before draining so a notify() that lands mid-drain is not lost.
+            self._wakeup.clear()
+            try:
+                await self._housekeeping()
+                await self._drain()
+            except Exception as e:
+                print(f"❌ EMAIL OUTBOX ERROR: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=EMAIL_OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _housekeeping(self) -> None:
+        loop_time = asyncio.get_running_loop().time()
+        if loop_time - self._last_housekeeping < EMAIL_OUTBOX_HOUSEKEEPING_SECONDS:
+            return
+        self._last_housekeeping = loop_time
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            released = await crud.release_stale_outbox_claims(
+                db, older_than=now - timedelta(seconds=EMAIL_OUTBOX_CLAIM_TIMEOUT_SECONDS)
+            )
+            await crud.purge_outbox(db, older_than=now - timedelta(days=EMAIL_OUTBOX_RETENTION_DAYS))
+        if released:
+            print(f"ℹ️ EMAIL OUTBOX INFO: Re-queued {released} messages from an interrupted worker.")
+
+    async def _drain(self) -> None:
+        while True:
+            async with AsyncSessionLocal() as db:
+                batch = [
+                    (email.id, email.attempts, build_message(email.recipient, email.subject, email.body))
+                    for email in await crud.claim_outbox_batch(db, self.worker_token, EMAIL_OUTBOX_BATCH_SIZE)
+                ]
+            if not batch:
+                return
+            results = await asyncio.gather(*(self._deliver(*item) for item in batch))
+            async with AsyncSessionLocal() as db:
+                await crud.mark_outbox_sent(db, [email_id for email_id in results if email_id is not None])
+            if len(batch) < EMAIL_OUTBOX_BATCH_SIZE:
+                return
+
+    async def _deliver(self, email_id: int, attempts: int, message) -> Optional[int]:
+        """Returns the id on success; failures are recorded here."""
+        try:
+            await smtp_pool.send(message)
+            self.sent += 1
+            return email_id
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            permanent = isinstance(e, aiosmtplib.SMTPRecipientsRefused)
+            if permanent or attempts >= EMAIL_OUTBOX_MAX_ATTEMPTS:
+                retry_at = None
+                self.failed += 1
+                print(f"❌ EMAIL OUTBOX ERROR: Giving up on message {email_id} after {attempts} attempts: {error}")
+            else:
+                retry_at = datetime.utcnow() + timedelta(seconds=retry_delay(attempts))
+                self.retried += 1
+                print(f"⚠️ EMAIL OUTBOX WARNING: Message {email_id} attempt {attempts} failed, retrying: {error}")
+            async with AsyncSessionLocal() as db:
+                await crud.mark_outbox_failed(db, email_id, error, retry_at)
+            return None
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "retried": self.retried, "failed": self.failed}
+
+
+email_outbox = EmailOutboxWorker()
@@ -0,0 +1,129 @@
+# feedback_cache.py
+
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+FEEDBACK_CACHE_TTL_SECONDS = float(os.getenv("FEEDBACK_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+FEEDBACK_CACHE_MAX_ENTRIES = int(os.getenv("FEEDBACK_CACHE_MAX_ENTRIES", "2048"))
+
+
+def normalize_conversation(conversation: List[Dict[str, Any]]) -> List[List[str]]:
+    """Keeps only what the prompt sees, with whitespace collapsed."""
+    return [
+        [" ".join(str(msg.get("question", "")).split()), " ".join(str(msg.get("answer", "")).split())]
+        for msg in conversation
+    ]
+
+
+def make_feedback_key(conversation: List[Dict[str, Any]], prompt_version: str, model_name: str) -> str:
+    material = json.dumps(
+        {"conversation": normalize_conversation(conversation), "prompt": prompt_version, "model": model_name},
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class LeaderCancelled(Exception):
+    """Set on a shared generation whose leader was cancelled; waiters retry."""
+
+
+class FeedbackCache:
+    """
+    TTL + size-bounded LRU for successful feedback results. Concurrent requests
+    for the same key share a single in-flight generation.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[float, Dict]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] < time.monotonic():
+            del self._entries[key]
+            self.evictions += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return copy.deepcopy(entry[1])
+
+    def put(self, key: str, value: Dict) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, copy.deepcopy(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_create(self, key: str, factory: Callable[[], Awaitable[Dict]]) -> Dict:
+        """
+        Returns the cached value or awaits `factory`. Only values returned by the
+        factory are stored; if it raises, nothing is cached and every waiter sees
+        the exception. If the leader is cancelled, its waiters start over and
+        one of them takes over the generation.
+        """
+        while True:
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+
+            pending = self._in_flight.get(key)
+            if pending is None:
+                break
+            self.coalesced += 1
+            try:
+                return copy.deepcopy(await asyncio.shield(pending))
+            except LeaderCancelled:
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = await factory()
+        except asyncio.CancelledError:
+            # Only this caller was cancelled; waiters must not inherit it.
+            self._in_flight.pop(key, None)
+            future.set_exception(LeaderCancelled(key))
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure doesn't log a warning.
+            future.exception()
+            raise
+        else:
+            self.put(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "in_flight": len(self._in_flight),
+        }
+
+
+feedback_cache = FeedbackCache(FEEDBACK_CACHE_TTL_SECONDS, FEEDBACK_CACHE_MAX_ENTRIES)
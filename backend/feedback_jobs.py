@@ -0,0 +1,175 @@
+# feedback_jobs.py
+
+import asyncio
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Set
+
+import ai_services
+import crud
+from database import AsyncSessionLocal
+
+FEEDBACK_JOB_WORKERS = int(os.getenv("FEEDBACK_JOB_WORKERS", "4"))
+FEEDBACK_JOB_MAX_ATTEMPTS = int(os.getenv("FEEDBACK_JOB_MAX_ATTEMPTS", "3"))
+FEEDBACK_JOB_MAX_WAIT_SECONDS = float(os.getenv("FEEDBACK_JOB_MAX_WAIT_SECONDS", "30"))
+# A running job whose lease was not renewed for this long belongs to a worker that died.
+FEEDBACK_JOB_LEASE_SECONDS = float(os.getenv("FEEDBACK_JOB_LEASE_SECONDS", "120"))
+FEEDBACK_JOB_HEARTBEAT_SECONDS = FEEDBACK_JOB_LEASE_SECONDS / 4
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class FeedbackJobRunner:
+    """
+    In-process workers for /practice/feedback-jobs. Job state lives in the
+    feedback_jobs table. Each process claims jobs under its own token and
+    renews the lease while a job runs, so several processes can share the
+    table; only jobs whose lease went stale (their worker died) are put back
+    to pending and re-queued. Long-poll waiters are woken through per-job
+    asyncio.Events.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.worker_token = uuid.uuid4().hex
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._events: Dict[str, Set[asyncio.Event]] = {}
+
+    async def start(self) -> None:
+        await self._requeue(queue_pending=True)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._reclaim()))
+
+    async def _requeue(self, queue_pending: bool = False) -> None:
+        """
+        Releases stale leases, then queues every pending job (on startup, or
+        when something was released). Claims are atomic, so queueing a job
+        another process also queued is harmless.
+        """
+        async with AsyncSessionLocal() as db:
+            released = await crud.release_stale_feedback_jobs(
+                db, older_than=datetime.utcnow() - timedelta(seconds=FEEDBACK_JOB_LEASE_SECONDS)
+            )
+            job_ids = await crud.get_pending_feedback_job_ids(db) if released or queue_pending else []
+        for job_id in job_ids:
+            self._queue.put_nowait(job_id)
+        if released:
+            print(f"ℹ️ FEEDBACK JOBS INFO: Reclaimed {released} jobs from an interrupted worker.")
+        if job_ids:
+            print(f"ℹ️ FEEDBACK JOBS INFO: Queued {len(job_ids)} pending jobs.")
+
+    async def _reclaim(self) -> None:
+        while True:
+            await asyncio.sleep(FEEDBACK_JOB_LEASE_SECONDS)
+            try:
+                await self._requeue()
+            except Exception as e:
+                print(f"❌ FEEDBACK JOBS ERROR: Could not reclaim stale jobs: {e}")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, job_id: str) -> None:
+        self._queue.put_nowait(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> None:
+        """Waits until the job finishes or `timeout` elapses; callers re-read the row."""
+        event = asyncio.Event()
+        self._events.setdefault(job_id, set()).add(event)
+        try:
+            # Re-read only after registering, so a job finishing in between still wakes us.
+            async with AsyncSessionLocal() as db:
+                job = await crud.get_feedback_job(db, job_id)
+            if job is None or job.status in TERMINAL_STATUSES:
+                return
+            await asyncio.wait_for(event.wait(), timeout=min(timeout, FEEDBACK_JOB_MAX_WAIT_SECONDS))
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            waiters = self._events.get(job_id)
+            if waiters is not None:
+                waiters.discard(event)
+                if not waiters:
+                    del self._events[job_id]
+
+    def _notify(self, job_id: str) -> None:
+        for event in self._events.pop(job_id, ()):
+            event.set()
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                print(f"❌ FEEDBACK JOBS ERROR: Job {job_id} crashed: {e}")
+            except asyncio.CancelledError:
+                # Raised out of a shared await while this worker was not cancelled: keep serving.
+                if asyncio.current_task().cancelling():
+                    raise
+                print(f"❌ FEEDBACK JOBS ERROR: Job {job_id} was cancelled from outside its worker.")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        async with AsyncSessionLocal() as db:
+            if not await crud.claim_feedback_job(db, job_id, self.worker_token):
+                return
+            job = await crud.get_feedback_job(db, job_id)
+            conversation = json.loads(job.request_data)
+            attempts = job.attempts
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            feedback_data = await ai_services.generate_final_feedback(conversation)
+        except Exception as e:
+            await self._attempt_failed(job_id, attempts, e)
+            return
+        except asyncio.CancelledError as e:
+            if asyncio.current_task().cancelling():
+                raise
+            await self._attempt_failed(job_id, attempts, e)
+            return
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+        if await self._finish(job_id, "completed", result_data=feedback_data):
+            self._notify(job_id)
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(FEEDBACK_JOB_HEARTBEAT_SECONDS)
+            try:
+                async with AsyncSessionLocal() as db:
+                    if not await crud.renew_feedback_job_claim(db, job_id, self.worker_token):
+                        print(f"⚠️ FEEDBACK JOBS WARNING: Lost the claim on job {job_id}; its result will be dropped.")
+                        return
+            except Exception as e:
+                print(f"⚠️ FEEDBACK JOBS WARNING: Could not renew the claim on job {job_id}: {e}")
+
+    async def _finish(self, job_id: str, job_status: str, **fields) -> bool:
+        async with AsyncSessionLocal() as db:
+            finished = await crud.finish_feedback_job(db, job_id, self.worker_token, job_status, **fields)
+        if not finished:
+            print(f"⚠️ FEEDBACK JOBS WARNING: Job {job_id} was reclaimed by another worker; dropping this result.")
+        return finished
+
+    async def _attempt_failed(self, job_id: str, attempts: int, error: BaseException) -> None:
+        message = str(error) or type(error).__name__
+        print(f"❌ FEEDBACK JOBS ERROR: Job {job_id} attempt {attempts} failed: {message}")
+        if attempts < FEEDBACK_JOB_MAX_ATTEMPTS:
+            if await self._finish(job_id, "pending", error=message):
+                asyncio.get_running_loop().call_later(2 ** attempts, self._queue.put_nowait, job_id)
+            return
+        if await self._finish(job_id, "failed", error=message):
+            self._notify(job_id)
+
+
+feedback_job_runner = FeedbackJobRunner(FEEDBACK_JOB_WORKERS)
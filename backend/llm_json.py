@@ -0,0 +1,329 @@
+# llm_json.py
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import schemas
+
+SCORE_FIELDS = ("overall_band_score", "fluency_score", "lexical_score", "grammar_score", "pronunciation_score")
+ARRAY_FIELD = "answer_analyses"
+
+
+def _loads_lenient(text: str) -> Any:
+    """json.loads after dropping trailing commas, the most common LLM glitch."""
+    return json.loads(re.sub(r',\s*([}\]])', r'\1', text))
+
+
+class FeedbackStreamParser:
+    """
+    Incrementally scans a streamed FeedbackResponse JSON document. Text can be
+    fed in arbitrary chunks; each call to `feed` returns the events that became
+    available:
+
+      ("scores", {...})           all score fields plus general_summary
+      ("answer_analysis", {...})  one element of answer_analyses, schema-valid
+
+    Prose before the root object is skipped. Only complete top-level values
+    and complete array elements are ever parsed.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields: Dict[str, Any] = {}
+        self.analyses: List[Dict] = []
+        self.invalid_analyses = 0
+        self.scores_emitted = False
+
+        self._pos = 0
+        self._started = False
+        self._finished = False
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._expect_key = True
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+        self._element_start: Optional[int] = None
+
+    def feed(self, text: str) -> List[Tuple[str, Dict]]:
+        self.buffer += text
+        events: List[Tuple[str, Dict]] = []
+        buf = self.buffer
+
+        while self._pos < len(buf) and not self._finished:
+            ch = buf[self._pos]
+
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._stack.append("{")
+                    self._expect_key = True
+                self._pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1 and self._expect_key:
+                        try:
+                            self._key = json.loads(buf[self._string_start:self._pos + 1])
+                        except ValueError:
+                            self._key = None
+                self._pos += 1
+                continue
+
+            depth = len(self._stack)
+            if ch == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif ch == ":" and depth == 1:
+                self._expect_key = False
+                self._value_start = self._pos + 1
+            elif ch in "{[":
+                if ch == "{" and depth == 2 and self._stack[-1] == "[" and self._key == ARRAY_FIELD:
+                    self._element_start = self._pos
+                self._stack.append(ch)
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                depth = len(self._stack)
+                if ch == "}" and depth == 2 and self._element_start is not None:
+                    self._complete_element(buf[self._element_start:self._pos + 1], events)
+                    self._element_start = None
+                elif depth == 0:
+                    # Root object closed: flush its last value.
+                    self._complete_field(buf[self._value_start:self._pos] if self._value_start else "", events)
+                    self._finished = True
+            elif ch == "," and depth == 1:
+                self._complete_field(buf[self._value_start:self._pos] if self._value_start else "", events)
+                self._expect_key = True
+                self._key = None
+                self._value_start = None
+
+            self._pos += 1
+
+        return events
+
+    def _complete_field(self, raw: str, events: List[Tuple[str, Dict]]) -> None:
+        if self._key is None or not raw.strip():
+            return
+        try:
+            self.fields[self._key] = _loads_lenient(raw.strip())
+        except ValueError:
+            return
+        if not self.scores_emitted and all(f in self.fields for f in SCORE_FIELDS + ("general_summary",)):
+            self.scores_emitted = True
+            events.append(("scores", {f: self.fields[f] for f in SCORE_FIELDS + ("general_summary",)}))
+
+    def _complete_element(self, raw: str, events: List[Tuple[str, Dict]]) -> None:
+        try:
+            item = schemas.AnswerAnalysis.model_validate(_loads_lenient(raw)).model_dump()
+        except ValueError:
+            self.invalid_analyses += 1
+            return
+        self.analyses.append(item)
+        events.append(("answer_analysis", item))
+
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+    def result(self) -> Dict:
+        """Assembles a FeedbackResponse from everything parsed so far; raises if incomplete."""
+        data = {f: self.fields.get(f) for f in SCORE_FIELDS + ("general_summary",)}
+        data[ARRAY_FIELD] = list(self.analyses)
+        return schemas.FeedbackResponse.model_validate(data).model_dump()
+
+
+def _next_significant(text: str, pos: int) -> str:
+    while pos < len(text) and text[pos] in " \t\r\n":
+        pos += 1
+    return text[pos] if pos < len(text) else ""
+
+
+def _drop_trailing_comma(out: List[str]) -> None:
+    i = len(out) - 1
+    while i >= 0 and out[i] in " \t\r\n":
+        i -= 1
+    if i >= 0 and out[i] == ",":
+        del out[i]
+
+
+def _close_at(out: List[str], length: int, open_stack: List[str]) -> str:
+    """`out` cut back to `length` with the containers open at that point closed."""
+    kept = out[:length]
+    _drop_trailing_comma(kept)
+    return "".join(kept) + "".join("}" if opened == "{" else "]" for opened in reversed(open_stack))
+
+
+def _scan_json(text: str) -> Optional[Tuple[List[str], List[Tuple[int, List[str]]], bool]]:
+    """
+    Single pass behind repair_json_text. Returns the rewritten pieces, the safe
+    points (length of the pieces, open containers) where cutting and closing
+    yields valid JSON, and whether the root object was closed in `text`.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+
+    out: List[str] = []
+    stack: List[str] = []
+    # For each open object: True while the next string is a key.
+    expect_key: List[bool] = []
+    in_string = False
+    string_is_key = False
+    escape = False
+    safe_points: List[Tuple[int, List[str]]] = [(0, [])]
+
+    def mark_safe():
+        safe_points.append((len(out), list(stack)))
+
+    pos = start
+    while pos < len(text):
+        ch = text[pos]
+        if in_string:
+            if escape:
+                escape = False
+                out.append(ch)
+            elif ch == "\\":
+                escape = True
+                out.append(ch)
+            elif ch == '"':
+                follower = _next_significant(text, pos + 1)
+                closes = follower in (":",) if string_is_key else follower in (",", "}", "]", "")
+                if closes:
+                    in_string = False
+                    out.append(ch)
+                    if not string_is_key:
+                        mark_safe()
+                else:
+                    out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            elif ch == "\r":
+                out.append("\\r")
+            elif ch == "\t":
+                out.append("\\t")
+            else:
+                out.append(ch)
+            pos += 1
+            continue
+
+        if ch == '"':
+            in_string = True
+            string_is_key = bool(stack) and stack[-1] == "{" and expect_key[-1]
+            out.append(ch)
+        elif ch in "{[":
+            stack.append(ch)
+            if ch == "{":
+                expect_key.append(True)
+            out.append(ch)
+            mark_safe()
+        elif ch in "}]":
+            if not stack:
+                break
+            _drop_trailing_comma(out)
+            opened = stack.pop()
+            if opened == "{":
+                expect_key.pop()
+            out.append("}" if opened == "{" else "]")
+            if not stack:
+                return out, safe_points, True
+            mark_safe()
+        elif ch == ",":
+            if stack and stack[-1] == "{":
+                expect_key[-1] = True
+            mark_safe()
+            out.append(ch)
+        elif ch == ":":
+            if stack and stack[-1] == "{":
+                expect_key[-1] = False
+            out.append(ch)
+        else:
+            out.append(ch)
+        pos += 1
+    return out, safe_points, False
+
+
+def repair_json_text(text: str) -> Optional[str]:
+    """
+    Rewrites the first JSON object in `text` into something json.loads usually
+    accepts: prose around it is dropped, trailing commas removed, raw newlines
+    and unescaped quotes inside strings escaped, and a truncated tail cut back
+    to the last complete value before the open containers are closed.
+    Returns None if no object starts in `text`.
+    """
+    scan = _scan_json(text)
+    if scan is None:
+        return None
+    out, safe_points, closed = scan
+    return "".join(out) if closed else _close_at(out, *safe_points[-1])
+
+
+def extract_json_object(text: str) -> Dict:
+    """
+    Parses the first (possibly damaged) JSON object in an LLM response; {} if
+    none. Where the repair still leaves invalid JSON, the longest valid prefix
+    is kept, so salvage_feedback only has to re-request what came after it.
+    """
+    scan = _scan_json(text)
+    if scan is None:
+        return {}
+    out, safe_points, closed = scan
+    ends = [0]
+    for piece in out:
+        ends.append(ends[-1] + len(piece))
+
+    limit = len(safe_points)
+    if closed:
+        candidate = "".join(out)
+    else:
+        limit -= 1
+        candidate = _close_at(out, *safe_points[limit])
+        if ends[safe_points[limit][0]] < ends[-1]:
+            print(f"⚠️ LLM JSON WARNING: Response truncated, dropped incomplete tail: {''.join(out[safe_points[limit][0]:])[:80]!r}")
+    while True:
+        try:
+            data = json.loads(candidate)
+            break
+        except json.JSONDecodeError as e:
+            # Every longer prefix still contains the defect at e.pos.
+            while limit and ends[safe_points[limit - 1][0]] > e.pos:
+                limit -= 1
+            if not limit:
+                return {}
+            limit -= 1
+            candidate = _close_at(out, *safe_points[limit])
+            print(f"⚠️ LLM JSON WARNING: Invalid JSON at offset {e.pos} ({e.msg}), keeping the valid prefix.")
+    return data if isinstance(data, dict) else {}
+
+
+def salvage_feedback(data: Dict) -> Tuple[Dict, List[Optional[Dict]]]:
+    """
+    Splits a partially valid feedback object into its valid score fields and a
+    list of answer analyses where each invalid element is replaced by None.
+    """
+    scores: Dict[str, Any] = {}
+    for field in SCORE_FIELDS + ("general_summary",):
+        if field in data:
+            scores[field] = data[field]
+    try:
+        probe = dict(scores, answer_analyses=[])
+        schemas.FeedbackResponse.model_validate(probe)
+    except ValueError:
+        scores = {}
+
+    analyses: List[Optional[Dict]] = []
+    raw_items = data.get(ARRAY_FIELD)
+    for item in raw_items if isinstance(raw_items, list) else []:
+        try:
+            analyses.append(schemas.AnswerAnalysis.model_validate(item).model_dump())
+        except ValueError:
+            analyses.append(None)
+    return scores, analyses
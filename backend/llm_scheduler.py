@@ -0,0 +1,308 @@
+# llm_scheduler.py
+
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+
+from metrics import LLM_QUEUE_WAIT, track_dependency
+
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "1000"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "1024"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "8"))
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the provider while the circuit breaker is open."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Throttling, provider 5xx and timeouts are retried; everything else is not."""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    # google.api_core exceptions carry the HTTP status in `.code`.
+    code = getattr(error, "code", None)
+    return isinstance(code, int) and code in RETRYABLE_STATUS_CODES
+
+
+def model_label(model: Any) -> str:
+    """The name a model's circuit breaker is keyed by ("models/" prefix dropped)."""
+    name = str(getattr(model, "model_name", None) or "default")
+    return name[len("models/"):] if name.startswith("models/") else name
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt size (about four characters per token) used for TPM budgeting."""
+    return max(1, len(text) // 4)
+
+
+class TokenBucket:
+    """Continuous-refill bucket; `capacity` units become available per minute."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        # Requests larger than the whole bucket only wait for a full bucket.
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= amount
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_progress = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> None:
+        state = self.state
+        if state == "open":
+            raise CircuitOpenError(f"LLM circuit for {self.name} is open; failing fast.")
+        if state == "half_open":
+            # Let a single trial request through; everyone else keeps failing fast.
+            if self.trial_in_progress:
+                raise CircuitOpenError(f"LLM circuit for {self.name} is half-open; trial in progress.")
+            self.trial_in_progress = True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.trial_in_progress or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.trial_in_progress:
+                print(f"⚠️ LLM SCHEDULER WARNING: Circuit for {self.name} opened after {self.failures} failures.")
+            self.opened_at = time.monotonic()
+        self.trial_in_progress = False
+
+
+class LLMScheduler:
+    """
+    Single gate for every Gemini call in the process. Enforces requests/min and
+    tokens/min budgets plus a concurrency cap, retries throttling and 5xx errors
+    with jittered exponential backoff, and trips a per-model circuit breaker so
+    callers fail fast while that model is down and fallbacks stay usable.
+    """
+
+    def __init__(self):
+        self.requests = TokenBucket(LLM_REQUESTS_PER_MINUTE)
+        self.tokens = TokenBucket(LLM_TOKENS_PER_MINUTE)
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        self._admission = asyncio.Lock()
+
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.rejected = 0
+        self._latencies: deque = deque(maxlen=512)
+        self._queue_waits: deque = deque(maxlen=512)
+
+    async def _admit(self, estimated_tokens: int) -> None:
+        """Waits (FIFO) until both budgets can cover the request, then charges them."""
+        self.queued += 1
+        started = time.monotonic()
+        try:
+            async with self._admission:
+                while True:
+                    delay = max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+                    if delay <= 0:
+                        break
+                    await asyncio.sleep(delay)
+                self.requests.take(1)
+                self.tokens.take(estimated_tokens)
+        finally:
+            self.queued -= 1
+            waited = time.monotonic() - started
+            self._queue_waits.append(waited)
+            LLM_QUEUE_WAIT.observe(waited)
+
+    def breaker(self, model_name: str) -> CircuitBreaker:
+        breaker = self.breakers.get(model_name)
+        if breaker is None:
+            breaker = self.breakers[model_name] = CircuitBreaker(
+                model_name, LLM_CIRCUIT_FAILURE_THRESHOLD, LLM_CIRCUIT_RESET_SECONDS
+            )
+        return breaker
+
+    def record_deadline_exceeded(self, model_name: str) -> None:
+        """
+        One failure for a logical request that outlived its deadline, however
+        many calls it had fanned out to; the cancelled calls are not counted.
+        """
+        self.breaker(model_name).record_failure()
+
+    def _settle_tokens(self, response: Any, estimated_tokens: int) -> None:
+        """Charges the difference between the estimate and reported usage, when available."""
+        usage = getattr(response, "usage_metadata", None)
+        total = getattr(usage, "total_token_count", None) if usage is not None else None
+        if isinstance(total, int) and total > 0:
+            self.tokens.take(total - estimated_tokens)
+
+    @asynccontextmanager
+    async def _attempt(self, breaker: CircuitBreaker, estimated_tokens: int, operation: str):
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            self.rejected += 1
+            raise
+        # run/stream record the outcome of calls that return or raise an Exception.
+        # Cancellation (a losing hedge, a deadline, a client going away) says
+        # nothing certain about the provider, so it only releases a half-open trial;
+        # deadlines are counted once per request via record_deadline_exceeded.
+        try:
+            await self._admit(estimated_tokens)
+            async with self._slots:
+                self.in_flight += 1
+                started = time.monotonic()
+                try:
+                    async with track_dependency("gemini", operation):
+                        yield
+                finally:
+                    self.in_flight -= 1
+                    self._latencies.append(time.monotonic() - started)
+        except (asyncio.CancelledError, GeneratorExit):
+            breaker.trial_in_progress = False
+            raise
+
+    async def _backoff(self, attempt: int, error: BaseException) -> None:
+        self.retries += 1
+        delay = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * (2 ** attempt)))
+        print(f"⚠️ LLM SCHEDULER WARNING: Attempt {attempt + 1} failed ({error}); retrying in {delay:.2f}s.")
+        await asyncio.sleep(delay)
+
+    async def run(self, call: Callable[[], Awaitable[T]], prompt_text: str, model_name: str) -> T:
+        """Runs `call` (a fresh provider coroutine per attempt) under the scheduler's policies."""
+        breaker = self.breaker(model_name)
+        estimated_tokens = estimate_tokens(prompt_text) + LLM_EXPECTED_OUTPUT_TOKENS
+        attempt = 0
+        while True:
+            try:
+                async with self._attempt(breaker, estimated_tokens, "generate"):
+                    response = await call()
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                if is_retryable(e):
+                    breaker.record_failure()
+                    if attempt < LLM_MAX_RETRIES and breaker.state == "closed":
+                        await self._backoff(attempt, e)
+                        attempt += 1
+                        continue
+                else:
+                    # Not the provider's fault (bad request, safety block); keep the breaker as is.
+                    breaker.trial_in_progress = False
+                self.failed += 1
+                raise
+            breaker.record_success()
+            self.completed += 1
+            self._settle_tokens(response, estimated_tokens)
+            return response
+
+    async def generate(self, model: Any, prompt: str, **kwargs: Any) -> Any:
+        return await self.run(lambda: model.generate_content_async(prompt, **kwargs), prompt, model_label(model))
+
+    async def stream(self, model: Any, prompt: str, **kwargs: Any) -> AsyncIterator[Any]:
+        """
+        Streams chunks of a generation. Retries only happen before the first chunk;
+        the concurrency slot is held until the stream is exhausted.
+        """
+        breaker = self.breaker(model_label(model))
+        estimated_tokens = estimate_tokens(prompt) + LLM_EXPECTED_OUTPUT_TOKENS
+        attempt = 0
+        while True:
+            received_any = False
+            try:
+                async with self._attempt(breaker, estimated_tokens, "stream"):
+                    response = await model.generate_content_async(prompt, stream=True, **kwargs)
+                    async for chunk in response:
+                        received_any = True
+                        yield chunk
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                if is_retryable(e):
+                    breaker.record_failure()
+                    if not received_any and attempt < LLM_MAX_RETRIES and breaker.state == "closed":
+                        await self._backoff(attempt, e)
+                        attempt += 1
+                        continue
+                else:
+                    breaker.trial_in_progress = False
+                self.failed += 1
+                raise
+            breaker.record_success()
+            self.completed += 1
+            return
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+        waits = sorted(self._queue_waits)
+
+        def percentile(values, p):
+            return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+        return {
+            "queue_depth": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            # Per model; "state" is for /llm/stats, the numeric fields also become gauges.
+            "circuits": {
+                name: {"state": breaker.state, "open": int(breaker.state != "closed"), "failures": breaker.failures}
+                for name, breaker in self.breakers.items()
+            },
+            "latency_p50_seconds": percentile(latencies, 0.5),
+            "latency_p95_seconds": percentile(latencies, 0.95),
+            "queue_wait_p95_seconds": percentile(waits, 0.95),
+            "request_budget_remaining": round(self.requests.tokens, 1),
+            "token_budget_remaining": round(self.tokens.tokens),
+        }
+
+
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,374 @@
+# loadtest.py
+"""
+End-to-end load benchmark for the API.
+
+Start the server against the local fakes so no paid API is touched, with
+rate limiting off (every virtual user logs in from the same IP, well past
+the default RATE_LIMIT_LOGIN_IP=20/60):
+
+    PROVIDER_MODE=fake RATE_LIMIT_ENABLED=false uvicorn main:app --port 8000
+
+To benchmark with the limiter on, raise the login limits instead, e.g.
+RATE_LIMIT_LOGIN_IP=100000/60 RATE_LIMIT_LOGIN_EMAIL=100000/60.
+
+Then, from this directory (the seed step writes verified users straight into
+the server's database):
+
+    python loadtest.py --seed --users 20 --duration 60 --out results.json
+    python loadtest.py --users 20 --duration 60 --compare results.json
+
+Each virtual user logs in and then loops over a weighted mix of /users/me,
+/conversations, /text-to-speech, /speech-to-text and /practice/final-feedback.
+The report lists throughput and p50/p95/p99 per endpoint. TTS is reported as
+tts_miss (a unique text, or the first request for a pooled one) and tts_hit
+(a pooled text already requested this run, which the server's TTS cache should
+answer); --tts-unique-fraction sets the share of unique texts so the numbers
+measure synthesis and not just the cache. The disk cache outlives restarts, so
+on a reused server the first request for a pooled text may be a hit as well.
+With --compare the run fails (exit code 1) if any endpoint's p95 or error rate
+regressed by more than the allowed margin against a previous --out file.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import math
+import random
+import sys
+import time
+import uuid
+import wave
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+DEFAULT_WEIGHTS = {
+    "users_me": 3,
+    "list_conversations": 2,
+    "save_conversation": 1,
+    "tts": 4,
+    "stt": 3,
+    "final_feedback": 1,
+}
+
+QUESTIONS = [
+    "Let's talk about your hometown. Where is it?",
+    "What do you like most about living there?",
+    "Do you work or are you a student?",
+    "How do you usually spend your weekends?",
+    "Describe a book that you enjoyed reading.",
+    "Why do you think people enjoy travelling?",
+    "How has technology changed the way people communicate?",
+    "Do you prefer cooking at home or eating out?",
+    "What kind of music do you listen to?",
+    "Should children learn a second language at school?",
+]
+
+ANSWERS = [
+    "I come from a small coastal town which is famous for its seafood and quiet beaches.",
+    "Honestly I think the people are very friendly, and the pace of life is much slower than in big cities.",
+    "I'm currently studying computer science at university, and I also work part-time in a cafe.",
+    "Usually I meet my friends, we go hiking or sometimes we just watch films together at home.",
+    "I recently read a novel about a family who moved abroad, and it made me think about my own experiences.",
+    "I believe travelling broadens the mind because you meet people with completely different perspectives.",
+]
+
+
+# Pooled TTS texts already requested this run; later requests for them should be cache hits.
+_requested_tts_texts = set()
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        # Virtual user index -> status of the /token call that kept it from running (0 = no response).
+        self.failed_logins: Dict[int, int] = {}
+
+    def record(self, name: str, seconds: float, status_code: Optional[int]) -> None:
+        self.latencies[name].append(seconds)
+        self.statuses[name][status_code or 0] += 1
+        if status_code is None or status_code >= 400:
+            self.errors[name] += 1
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(p * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> Dict[str, Dict]:
+    summary = {}
+    for name in sorted(recorder.latencies):
+        values = sorted(recorder.latencies[name])
+        count = len(values)
+        summary[name] = {
+            "count": count,
+            "errors": recorder.errors[name],
+            "error_rate": recorder.errors[name] / count if count else 0.0,
+            "rps": count / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+            "max_ms": values[-1] * 1000 if values else 0.0,
+            "statuses": {str(code): n for code, n in sorted(recorder.statuses[name].items())},
+        }
+    return summary
+
+
+def print_report(summary: Dict[str, Dict], elapsed: float) -> None:
+    total = sum(row["count"] for row in summary.values())
+    print(f"\nDuration {elapsed:.1f}s, {total} requests, {total / elapsed:.1f} req/s overall\n")
+    header = f"{'endpoint':<20}{'count':>8}{'err%':>8}{'rps':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, row in summary.items():
+        print(
+            f"{name:<20}{row['count']:>8}{row['error_rate'] * 100:>7.1f}%{row['rps']:>8.2f}"
+            f"{row['p50_ms']:>10.0f}{row['p95_ms']:>10.0f}{row['p99_ms']:>10.0f}{row['max_ms']:>10.0f}"
+        )
+
+
+def compare(summary: Dict[str, Dict], baseline: Dict[str, Dict], p95_margin: float, error_margin: float) -> List[str]:
+    """Returns one message per endpoint whose p95 or error rate regressed past the margins."""
+    regressions = []
+    for name, row in summary.items():
+        base = baseline.get(name)
+        if not base or not base["count"]:
+            continue
+        if base["p95_ms"] > 0 and row["p95_ms"] > base["p95_ms"] * (1 + p95_margin):
+            regressions.append(f"{name}: p95 {base['p95_ms']:.0f} ms -> {row['p95_ms']:.0f} ms")
+        if row["error_rate"] > base["error_rate"] + error_margin:
+            regressions.append(f"{name}: error rate {base['error_rate']:.1%} -> {row['error_rate']:.1%}")
+    return regressions
+
+
+def make_wav(seconds: float, sample_rate: int = 16000) -> bytes:
+    """A mono 16-bit tone, enough for the recognizer (or its fake) to chew on."""
+    frames = bytearray()
+    for i in range(int(seconds * sample_rate)):
+        sample = int(3000 * math.sin(2 * math.pi * 220 * i / sample_rate))
+        frames += sample.to_bytes(2, "little", signed=True)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(bytes(frames))
+    return buffer.getvalue()
+
+
+def make_conversation(answers: int) -> List[Dict]:
+    return [
+        {"question": random.choice(QUESTIONS), "answer": random.choice(ANSWERS), "part": 1}
+        for _ in range(answers)
+    ]
+
+
+def user_email(index: int) -> str:
+    return f"loadtest-{index}@example.com"
+
+
+async def seed_users(count: int, password: str) -> None:
+    """Creates (or re-verifies) the benchmark accounts directly in the server's database."""
+    from sqlalchemy import select
+
+    import models
+    import security
+    from database import AsyncSessionLocal, engine
+
+    engine.echo = False
+    hashed_password = security.get_password_hash(password)
+    async with AsyncSessionLocal() as db:
+        for i in range(count):
+            email = user_email(i)
+            result = await db.execute(select(models.User).filter(models.User.email == email))
+            user = result.scalar_one_or_none()
+            if user is None:
+                db.add(models.User(email=email, name=f"Load Test {i}", hashed_password=hashed_password, is_verified=True))
+            else:
+                user.hashed_password = hashed_password
+                user.is_verified = True
+        await db.commit()
+    print(f"Seeded {count} verified users.")
+
+
+class VirtualUser:
+    def __init__(self, index: int, client: httpx.AsyncClient, recorder: Recorder, args, audio: bytes):
+        self.index = index
+        self.client = client
+        self.recorder = recorder
+        self.args = args
+        self.audio = audio
+        self.headers: Dict[str, str] = {}
+        self.operations = list(args.weights)
+        self.weights = [args.weights[name] for name in self.operations]
+
+    async def call(self, name: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            # Streaming endpoints count until the body has been read completely.
+            await response.aread()
+        except httpx.HTTPError:
+            self.recorder.record(name, time.perf_counter() - started, None)
+            return None
+        self.recorder.record(name, time.perf_counter() - started, response.status_code)
+        return response
+
+    async def login(self) -> Optional[int]:
+        """Returns None on success, otherwise the failing status code (0 = no response)."""
+        response = await self.call(
+            "token", "POST", "/token",
+            data={"username": user_email(self.index), "password": self.args.password},
+        )
+        if response is None or response.status_code != 200:
+            return response.status_code if response is not None else 0
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        return None
+
+    async def run(self, deadline: float) -> None:
+        failure = await self.login()
+        if failure is not None:
+            self.recorder.failed_logins[self.index] = failure
+            return
+        iterations = 0
+        while time.monotonic() < deadline:
+            name = random.choices(self.operations, self.weights)[0]
+            await getattr(self, name)()
+            iterations += 1
+            if self.args.relogin_every and iterations % self.args.relogin_every == 0:
+                await self.login()
+            if self.args.think_time:
+                await asyncio.sleep(random.uniform(0, 2 * self.args.think_time))
+
+    async def users_me(self) -> None:
+        await self.call("users_me", "GET", "/users/me", headers=self.headers)
+
+    async def list_conversations(self) -> None:
+        await self.call("list_conversations", "GET", "/conversations", headers=self.headers)
+
+    async def save_conversation(self) -> None:
+        await self.call(
+            "save_conversation", "POST", "/conversations",
+            json={"conversation": make_conversation(self.args.answers)}, headers=self.headers,
+        )
+
+    async def tts(self) -> None:
+        if random.random() < self.args.tts_unique_fraction:
+            text, name = f"{random.choice(QUESTIONS)} (Take a moment, {uuid.uuid4().hex[:8]}.)", "tts_miss"
+        else:
+            text = random.choice(QUESTIONS)
+            name = "tts_hit" if text in _requested_tts_texts else "tts_miss"
+            _requested_tts_texts.add(text)
+        await self.call(
+            name, "POST", "/text-to-speech",
+            json={"text": text, "voice": "female_uk", "stream": self.args.tts_stream},
+        )
+
+    async def stt(self) -> None:
+        await self.call(
+            "stt", "POST", "/speech-to-text",
+            files={"audio_file": ("answer.wav", self.audio, "audio/wav")},
+        )
+
+    async def final_feedback(self) -> None:
+        await self.call(
+            "final_feedback", "POST", "/practice/final-feedback",
+            json={"conversation": make_conversation(self.args.answers)}, headers=self.headers,
+        )
+
+
+def parse_weights(raw: Optional[str]) -> Dict[str, float]:
+    if not raw:
+        return dict(DEFAULT_WEIGHTS)
+    weights = {}
+    for item in raw.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() not in DEFAULT_WEIGHTS:
+            raise SystemExit(f"Unknown operation '{name}'. Choose from: {', '.join(DEFAULT_WEIGHTS)}")
+        weights[name.strip()] = float(value)
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+async def main(args) -> int:
+    if args.seed:
+        await seed_users(args.users, args.password)
+
+    audio = make_wav(args.audio_seconds)
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        started = time.monotonic()
+        deadline = started + args.duration
+        users = [VirtualUser(i, client, recorder, args, audio) for i in range(args.users)]
+        await asyncio.gather(*(user.run(deadline) for user in users))
+        elapsed = time.monotonic() - started
+
+    summary = summarize(recorder, elapsed)
+    print_report(summary, elapsed)
+    if recorder.failed_logins:
+        statuses = defaultdict(int)
+        for code in recorder.failed_logins.values():
+            statuses[code] += 1
+        print(
+            f"\n{len(recorder.failed_logins)} of {args.users} virtual users could not log in and sent no requests "
+            f"(statuses: {', '.join(f'{code}: {n}' for code, n in sorted(statuses.items()))})."
+        )
+        if 429 in statuses:
+            print("The server is rate limiting /token; restart it with RATE_LIMIT_ENABLED=false.")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({
+                "config": {k: v for k, v in vars(args).items() if k != "password"},
+                "failed_logins": len(recorder.failed_logins),
+                "endpoints": summary,
+            }, f, indent=2)
+        print(f"\nWrote {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["endpoints"]
+        regressions = compare(summary, baseline, args.p95_margin, args.error_margin)
+        if recorder.failed_logins:
+            regressions.append(f"{len(recorder.failed_logins)} virtual users could not log in")
+        if regressions:
+            print("\nRegressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load benchmark for the IELTS Practice AI API.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent virtual users.")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds to run.")
+    parser.add_argument("--password", default="LoadTest123!")
+    parser.add_argument("--seed", action="store_true", help="Create the benchmark users in the local database first.")
+    parser.add_argument("--weights", type=parse_weights, default=None,
+                        help="Operation mix, e.g. 'tts=4,stt=3,final_feedback=1'.")
+    parser.add_argument("--answers", type=int, default=6, help="Answers per conversation.")
+    parser.add_argument("--audio-seconds", type=float, default=5, help="Length of the uploaded WAV.")
+    parser.add_argument("--tts-stream", action="store_true", help="Use the streaming TTS mode.")
+    parser.add_argument("--tts-unique-fraction", type=float, default=0.5,
+                        help="Share of TTS requests with a never-repeated text (always a cache miss).")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean pause between requests, in seconds.")
+    parser.add_argument("--relogin-every", type=int, default=20, help="Re-hit /token every N requests (0 = never).")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--out", help="Write the results as JSON for later comparison.")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier --out run.")
+    parser.add_argument("--p95-margin", type=float, default=0.2, help="Allowed relative p95 increase.")
+    parser.add_argument("--error-margin", type=float, default=0.01, help="Allowed absolute error-rate increase.")
+    parsed = parser.parse_args()
+    if parsed.weights is None:
+        parsed.weights = dict(DEFAULT_WEIGHTS)
+    sys.exit(asyncio.run(main(parsed)))
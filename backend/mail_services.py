@@ -1,59 +1,41 @@
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
 import os
 from dotenv import load_dotenv
 import ssl
 import asyncio
-from typing import Optional
-from fastapi import HTTPException
+import time
+from datetime import datetime
+from email.message import EmailMessage
+from typing import List, Optional, Tuple
+
+import aiosmtplib
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+from metrics import track_dependency
+from providers import USE_FAKE_PROVIDERS, FakeSMTPClient
 
 load_dotenv()
 
+MAIL_USERNAME = os.getenv('MAIL_USERNAME')
+MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
+MAIL_FROM = os.getenv('MAIL_FROM')
+MAIL_SERVER = os.getenv('MAIL_SERVER', "smtp.gmail.com")
+MAIL_PORT = int(os.getenv('MAIL_PORT', "465"))  # implicit TLS
+
+# Authenticated sessions kept open between sends; each handshake costs a TLS
+# round trip plus AUTH, far more than the message itself.
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", "10"))
+# Gmail drops idle sessions and caps messages per session; reconnect before either bites.
+SMTP_MAX_IDLE_SECONDS = float(os.getenv("SMTP_MAX_IDLE_SECONDS", "60"))
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "90"))
+
 # Create an SSL context with timeout settings
 ssl_context = ssl.create_default_context()
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=os.getenv('MAIL_USERNAME'),
-    MAIL_PASSWORD=os.getenv('MAIL_PASSWORD'),
-    MAIL_FROM=os.getenv('MAIL_FROM'),
-    MAIL_PORT=465,  # Force port 465 for SSL
-    MAIL_SERVER="smtp.gmail.com",
-    MAIL_SSL_TLS=True,
-    MAIL_STARTTLS=False,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=None,
-    TIMEOUT=5  # 5 seconds timeout
-)
-
-fastmail = FastMail(conf)
-
-async def send_email_with_retry(message: MessageSchema, max_retries: int = 2) -> Optional[Exception]:
-    """Send email with retry logic and return any error that occurred"""
-    last_error = None
-    for attempt in range(max_retries):
-        try:
-            # Use asyncio.wait_for to add timeout
-            await asyncio.wait_for(
-                fastmail.send_message(message),
-                timeout=5.0  # 5 seconds timeout
-            )
-            return None
-        except asyncio.TimeoutError:
-            last_error = Exception("Email sending timed out")
-            print(f"Email sending attempt {attempt + 1} timed out")
-        except Exception as e:
-            last_error = e
-            print(f"Email sending attempt {attempt + 1} failed: {str(e)}")
-        
-        if attempt < max_retries - 1:
-            await asyncio.sleep(1)  # Wait 1 second before retrying
-    return last_error
-
-async def send_verification_email(email_to: str, code: str):
-    message = MessageSchema(
-        subject="Verify your IELTS Practice AI account",
-        recipients=[email_to],
-        body=f"""
+
+def verification_email(code: str) -> Tuple[str, str]:
+    return "Verify your IELTS Practice AI account", f"""
         <html>
             <body>
                 <h2>Welcome to IELTS Practice AI!</h2>
@@ -61,28 +43,10 @@ async def send_verification_email(email_to: str, code: str):
                 <p>This code will expire in 15 minutes.</p>
             </body>
         </html>
-        """,
-        subtype="html"
-    )
-    
-    error = await send_email_with_retry(message)
-    if error:
-        print(f"Failed to send verification email: {str(error)}")
-        if isinstance(error, asyncio.TimeoutError):
-            raise HTTPException(
-                status_code=504,
-                detail="Email service timed out. Please try again."
-            )
-        raise HTTPException(
-            status_code=500,
-            detail="Failed to send verification email. Please try again later."
-        )
+        """
 
-async def send_password_reset_email(email_to: str, code: str):
-    message = MessageSchema(
-        subject="Reset your IELTS Practice AI password",
-        recipients=[email_to],
-        body=f"""
+def password_reset_email(code: str) -> Tuple[str, str]:
+    return "Reset your IELTS Practice AI password", f"""
         <html>
             <body>
                 <h2>Password Reset Request</h2>
@@ -91,19 +55,133 @@ async def send_password_reset_email(email_to: str, code: str):
                 <p>If you did not request a password reset, please ignore this email.</p>
             </body>
         </html>
-        """,
-        subtype="html"
-    )
-    
-    error = await send_email_with_retry(message)
-    if error:
-        print(f"Failed to send password reset email: {str(error)}")
-        if isinstance(error, asyncio.TimeoutError):
-            raise HTTPException(
-                status_code=504,
-                detail="Email service timed out. Please try again."
-            )
-        raise HTTPException(
-            status_code=500,
-            detail="Failed to send password reset email. Please try again later."
+        """
+
+def queue_verification_email(db: AsyncSession, email_to: str, code: str, expires_at: Optional[datetime]):
+    """Adds the message to the outbox; it goes out after the caller commits and notifies email_outbox."""
+    subject, body = verification_email(code)
+    crud.queue_email(db, "verification", email_to, subject, body, expires_at=expires_at)
+
+def queue_password_reset_email(db: AsyncSession, email_to: str, code: str, expires_at: Optional[datetime]):
+    subject, body = password_reset_email(code)
+    crud.queue_email(db, "password_reset", email_to, subject, body, expires_at=expires_at)
+
+def build_message(recipient: str, subject: str, html: str) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = MAIL_FROM
+    message["To"] = recipient
+    message["Subject"] = subject
+    message.set_content(html, subtype="html")
+    return message
+
+
+class _PooledConnection:
+    def __init__(self, client):
+        self.client = client
+        self.last_used = time.monotonic()
+        self.sent = 0
+
+    def reusable(self) -> bool:
+        return (
+            self.client.is_connected
+            and time.monotonic() - self.last_used < SMTP_MAX_IDLE_SECONDS
+            and self.sent < SMTP_MAX_MESSAGES_PER_CONNECTION
         )
+
+
+class SMTPConnectionPool:
+    """
+    Up to `size` authenticated SMTP sessions, each used by one send at a time.
+    A session that errors is dropped; a reused one that the server closed in
+    the meantime is replaced once without counting as a failed attempt.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._slots = asyncio.Semaphore(size)
+        self._idle: List[_PooledConnection] = []
+
+        self.connects = 0
+        self.sent = 0
+        self.errors = 0
+
+    async def send(self, message: EmailMessage) -> None:
+        async with self._slots:
+            connection = self._take_idle()
+            reused = connection is not None
+            try:
+                if connection is None:
+                    connection = await self._connect()
+                try:
+                    await self._send_on(connection, message)
+                except aiosmtplib.SMTPServerDisconnected:
+                    if not reused:
+                        raise
+                    self._discard(connection)
+                    connection = await self._connect()
+                    await self._send_on(connection, message)
+            except Exception:
+                self.errors += 1
+                if connection is not None:
+                    self._discard(connection)
+                raise
+            self.sent += 1
+            self._idle.append(connection)
+
+    def _take_idle(self) -> Optional[_PooledConnection]:
+        while self._idle:
+            connection = self._idle.pop()
+            if connection.reusable():
+                return connection
+            self._discard(connection)
+        return None
+
+    async def _connect(self) -> _PooledConnection:
+        if USE_FAKE_PROVIDERS:
+            client = FakeSMTPClient()
+        else:
+            client = aiosmtplib.SMTP(
+                hostname=MAIL_SERVER,
+                port=MAIL_PORT,
+                use_tls=True,
+                tls_context=ssl_context,
+                timeout=SMTP_TIMEOUT_SECONDS,
+            )
+        async with track_dependency("smtp", "connect"):
+            await asyncio.wait_for(client.connect(), timeout=SMTP_TIMEOUT_SECONDS)
+            if MAIL_USERNAME:
+                await asyncio.wait_for(client.login(MAIL_USERNAME, MAIL_PASSWORD), timeout=SMTP_TIMEOUT_SECONDS)
+        self.connects += 1
+        return _PooledConnection(client)
+
+    async def _send_on(self, connection: _PooledConnection, message: EmailMessage) -> None:
+        async with track_dependency("smtp", "send"):
+            await asyncio.wait_for(connection.client.send_message(message), timeout=SMTP_TIMEOUT_SECONDS)
+        connection.sent += 1
+        connection.last_used = time.monotonic()
+
+    def _discard(self, connection: _PooledConnection) -> None:
+        try:
+            connection.client.close()
+        except Exception:
+            pass
+
+    async def close(self) -> None:
+        while self._idle:
+            connection = self._idle.pop()
+            try:
+                await asyncio.wait_for(connection.client.quit(), timeout=SMTP_TIMEOUT_SECONDS)
+            except Exception:
+                self._discard(connection)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "idle_connections": len(self._idle),
+            "connects": self.connects,
+            "sent": self.sent,
+            "errors": self.errors,
+        }
+
+
+smtp_pool = SMTPConnectionPool(SMTP_POOL_SIZE)
@@ -6,32 +6,40 @@ load_dotenv()
 from fastapi import File, UploadFile
 from azure_tts_service import speech_to_text_from_bytes
 
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 import io
 import azure_tts_service
-from fastapi import Depends, FastAPI, HTTPException, status, BackgroundTasks
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, status, WebSocket, WebSocketDisconnect
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Any
+from typing import List, Any, Optional
 import random
 from datetime import datetime, timedelta
 import json
 import asyncio
+import time
 
 import models
 import schemas
 import security
 import crud
 import ai_services
-from database import engine, Base, get_db
-from mail_services import send_verification_email, send_password_reset_email
+import conversation_codec
+from database import get_db, run_migrations, RUN_MIGRATIONS_ON_STARTUP
+from mail_services import queue_verification_email, queue_password_reset_email, smtp_pool
+from email_outbox import email_outbox
 from validation import PasswordValidator
-
-async def create_db_and_tables():
-    from models import User, Conversation 
-    
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+from speech_executor import speech_executor, SpeechExecutorSaturated
+from feedback_jobs import feedback_job_runner, TERMINAL_STATUSES
+from llm_scheduler import llm_scheduler
+from feedback_cache import feedback_cache
+from tts_cache import tts_cache
+from user_cache import user_cache
+from question_bank import question_bank
+from practice_sessions import SeenQuestions, generate_session
+from chatbot import ExaminerSessionNotFound, examiner_sessions
+from rate_limiter import RateLimitExceeded, client_ip, rate_limiter, retry_after_header
+from metrics import CONTENT_TYPE_LATEST, HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT, render_latest, stats_collector
 
 app = FastAPI(
     title="IELTS Practice AI API",
@@ -40,38 +48,207 @@ app = FastAPI(
 
 @app.on_event("startup")
 async def on_startup():
-    await create_db_and_tables()
+    if RUN_MIGRATIONS_ON_STARTUP:
+        await run_migrations()
+    await security.password_hasher.warm_up()
+    await azure_tts_service.warm_up_synthesizers()
+    await question_bank.load()
+    await feedback_job_runner.start()
+    await email_outbox.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await feedback_job_runner.stop()
+    await email_outbox.stop()
+    security.password_hasher.shutdown()
+    azure_tts_service.shutdown_synthesizers()
+
+stats_collector.add_source("speech_executor", speech_executor.stats)
+stats_collector.add_source("llm_scheduler", llm_scheduler.stats)
+stats_collector.add_source("feedback_cache", feedback_cache.stats)
+stats_collector.add_source("user_cache", user_cache.stats)
+stats_collector.add_source("password_hasher", security.password_hasher.stats)
+stats_collector.add_source("rate_limiter", rate_limiter.stats)
+stats_collector.add_source("email_outbox", email_outbox.stats)
+stats_collector.add_source("question_bank", question_bank.stats)
+stats_collector.add_source("examiner_sessions", examiner_sessions.stats)
+stats_collector.add_source("smtp_pool", smtp_pool.stats)
+if tts_cache:
+    stats_collector.add_source("tts_cache", tts_cache.stats)
+if azure_tts_service.synthesizer_pool:
+    stats_collector.add_source("tts_pool", azure_tts_service.synthesizer_pool.stats)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    # Streaming responses are timed to their first byte, not until the body ends.
+    HTTP_REQUESTS_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        HTTP_REQUESTS_IN_FLIGHT.dec()
+        # Label by route template so /conversations/{id} stays one series.
+        route = request.scope.get("route")
+        HTTP_REQUEST_DURATION.labels(
+            request.method, route.path if route else "unmatched", str(status_code)
+        ).observe(time.perf_counter() - started)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(render_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded_handler(request, exc: RateLimitExceeded):
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": str(exc)},
+        headers={"Retry-After": retry_after_header(exc)},
+    )
 
-# --- Authentication and Registration Endpoints ---
+@app.exception_handler(security.PasswordHasherSaturated)
+async def password_hasher_saturated_handler(request, exc: security.PasswordHasherSaturated):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "1"},
+    )
 
-async def send_verification_email_background(email: str, code: str):
-    try:
-        await send_verification_email(email, code)
-    except Exception as e:
-        print(f"Background email sending failed: {e}")
+@app.exception_handler(SpeechExecutorSaturated)
+async def speech_executor_saturated_handler(request, exc: SpeechExecutorSaturated):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "1"},
+    )
+
+# --- Authentication and Registration Endpoints ---
 
 @app.post("/text-to-speech")
 async def text_to_speech_endpoint(request: schemas.TTSRequest):
+    if request.stream:
+        audio_stream = azure_tts_service.text_to_speech_stream(request.text, voice_id=request.voice)
+        # Wait for the first chunk so synthesis failures still surface as a 500.
+        first_chunk = await anext(audio_stream, None)
+        if first_chunk is None:
+            raise HTTPException(status_code=500, detail="Failed to generate speech audio.")
+
+        async def audio_chunks():
+            yield first_chunk
+            async for chunk in audio_stream:
+                yield chunk
+
+        return StreamingResponse(audio_chunks(), media_type="audio/mpeg")
+
     audio_bytes = await azure_tts_service.text_to_speech_async(request.text, voice_id=request.voice)
     if audio_bytes:
         return StreamingResponse(io.BytesIO(audio_bytes), media_type="audio/mpeg")
     else:
         raise HTTPException(status_code=500, detail="Failed to generate speech audio.")
 
+async def read_upload_chunks(audio_file: UploadFile):
+    """Yields the upload in fixed-size chunks, enforcing STT_MAX_UPLOAD_BYTES."""
+    total = 0
+    while True:
+        chunk = await audio_file.read(azure_tts_service.STT_UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            return
+        total += len(chunk)
+        if total > azure_tts_service.STT_MAX_UPLOAD_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Audio file exceeds the {azure_tts_service.STT_MAX_UPLOAD_BYTES} byte limit."
+            )
+        yield chunk
+
+@app.get("/speech/stats")
+async def speech_stats():
+    return {"executor": speech_executor.stats()}
+
 @app.post("/speech-to-text")
-async def transcribe_speech(audio_file: UploadFile = File(...)):
-    audio_bytes = await audio_file.read()
-    transcription = await speech_to_text_from_bytes(audio_bytes)
+async def transcribe_speech(audio_file: UploadFile = File(...), long_form: bool = False):
+    if audio_file.size is not None and audio_file.size > azure_tts_service.STT_MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Audio file exceeds the {azure_tts_service.STT_MAX_UPLOAD_BYTES} byte limit."
+        )
+    if long_form:
+        transcription = await azure_tts_service.speech_to_text_long_form(read_upload_chunks(audio_file))
+    else:
+        audio_bytes = b"".join([chunk async for chunk in read_upload_chunks(audio_file)])
+        transcription = await speech_to_text_from_bytes(audio_bytes)
     if "Error" in transcription:
         raise HTTPException(status_code=500, detail=transcription)
     return {"transcription": transcription}
 
+@app.websocket("/ws/speech-to-text")
+async def transcribe_speech_stream(websocket: WebSocket, sample_rate: int = 16000):
+    """
+    Streams 16-bit mono PCM frames (binary messages) into Azure continuous recognition.
+    The client sends the text message "end" once it stops recording. Partial results
+    are sent as {"type": "recognizing"}, finished segments as {"type": "recognized"},
+    and the joined transcript as {"type": "final"} before the socket is closed.
+    """
+    await websocket.accept()
+    if not azure_tts_service.speech_config:
+        await websocket.send_json({"type": "error", "detail": "Speech service not configured."})
+        await websocket.close(code=1011)
+        return
+
+    recognition = azure_tts_service.ContinuousRecognition(sample_rate=sample_rate)
+    try:
+        await recognition.start()
+    except SpeechExecutorSaturated as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=1013)
+        return
+
+    async def receive_audio():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes"):
+                    recognition.write(message["bytes"])
+                elif message.get("text", "").strip().lower() == "end":
+                    break
+        finally:
+            recognition.end_of_stream()
+
+    receiver = asyncio.create_task(receive_audio())
+    segments = []
+    try:
+        async for event_type, text in recognition.events():
+            if event_type == "recognized":
+                segments.append(text)
+            await websocket.send_json({"type": event_type, "text": text})
+        # The stream only ends once the receiver has closed it, so it is done here unless recognition failed.
+        receive_error = receiver.exception() if receiver.done() and not receiver.cancelled() else None
+        if receive_error is not None:
+            print(f"❌ AZURE STT ERROR: Receiving audio failed: {receive_error}")
+            await websocket.send_json({"type": "error", "detail": f"Receiving audio failed: {receive_error}"})
+        elif recognition.error:
+            await websocket.send_json({"type": "error", "detail": recognition.error})
+        else:
+            await websocket.send_json({"type": "final", "text": " ".join(segments)})
+        await websocket.close()
+    except WebSocketDisconnect:
+        print("ℹ️ AZURE STT INFO: Client disconnected during streaming recognition.")
+    finally:
+        receiver.cancel()
+        await asyncio.gather(receiver, return_exceptions=True)
+        await recognition.stop()
+
 @app.post("/register", status_code=status.HTTP_201_CREATED, response_model=schemas.MessageResponse)
 async def register_user(
     user: schemas.UserCreate,
-    background_tasks: BackgroundTasks,
+    http_request: Request,
     db: AsyncSession = Depends(get_db)
 ):
+    await rate_limiter.check("register", ip=client_ip(http_request), email=user.email)
     PasswordValidator.validate_password(user.password)
     db_user = await crud.get_user_by_email(db, email=user.email)
     if db_user:
@@ -85,23 +262,28 @@ async def register_user(
             db_user.verification_code = verification_code
             db_user.code_expires_at = datetime.utcnow() + timedelta(minutes=15)
             db_user.name = user.name
-            new_hashed_password = security.get_password_hash(user.password)
+            new_hashed_password = await security.hash_password(user.password)
             db_user.hashed_password = new_hashed_password
+            queue_verification_email(db, user.email, verification_code, db_user.code_expires_at)
             await db.commit()
-            background_tasks.add_task(send_verification_email_background, user.email, verification_code)
+            user_cache.invalidate(db_user.email)
+            email_outbox.notify()
             return {"message": "Verification code sent."}
 
     verification_code = str(random.randint(100000, 999999))
-    await crud.create_user(db=db, user=user, verification_code=verification_code)
-    background_tasks.add_task(send_verification_email_background, user.email, verification_code)
+    db_user = await crud.create_user(db=db, user=user, verification_code=verification_code)
+    queue_verification_email(db, user.email, verification_code, db_user.code_expires_at)
+    await db.commit()
+    email_outbox.notify()
     return {"message": "Verification code sent."}
 
 @app.post("/resend-verification", response_model=schemas.MessageResponse)
 async def resend_verification_code(
     request: schemas.EmailRequest,
-    background_tasks: BackgroundTasks,
+    http_request: Request,
     db: AsyncSession = Depends(get_db)
 ):
+    await rate_limiter.check("resend_verification", ip=client_ip(http_request), email=request.email)
     user = await crud.get_user_by_email(db, email=request.email)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found.")
@@ -110,8 +292,9 @@ async def resend_verification_code(
     verification_code = str(random.randint(100000, 999999))
     user.verification_code = verification_code
     user.code_expires_at = datetime.utcnow() + timedelta(minutes=15)
+    queue_verification_email(db, request.email, verification_code, user.code_expires_at)
     await db.commit()
-    background_tasks.add_task(send_verification_email_background, request.email, verification_code)
+    email_outbox.notify()
     return {"message": "New verification code sent."}
 
 @app.post("/verify", response_model=schemas.Token)
@@ -126,17 +309,29 @@ async def verify_user_account(request: schemas.VerificationRequest, db: AsyncSes
         user = await crud.verify_user_code(db, email=request.email, code=request.code)
         if not user:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid email or verification code.")
-        access_token = security.create_access_token(data={"sub": user.email})
+        access_token = security.create_access_token(data={"sub": user.email, "ver": user.token_version or 0})
         return schemas.Token(access_token=access_token, token_type="bearer")
 
 @app.post("/token", response_model=schemas.Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+async def login_for_access_token(
+    http_request: Request,
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_db)
+):
+    await rate_limiter.check("login", ip=client_ip(http_request), email=form_data.username)
     user = await crud.get_user_by_email(db, email=form_data.username)
-    if not user or not security.verify_password(form_data.password, user.hashed_password):
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
+    valid, new_hash = await security.verify_and_update_password(form_data.password, user.hashed_password)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
     if not user.is_verified:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Please verify your email first.")
-    access_token = security.create_access_token(data={"sub": user.email})
+    if new_hash:
+        # The configured bcrypt cost changed since this hash was made; upgrade it now.
+        user.hashed_password = new_hash
+        await db.commit()
+    access_token = security.create_access_token(data={"sub": user.email, "ver": user.token_version or 0})
     return {"access_token": access_token, "token_type": "bearer"}
 
 # --- User Endpoints ---
@@ -149,7 +344,7 @@ async def read_users_me(current_user: models.User = Depends(crud.get_current_act
 @app.put("/users/me", response_model=schemas.User)
 async def update_user_profile(
     user_update: schemas.UserUpdate,
-    current_user: models.User = Depends(crud.get_current_active_user),
+    current_user: models.User = Depends(crud.get_current_active_user_for_update),
     db: AsyncSession = Depends(get_db)
 ):
     # This generic approach handles updating any field present in the UserUpdate schema
@@ -159,11 +354,12 @@ async def update_user_profile(
     
     await db.commit()
     await db.refresh(current_user)
+    user_cache.invalidate(current_user.email)
     return current_user
 
 @app.delete("/users/me", response_model=schemas.MessageResponse)
 async def delete_user_account(
-    current_user: models.User = Depends(crud.get_current_active_user),
+    current_user: models.User = Depends(crud.get_current_active_user_for_update),
     db: AsyncSession = Depends(get_db)
 ):
     await crud.delete_current_user(db, current_user)
@@ -172,7 +368,7 @@ async def delete_user_account(
 @app.put("/users/me/password", response_model=schemas.MessageResponse)
 async def change_current_user_password(
     form_data: schemas.PasswordChangeRequest,
-    current_user: models.User = Depends(crud.get_current_active_user),
+    current_user: models.User = Depends(crud.get_current_active_user_for_update),
     db: AsyncSession = Depends(get_db)
 ):
     PasswordValidator.validate_password(form_data.new_password)
@@ -192,22 +388,99 @@ async def get_final_feedback(
     feedback_data = await ai_services.get_ai_final_feedback(convo_list)
     return feedback_data
 
+@app.post("/practice/final-feedback/stream")
+async def stream_final_feedback(
+    payload: schemas.ConversationPayload,
+    current_user: models.User = Depends(crud.get_current_active_user)
+):
+    """
+    Server-sent-events variant of /practice/final-feedback. Emits a `scores`
+    event, one `answer_analysis` event per answer as soon as it is generated,
+    and finally `done` with the complete FeedbackResponse (or `error`).
+    """
+    if not payload.conversation:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Conversation history cannot be empty.")
+    convo_list = [item.dict() for item in payload.conversation]
+
+    async def event_stream():
+        async for event, data in ai_services.stream_ai_final_feedback(convo_list):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def feedback_job_response(job: models.FeedbackJob) -> schemas.FeedbackJobRead:
+    return schemas.FeedbackJobRead(
+        job_id=job.id,
+        status=job.status,
+        result=json.loads(job.result_data) if job.result_data else None,
+        error=job.error if job.status == "failed" else None,
+        created_at=job.created_at,
+        updated_at=job.updated_at
+    )
+
+@app.post("/practice/feedback-jobs", status_code=status.HTTP_202_ACCEPTED, response_model=schemas.FeedbackJobRead)
+async def submit_feedback_job(
+    payload: schemas.ConversationPayload,
+    current_user: models.User = Depends(crud.get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Queues feedback generation and returns a job id immediately; identical transcripts reuse one job."""
+    if not payload.conversation:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Conversation history cannot be empty.")
+    convo_list = [item.dict() for item in payload.conversation]
+    transcript_hash = ai_services.feedback_key(convo_list)
+
+    job = await crud.get_active_feedback_job(db, user_id=current_user.id, transcript_hash=transcript_hash)
+    if job is None:
+        job = await crud.create_feedback_job(db, user_id=current_user.id, transcript_hash=transcript_hash, conversation=convo_list)
+        feedback_job_runner.submit(job.id)
+    return feedback_job_response(job)
+
+@app.get("/practice/feedback-jobs/{job_id}", response_model=schemas.FeedbackJobRead)
+async def get_feedback_job(
+    job_id: str,
+    wait: float = 0,
+    current_user: models.User = Depends(crud.get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Returns job status; with `wait` > 0 it long-polls for up to that many seconds."""
+    user_id = current_user.id
+    job = await crud.get_feedback_job(db, job_id=job_id, user_id=user_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Feedback job not found")
+    if wait > 0 and job.status not in TERMINAL_STATUSES:
+        # End the read transaction first so SQLite can't block the worker's write.
+        await db.rollback()
+        await feedback_job_runner.wait(job_id, timeout=wait)
+        job = await crud.get_feedback_job(db, job_id=job_id, user_id=user_id)
+    return feedback_job_response(job)
+
+@app.get("/llm/stats")
+async def llm_stats():
+    return {**llm_scheduler.stats(), "feedback_served_by": dict(ai_services.served_by)}
+
 # --- Password Reset Flow ---
 
 @app.post("/send-reset-code", response_model=schemas.MessageResponse)
 async def send_reset_code(
     request: schemas.ResetPasswordRequest,
-    background_tasks: BackgroundTasks,
+    http_request: Request,
     db: AsyncSession = Depends(get_db)
 ):
+    await rate_limiter.check("send_reset_code", ip=client_ip(http_request), email=request.email)
     user = await crud.get_user_by_email(db, email=request.email)
     if not user:
         raise HTTPException(status_code=404, detail="Account with this email does not exist.")
     reset_code = str(random.randint(100000, 999999))
     user.verification_code = reset_code
     user.code_expires_at = datetime.utcnow() + timedelta(minutes=15)
+    queue_password_reset_email(db, user.email, reset_code, user.code_expires_at)
     await db.commit()
-    background_tasks.add_task(send_password_reset_email, user.email, reset_code)
+    email_outbox.notify()
     return {"message": "Password reset code sent successfully."}
 
 async def verify_password_reset_token(token: str = Depends(OAuth2PasswordBearer(tokenUrl="token")), db: AsyncSession = Depends(get_db)) -> models.User:
@@ -248,26 +521,89 @@ async def save_conversation(
     current_user: models.User = Depends(crud.get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
-    convo = await crud.create_conversation(db, user_id=current_user.id, conversation=payload.conversation)
-    return schemas.ConversationRead(
-        id=convo.id,
-        conversation=json.loads(convo.conversation_data),
-        created_at=convo.created_at
+    convo = await crud.create_conversation(
+        db,
+        user_id=current_user.id,
+        conversation=[item.dict() for item in payload.conversation],
+        overall_band_score=payload.overall_band_score,
     )
+    body = conversation_codec.conversation_envelope(convo.id, convo.created_at, crud.conversation_turns_json(convo))
+    return Response(body, media_type="application/json")
 
 @app.get("/conversations", response_model=List[schemas.ConversationRead])
 async def list_conversations(
     current_user: models.User = Depends(crud.get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
+    """
+    Every conversation with its turns, newest first: the shape the app decodes.
+    Clients that only need a history list should page /conversations/summaries.
+    """
     convos = await crud.get_user_conversations(db, user_id=current_user.id)
-    return [
-        schemas.ConversationRead(
-            id=convo.id,
-            conversation=json.loads(convo.conversation_data),
-            created_at=convo.created_at
-        ) for convo in convos
-    ]
+    body = b"[" + b",".join(
+        conversation_codec.conversation_envelope(convo.id, convo.created_at, crud.conversation_turns_json(convo))
+        for convo in convos
+    ) + b"]"
+    return Response(body, media_type="application/json")
+
+# Declared before /conversations/{conversation_id}, which would otherwise reject "summaries" as an id.
+@app.get("/conversations/summaries", response_model=schemas.ConversationPage)
+async def list_conversation_summaries(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: models.User = Depends(crud.get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Summaries only, newest first; pass `next_cursor` back as `cursor` for the next page."""
+    convos, next_cursor = await crud.get_user_conversation_page(db, user_id=current_user.id, limit=limit, cursor=cursor)
+    return schemas.ConversationPage(
+        items=[
+            schemas.ConversationSummary(
+                id=convo.id,
+                created_at=convo.created_at,
+                turn_count=convo.turn_count,
+                topics=json.loads(convo.topics),
+                parts=json.loads(convo.parts),
+                overall_band_score=convo.overall_band_score,
+            ) for convo in convos
+        ],
+        next_cursor=next_cursor,
+    )
+
+@app.get("/conversations/{conversation_id}", response_model=schemas.ConversationRead)
+async def read_conversation(
+    conversation_id: int,
+    current_user: models.User = Depends(crud.get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    # The stored canonical bytes are spliced into the response as-is: no json.loads,
+    # no pydantic validation, no re-serialization.
+    convo = await crud.get_conversation(db, user_id=current_user.id, conversation_id=conversation_id)
+    if not convo:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
+    body = conversation_codec.conversation_envelope(convo.id, convo.created_at, crud.conversation_turns_json(convo))
+    return Response(body, media_type="application/json")
+
+@app.get("/conversations/{conversation_id}/turns", response_model=List[schemas.QuestionAnswerPairDTO])
+async def read_conversation_turns(
+    conversation_id: int,
+    request: Request,
+    current_user: models.User = Depends(crud.get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Just the turns array. When the row is stored compressed and the client
+    accepts that encoding, the stored bytes are sent without decompressing.
+    """
+    convo = await crud.get_conversation(db, user_id=current_user.id, conversation_id=conversation_id)
+    if not convo:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = conversation_codec.CONTENT_ENCODINGS.get(convo.conversation_format)
+    if encoding and conversation_codec.accepts_encoding(request.headers.get("accept-encoding"), encoding):
+        headers["Content-Encoding"] = encoding
+        return Response(convo.conversation_blob, media_type="application/json", headers=headers)
+    return Response(crud.conversation_turns_json(convo), media_type="application/json", headers=headers)
 
 @app.delete("/conversations/{conversation_id}", response_model=schemas.MessageResponse)
 async def delete_conversation(
@@ -277,6 +613,85 @@ async def delete_conversation(
 ):
     return await crud.delete_conversation(db, user_id=current_user.id, conversation_id=conversation_id)
 
+# --- Question Bank ---
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (candidate.strip().removeprefix("W/") for candidate in if_none_match.split(","))
+
+@app.get("/questions", response_model=schemas.QuestionBankRead)
+async def list_questions(
+    request: Request,
+    part: Optional[int] = Query(None, ge=1, le=3),
+    topic: Optional[str] = None,
+):
+    """
+    Served from the in-memory snapshot; nothing touches the database. Clients
+    should send the ETag back as If-None-Match and get a 304 until the bank changes.
+    """
+    snapshot = await question_bank.current()
+    headers = {"ETag": snapshot.etag, "Cache-Control": "public, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(snapshot.body(part, topic), media_type="application/json", headers=headers)
+
+@app.post("/practice/sessions", response_model=schemas.PracticeSession)
+async def create_practice_session(
+    current_user: models.User = Depends(crud.get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """A full Part 1/2/3 mock test that avoids questions from this user's earlier sessions."""
+    snapshot = await question_bank.current()
+    if not snapshot.questions:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Question bank is empty.")
+    seen = SeenQuestions(await crud.get_seen_questions(db, user_id=current_user.id))
+    session = generate_session(snapshot, seen)
+    await crud.add_seen_questions(db, user_id=current_user.id, seen_questions=seen.to_bytes())
+    return session
+
+# --- Live Examiner Chat ---
+
+@app.post("/practice/examiner/sessions", status_code=status.HTTP_201_CREATED, response_model=schemas.ExaminerSessionRead)
+async def create_examiner_session(
+    current_user: models.User = Depends(crud.get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    session = await examiner_sessions.create(db, user_id=current_user.id)
+    return schemas.ExaminerSessionRead(session_id=session.id, turn_count=session.turn_count)
+
+@app.post("/practice/examiner/sessions/{session_id}/messages", response_model=schemas.ExaminerReply)
+async def send_examiner_message(
+    session_id: str,
+    request: schemas.ExaminerMessage,
+    current_user: models.User = Depends(crud.get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    try:
+        reply, turn_count = await examiner_sessions.send(db, user_id=current_user.id, session_id=session_id, message=request.message)
+    except ExaminerSessionNotFound:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Examiner session not found")
+    except Exception as e:
+        print(f"❌ EXAMINER ERROR: Session {session_id} turn failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The examiner is unavailable right now. Please try again.",
+            headers={"Retry-After": "5"},
+        )
+    return schemas.ExaminerReply(session_id=session_id, reply=reply, turn_count=turn_count)
+
+@app.delete("/practice/examiner/sessions/{session_id}", response_model=schemas.MessageResponse)
+async def end_examiner_session(
+    session_id: str,
+    current_user: models.User = Depends(crud.get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    if not await examiner_sessions.end(db, user_id=current_user.id, session_id=session_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Examiner session not found")
+    return {"message": "Examiner session ended."}
+
 # --- Root Endpoint for Testing ---
 @app.get("/")
 def read_root():
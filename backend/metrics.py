@@ -0,0 +1,146 @@
+# metrics.py
+
+import time
+from typing import Callable, Dict
+
+from prometheus_client import CONTENT_TYPE_LATEST, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+# Wide enough for both sub-millisecond cache hits and minute-long LLM calls.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time until the response starts, per route template and status code.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests currently being handled.",
+)
+DEPENDENCY_DURATION = Histogram(
+    "dependency_duration_seconds",
+    "Latency of calls to external dependencies (Azure Speech, Gemini, SMTP, bcrypt, database).",
+    ["dependency", "operation", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+DEPENDENCY_IN_FLIGHT = Gauge(
+    "dependency_in_flight",
+    "Calls currently outstanding per dependency.",
+    ["dependency"],
+)
+LLM_QUEUE_WAIT = Histogram(
+    "llm_queue_wait_seconds",
+    "Time spent waiting for rate-limit budget before a Gemini call.",
+    buckets=LATENCY_BUCKETS,
+)
+
+
+class track_dependency:
+    """
+    Times one call to an external dependency. Usable as a sync or async context
+    manager; the outcome label is "error" if the block raises.
+
+        async with track_dependency("gemini", "generate"):
+            ...
+    """
+
+    def __init__(self, dependency: str, operation: str):
+        self.dependency = dependency
+        self.operation = operation
+        self.outcome = "success"
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        DEPENDENCY_IN_FLIGHT.labels(self.dependency).inc()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        DEPENDENCY_IN_FLIGHT.labels(self.dependency).dec()
+        if exc_type is not None and self.outcome == "success":
+            self.outcome = "error"
+        DEPENDENCY_DURATION.labels(self.dependency, self.operation, self.outcome).observe(
+            time.perf_counter() - self.started
+        )
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+def _statement_operation(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    return words[0].lower() if words else "unknown"
+
+
+def instrument_engine(engine) -> None:
+    """Times every statement the (async) engine executes, labelled by SQL verb."""
+    from sqlalchemy import event
+
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        tracker = track_dependency("database", _statement_operation(statement))
+        conn.info.setdefault("metrics_trackers", []).append(tracker.__enter__())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        trackers = conn.info.get("metrics_trackers")
+        if trackers:
+            trackers.pop().__exit__(None, None, None)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        trackers = context.connection.info.get("metrics_trackers") if context.connection is not None else None
+        if trackers:
+            error = context.original_exception
+            trackers.pop().__exit__(type(error), error, None)
+
+
+class StatsCollector:
+    """
+    Exposes the existing `stats()` dictionaries (speech executor, LLM scheduler,
+    caches) as gauges at scrape time, so they don't need separate bookkeeping.
+    Nested dictionaries become an extra label.
+    """
+
+    def __init__(self):
+        self._sources: Dict[str, Callable[[], dict]] = {}
+
+    def add_source(self, name: str, stats: Callable[[], dict]) -> None:
+        self._sources[name] = stats
+
+    def collect(self):
+        for source, stats in self._sources.items():
+            try:
+                values = stats()
+            except Exception as e:
+                print(f"⚠️ METRICS WARNING: Failed to collect {source} stats: {e}")
+                continue
+            for key, value in values.items():
+                name = f"{source}_{key}"
+                if isinstance(value, bool) or not isinstance(value, (int, float, dict)):
+                    continue
+                if isinstance(value, dict):
+                    family = GaugeMetricFamily(name, f"{source} {key}", labels=["key", "field"])
+                    for sub_key, sub_value in value.items():
+                        items = sub_value.items() if isinstance(sub_value, dict) else [("value", sub_value)]
+                        for field, number in items:
+                            if isinstance(number, (int, float)) and not isinstance(number, bool):
+                                family.add_metric([str(sub_key), str(field)], number)
+                    yield family
+                else:
+                    yield GaugeMetricFamily(name, f"{source} {key}", value=value)
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def render_latest() -> bytes:
+    return generate_latest(REGISTRY)
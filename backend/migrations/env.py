@@ -0,0 +1,58 @@
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+
+import models  # noqa: F401  (registers every table on Base.metadata)
+from database import Base, SQLALCHEMY_DATABASE_URL, build_engine
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("connection") is None:
+    # Only configure logging for the CLI; the app keeps its own logging setup.
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=SQLALCHEMY_DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        render_as_batch=SQLALCHEMY_DATABASE_URL.startswith("sqlite"),
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        # SQLite can't ALTER most things in place; batch mode rebuilds the table.
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    engine = build_engine(SQLALCHEMY_DATABASE_URL)
+    async with engine.begin() as connection:
+        await connection.run_sync(do_run_migrations)
+    await engine.dispose()
+
+
+def run_migrations_online() -> None:
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        # Called from database.run_migrations() with the app's connection.
+        do_run_migrations(connection)
+    else:
+        asyncio.run(run_async_migrations())
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
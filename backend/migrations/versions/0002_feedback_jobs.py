@@ -0,0 +1,42 @@
+"""Durable feedback jobs.
+
+Revision ID: 0002_feedback_jobs
+Revises: 0001_initial
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002_feedback_jobs"
+down_revision = "0001_initial"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "feedback_jobs",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("transcript_hash", sa.String(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("request_data", sa.Text(), nullable=False),
+        sa.Column("result_data", sa.Text(), nullable=True),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_feedback_jobs_id"), "feedback_jobs", ["id"], unique=False)
+    op.create_index(op.f("ix_feedback_jobs_user_id"), "feedback_jobs", ["user_id"], unique=False)
+    op.create_index(op.f("ix_feedback_jobs_transcript_hash"), "feedback_jobs", ["transcript_hash"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_feedback_jobs_transcript_hash"), table_name="feedback_jobs")
+    op.drop_index(op.f("ix_feedback_jobs_user_id"), table_name="feedback_jobs")
+    op.drop_index(op.f("ix_feedback_jobs_id"), table_name="feedback_jobs")
+    op.drop_table("feedback_jobs")
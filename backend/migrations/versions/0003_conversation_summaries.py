@@ -0,0 +1,66 @@
+"""Conversation summary columns and the (user_id, created_at) index.
+
+Revision ID: 0003_conversation_summaries
+Revises: 0002_feedback_jobs
+Create Date: 2026-10-17
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003_conversation_summaries"
+down_revision = "0002_feedback_jobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("conversations") as batch_op:
+        batch_op.add_column(sa.Column("turn_count", sa.Integer(), nullable=False, server_default="0"))
+        batch_op.add_column(sa.Column("topics", sa.Text(), nullable=False, server_default="[]"))
+        batch_op.add_column(sa.Column("parts", sa.Text(), nullable=False, server_default="[]"))
+        batch_op.add_column(sa.Column("overall_band_score", sa.Float(), nullable=True))
+    op.create_index("ix_conversations_user_id_created_at", "conversations", ["user_id", "created_at"], unique=False)
+
+    # Backfill summaries for existing rows (same rules as crud.conversation_summary).
+    bind = op.get_bind()
+    conversations = sa.table(
+        "conversations",
+        sa.column("id", sa.Integer),
+        sa.column("conversation_data", sa.Text),
+        sa.column("turn_count", sa.Integer),
+        sa.column("topics", sa.Text),
+        sa.column("parts", sa.Text),
+    )
+    rows = bind.execute(sa.select(conversations.c.id, conversations.c.conversation_data)).fetchall()
+    for row_id, data in rows:
+        try:
+            turns = json.loads(data)
+        except ValueError:
+            continue
+        if not isinstance(turns, list):
+            continue
+        topics, parts = [], []
+        for turn in turns:
+            if not isinstance(turn, dict):
+                continue
+            if turn.get("topic") and turn["topic"] not in topics:
+                topics.append(turn["topic"])
+            if turn.get("part") is not None and turn["part"] not in parts:
+                parts.append(turn["part"])
+        bind.execute(
+            conversations.update()
+            .where(conversations.c.id == row_id)
+            .values(turn_count=len(turns), topics=json.dumps(topics), parts=json.dumps(sorted(parts)))
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_conversations_user_id_created_at", table_name="conversations")
+    with op.batch_alter_table("conversations") as batch_op:
+        batch_op.drop_column("overall_band_score")
+        batch_op.drop_column("parts")
+        batch_op.drop_column("topics")
+        batch_op.drop_column("turn_count")
@@ -0,0 +1,54 @@
+"""Canonical, optionally compressed conversation storage.
+
+Revision ID: 0004_conversation_blob
+Revises: 0003_conversation_summaries
+Create Date: 2026-10-17
+"""
+import gzip
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004_conversation_blob"
+down_revision = "0003_conversation_summaries"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Existing rows keep their text in conversation_data (format NULL) and are
+    # served through the legacy path; new rows only fill conversation_blob.
+    with op.batch_alter_table("conversations") as batch_op:
+        batch_op.add_column(sa.Column("conversation_format", sa.String(), nullable=True))
+        batch_op.add_column(sa.Column("conversation_blob", sa.LargeBinary(), nullable=True))
+        batch_op.alter_column("conversation_data", existing_type=sa.Text(), nullable=True)
+
+
+def downgrade() -> None:
+    # Write new-format rows back as text so nothing is lost.
+    bind = op.get_bind()
+    conversations = sa.table(
+        "conversations",
+        sa.column("id", sa.Integer),
+        sa.column("conversation_data", sa.Text),
+        sa.column("conversation_format", sa.String),
+        sa.column("conversation_blob", sa.LargeBinary),
+    )
+    rows = bind.execute(
+        sa.select(conversations.c.id, conversations.c.conversation_format, conversations.c.conversation_blob)
+        .where(conversations.c.conversation_data.is_(None))
+    ).fetchall()
+    for row_id, fmt, blob in rows:
+        if fmt == "gzip-v1":
+            blob = gzip.decompress(blob)
+        elif fmt == "zstd-v1":
+            import zstandard
+            blob = zstandard.ZstdDecompressor().decompress(blob)
+        bind.execute(
+            conversations.update().where(conversations.c.id == row_id).values(conversation_data=blob.decode("utf-8"))
+        )
+    with op.batch_alter_table("conversations") as batch_op:
+        batch_op.alter_column("conversation_data", existing_type=sa.Text(), nullable=False)
+        batch_op.drop_column("conversation_blob")
+        batch_op.drop_column("conversation_format")
@@ -0,0 +1,24 @@
+"""Token version on users for revoking access tokens.
+
+Revision ID: 0005_user_token_version
+Revises: 0004_conversation_blob
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005_user_token_version"
+down_revision = "0004_conversation_blob"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.add_column(sa.Column("token_version", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("token_version")
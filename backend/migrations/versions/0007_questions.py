@@ -0,0 +1,40 @@
+"""Question bank.
+
+Revision ID: 0007_questions
+Revises: 0006_email_outbox
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007_questions"
+down_revision = "0006_email_outbox"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "questions",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("part", sa.Integer(), nullable=False),
+        sa.Column("topic", sa.String(), nullable=True),
+        sa.Column("text", sa.Text(), nullable=False),
+        sa.Column("normalized_text", sa.Text(), nullable=False),
+        sa.Column("cues", sa.Text(), nullable=True),
+        sa.Column("source", sa.String(), nullable=False),
+        sa.Column("source_ref", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_questions_id"), "questions", ["id"], unique=False)
+    op.create_index("ix_questions_part_topic", "questions", ["part", "topic"], unique=False)
+    op.create_index("ix_questions_part_normalized_text", "questions", ["part", "normalized_text"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_questions_part_normalized_text", table_name="questions")
+    op.drop_index("ix_questions_part_topic", table_name="questions")
+    op.drop_index(op.f("ix_questions_id"), table_name="questions")
+    op.drop_table("questions")
@@ -0,0 +1,24 @@
+"""Seen-question bitset on users for practice session generation.
+
+Revision ID: 0008_user_seen_questions
+Revises: 0007_questions
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008_user_seen_questions"
+down_revision = "0007_questions"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.add_column(sa.Column("seen_questions", sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("seen_questions")
@@ -0,0 +1,37 @@
+"""Persisted examiner chat sessions.
+
+Revision ID: 0009_examiner_sessions
+Revises: 0008_user_seen_questions
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009_examiner_sessions"
+down_revision = "0008_user_seen_questions"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "examiner_sessions",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("summary", sa.Text(), nullable=True),
+        sa.Column("turns", sa.Text(), nullable=False),
+        sa.Column("turn_count", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_examiner_sessions_id"), "examiner_sessions", ["id"], unique=False)
+    op.create_index(op.f("ix_examiner_sessions_user_id"), "examiner_sessions", ["user_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_examiner_sessions_user_id"), table_name="examiner_sessions")
+    op.drop_index(op.f("ix_examiner_sessions_id"), table_name="examiner_sessions")
+    op.drop_table("examiner_sessions")
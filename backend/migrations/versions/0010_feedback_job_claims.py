@@ -0,0 +1,24 @@
+"""Worker claim token on feedback jobs, so only stale leases are reclaimed.
+
+Revision ID: 0010_feedback_job_claims
+Revises: 0009_examiner_sessions
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0010_feedback_job_claims"
+down_revision = "0009_examiner_sessions"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("feedback_jobs") as batch_op:
+        batch_op.add_column(sa.Column("claimed_by", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("feedback_jobs") as batch_op:
+        batch_op.drop_column("claimed_by")
@@ -1,8 +1,8 @@
 # In models.py
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Float, Index, LargeBinary
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.sqlite import JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, backref
 from database import Base
 import datetime
 
@@ -23,13 +23,105 @@ class User(Base):
     # --- ADD THIS LINE ---
     voice_preference = Column(String, nullable=True, default="female_us")
 
+    # Bumped on password change/reset; access tokens carry it as the "ver" claim.
+    token_version = Column(Integer, nullable=False, default=0)
+
+    # Bitset of question ids already used in generated practice sessions (bit n = question n).
+    seen_questions = Column(LargeBinary, nullable=True)
+
 
 class Conversation(Base):
     __tablename__ = "conversations"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    conversation_data = Column(Text, nullable=False)  # Store as JSON string
+    conversation_data = Column(Text, nullable=True)  # Legacy JSON string; NULL once conversation_blob is used
+    conversation_format = Column(String, nullable=True)  # conversation_codec format tag, NULL for legacy rows
+    conversation_blob = Column(LargeBinary, nullable=True)  # Canonical turns JSON, possibly compressed
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Summary columns so the history list never has to read conversation_data.
+    turn_count = Column(Integer, nullable=False, default=0)
+    topics = Column(Text, nullable=False, default="[]")  # JSON list of distinct topics
+    parts = Column(Text, nullable=False, default="[]")  # JSON list of distinct IELTS parts
+    overall_band_score = Column(Float, nullable=True)
+
+    user = relationship("User", backref="conversations")
+
+    __table_args__ = (
+        Index("ix_conversations_user_id_created_at", "user_id", "created_at"),
+    )
+
+
+class FeedbackJob(Base):
+    __tablename__ = "feedback_jobs"
+
+    id = Column(String, primary_key=True, index=True)  # uuid4 hex
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    transcript_hash = Column(String, nullable=False, index=True)
+    status = Column(String, nullable=False, default="pending")  # pending, running, completed, failed
+    request_data = Column(Text, nullable=False)  # Conversation as JSON string
+    result_data = Column(Text, nullable=True)  # FeedbackResponse as JSON string
+    error = Column(String, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    claimed_by = Column(String, nullable=True)  # worker token while status is "running"
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())  # lease heartbeat while running
+
+    user = relationship("User", backref=backref("feedback_jobs", cascade="all, delete-orphan"))
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)  # verification, password_reset
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)  # HTML
+    status = Column(String, nullable=False, default="pending")  # pending, sending, sent, failed, expired
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String, nullable=True)
+    claimed_by = Column(String, nullable=True)  # worker token while status is "sending"
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=True)  # codes are useless after this
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+
+class Question(Base):
+    __tablename__ = "questions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    part = Column(Integer, nullable=False)  # IELTS Speaking part: 1, 2 or 3
+    topic = Column(String, nullable=True)
+    text = Column(Text, nullable=False)  # For Part 2, the cue card prompt
+    normalized_text = Column(Text, nullable=False)  # question_bank.normalize_question(text), for dedup
+    cues = Column(Text, nullable=True)  # Part 2 cue card bullet points as a JSON list
+    source = Column(String, nullable=False)  # e.g. "ielts_tests_json", "ieltsliz_html"
+    source_ref = Column(String, nullable=True)  # Set in the source, e.g. the IELTSTests.json test id
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_questions_part_topic", "part", "topic"),
+        Index("ix_questions_part_normalized_text", "part", "normalized_text", unique=True),
+    )
+
+
+class ExaminerSession(Base):
+    __tablename__ = "examiner_sessions"
+
+    id = Column(String, primary_key=True, index=True)  # uuid4 hex
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    summary = Column(Text, nullable=True)  # Rolling summary of turns no longer kept verbatim
+    turns = Column(Text, nullable=False, default="[]")  # Recent turns as JSON [{"role", "text"}]
+    turn_count = Column(Integer, nullable=False, default=0)  # Student messages over the whole session
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
-    user = relationship("User", backref="conversations")
\ No newline at end of file
+    user = relationship("User", backref=backref("examiner_sessions", cascade="all, delete-orphan"))
@@ -0,0 +1,133 @@
+# practice_sessions.py
+
+import os
+import random
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from question_bank import QuestionSnapshot, topic_key
+
+SESSION_PART1_TOPICS = int(os.getenv("SESSION_PART1_TOPICS", "2"))
+SESSION_PART1_QUESTIONS_PER_TOPIC = int(os.getenv("SESSION_PART1_QUESTIONS_PER_TOPIC", "4"))
+SESSION_PART3_QUESTIONS = int(os.getenv("SESSION_PART3_QUESTIONS", "4"))
+# Each pick looks at a bounded number of random candidates, so generation cost
+# depends on the session length, never on the size of the bank.
+SESSION_PROBES = int(os.getenv("SESSION_PROBES", "8"))
+SESSION_SCAN_FACTOR = 4
+
+
+class SeenQuestions:
+    """Bitset of question ids, persisted as users.seen_questions (bit n = question id n)."""
+
+    def __init__(self, data: Optional[bytes] = None):
+        self.bits = bytearray(data or b"")
+
+    def __contains__(self, question_id: int) -> bool:
+        byte = question_id >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] >> (question_id & 7) & 1)
+
+    def add(self, question_id: int) -> None:
+        byte = question_id >> 3
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        self.bits[byte] |= 1 << (question_id & 7)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.bits)
+
+
+class SessionGenerator:
+    def __init__(self, snapshot: QuestionSnapshot, seen: SeenQuestions, rng: random.Random):
+        self.snapshot = snapshot
+        self.seen = seen
+        self.rng = rng
+        self.taken: Set[int] = set()
+
+    def _scan(self, positions: Sequence[int], count: int) -> Tuple[List[int], int]:
+        """
+        Up to `count` positions from a window starting at a random offset, unseen
+        ones first. Returns (positions in bank order, how many were unseen).
+        """
+        if not positions or count <= 0:
+            return [], 0
+        start = self.rng.randrange(len(positions))
+        fresh, stale = [], []
+        for i in range(min(len(positions), count * SESSION_SCAN_FACTOR)):
+            position = positions[(start + i) % len(positions)]
+            if position in self.taken:
+                continue
+            if self.snapshot.questions[position]["id"] in self.seen:
+                stale.append(position)
+            else:
+                fresh.append(position)
+                if len(fresh) == count:
+                    break
+        chosen = (fresh + stale)[:count]
+        return sorted(chosen), min(len(fresh), count)
+
+    def _take(self, positions: List[int]) -> List[Dict[str, Any]]:
+        self.taken.update(positions)
+        for position in positions:
+            self.seen.add(self.snapshot.questions[position]["id"])
+        return [self.snapshot.questions[position] for position in positions]
+
+    def _best_topic(self, part: int, count: int, exclude: Set[str]) -> Optional[Tuple[str, List[int]]]:
+        """Tries up to SESSION_PROBES random topics and keeps the one with the most unseen questions."""
+        keys = self.snapshot.topic_keys[part]
+        best = None
+        for _ in range(SESSION_PROBES if keys else 0):
+            key = self.rng.choice(keys)
+            if key in exclude:
+                continue
+            chosen, fresh = self._scan(self.snapshot.topic_index[part][key], count)
+            if best is None or fresh > best[2]:
+                best = (key, chosen, fresh)
+            if fresh == count:
+                break
+        return (best[0], best[1]) if best else None
+
+    def _cue_card(self) -> Optional[int]:
+        cards = self.snapshot.part_index[2]
+        best = None
+        for _ in range(SESSION_PROBES if cards else 0):
+            chosen, fresh = self._scan(cards, 1)
+            if chosen and (best is None or fresh):
+                best = chosen[0]
+            if fresh:
+                break
+        return best
+
+    def generate(self) -> Dict[str, Any]:
+        card = self._cue_card()
+        part2 = self._take([card])[0] if card is not None else None
+        card_topic = topic_key(part2["topic"]) if part2 else None
+
+        # Part 3 discusses the Part 2 card: same mock test first, then the same topic.
+        part3: List[Dict[str, Any]] = []
+        if card is not None:
+            related = [
+                self.snapshot.group_index[3].get(self.snapshot.groups[card]) or (),
+                self.snapshot.topic_index[3].get(card_topic) or (),
+            ]
+            for positions in related:
+                chosen, _ = self._scan(positions, SESSION_PART3_QUESTIONS - len(part3))
+                part3.extend(self._take(chosen))
+
+        part1: List[Dict[str, Any]] = []
+        used_topics = {card_topic} if card_topic else set()
+        for _ in range(SESSION_PART1_TOPICS):
+            topic = self._best_topic(1, SESSION_PART1_QUESTIONS_PER_TOPIC, used_topics)
+            if topic is None:
+                break
+            used_topics.add(topic[0])
+            part1.extend(self._take(topic[1]))
+
+        return {"version": self.snapshot.version, "part1": part1, "part2": part2, "part3": part3}
+
+
+def generate_session(snapshot: QuestionSnapshot, seen: SeenQuestions, rng: Optional[random.Random] = None) -> Dict[str, Any]:
+    """
+    Builds a Part 1/2/3 mock test, preferring questions not in `seen`, and
+    marks everything it picked as seen. Falls back to repeats only when the
+    probed topics are exhausted.
+    """
+    return SessionGenerator(snapshot, seen, rng or random.Random()).generate()
@@ -0,0 +1,262 @@
+# providers.py
+
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import time
+from typing import Any, Dict, List
+
+# "live" talks to Gemini, Azure Speech and SMTP; "fake" swaps all three for the
+# local stand-ins below so the service can be load-tested without paid APIs.
+PROVIDER_MODE = os.getenv("PROVIDER_MODE", "live").strip().lower()
+USE_FAKE_PROVIDERS = PROVIDER_MODE == "fake"
+
+
+class FakeProviderError(Exception):
+    """Injected failure. Carries an HTTP-like `code` so retry logic treats it like a provider 503."""
+
+    def __init__(self, message: str, code: int = 503):
+        super().__init__(message)
+        self.code = code
+
+
+def _log(value: float) -> float:
+    return math.log(value) if value > 0 else 0.0
+
+
+class LatencyProfile:
+    """
+    Log-normal latency with a given median and p95, plus an independent failure
+    rate. Read from FAKE_<NAME>_MEDIAN_MS / _P95_MS / _FAILURE_RATE.
+    """
+
+    def __init__(self, name: str, median_ms: float, p95_ms: float, failure_rate: float):
+        self.name = name
+        self.median_ms = median_ms
+        self.p95_ms = max(p95_ms, median_ms)
+        self.failure_rate = failure_rate
+        # For a log-normal, p95 = median * exp(1.645 * sigma).
+        self._mu = _log(median_ms)
+        self._sigma = (_log(self.p95_ms) - self._mu) / 1.645 if median_ms > 0 else 0.0
+
+    @classmethod
+    def from_env(cls, name: str, median_ms: float, p95_ms: float, failure_rate: float = 0.0) -> "LatencyProfile":
+        prefix = f"FAKE_{name.upper()}_"
+        return cls(
+            name,
+            float(os.getenv(prefix + "MEDIAN_MS", str(median_ms))),
+            float(os.getenv(prefix + "P95_MS", str(p95_ms))),
+            float(os.getenv(prefix + "FAILURE_RATE", str(failure_rate))),
+        )
+
+    def sample_seconds(self) -> float:
+        if self.median_ms <= 0:
+            return 0.0
+        return random.lognormvariate(self._mu, self._sigma) / 1000.0
+
+    def maybe_fail(self) -> None:
+        if self.failure_rate > 0 and random.random() < self.failure_rate:
+            raise FakeProviderError(f"Injected {self.name} failure.")
+
+    async def wait(self) -> None:
+        await asyncio.sleep(self.sample_seconds())
+        self.maybe_fail()
+
+    def block(self) -> None:
+        """Blocking variant for code that runs on the speech executor, like the real SDK."""
+        time.sleep(self.sample_seconds())
+        self.maybe_fail()
+
+
+LLM_PROFILE = LatencyProfile.from_env("LLM", median_ms=2500, p95_ms=8000, failure_rate=0.01)
+TTS_PROFILE = LatencyProfile.from_env("TTS", median_ms=400, p95_ms=1200, failure_rate=0.005)
+STT_PROFILE = LatencyProfile.from_env("STT", median_ms=700, p95_ms=2000, failure_rate=0.005)
+# TLS connect + AUTH, then each message sent over an open session.
+SMTP_CONNECT_PROFILE = LatencyProfile.from_env("SMTP_CONNECT", median_ms=250, p95_ms=1200, failure_rate=0.01)
+MAIL_PROFILE = LatencyProfile.from_env("MAIL", median_ms=60, p95_ms=300, failure_rate=0.01)
+
+# --- Gemini ---
+
+_TRANSCRIPT_PAIR = re.compile(r"Examiner: (.*)\nStudent: (.*)")
+
+
+def _fake_analysis(question: str, answer: str) -> Dict:
+    first_sentence = answer.split(".")[0].strip() or answer
+    return {
+        "question": question,
+        "answer": answer,
+        "grammar_feedback": [
+            {"sentence": first_sentence, "feedback": "Check verb tense agreement.", "suggestion": first_sentence}
+        ],
+        "vocabulary_feedback": [
+            {"sentence": first_sentence, "feedback": "Try a more precise word than 'good'.", "suggestion": "beneficial"}
+        ],
+        "fluency_feedback": "Generally fluent with occasional hesitation.",
+    }
+
+
+def fake_generation_text(prompt: str) -> str:
+    """
+    Builds a plausible response for the prompts in ai_services and chatbot:
+    full feedback, scores only, or per-answer analyses, depending on which
+    fields the prompt asks for. Anything else gets a short prose reply.
+    """
+    wants_scores = '"overall_band_score"' in prompt
+    wants_analyses = '"answer_analyses"' in prompt
+    if not wants_scores and not wants_analyses:
+        return "That's an interesting point. Could you tell me a bit more about why you feel that way?"
+
+    data: Dict[str, Any] = {}
+    if wants_scores:
+        data.update({
+            "overall_band_score": 6.5,
+            "fluency_score": 7,
+            "lexical_score": 6,
+            "grammar_score": 6,
+            "pronunciation_score": 7,
+            "general_summary": "A solid performance with good fluency and room to broaden vocabulary.",
+        })
+    if wants_analyses:
+        data["answer_analyses"] = [_fake_analysis(q, a) for q, a in _TRANSCRIPT_PAIR.findall(prompt)]
+    return json.dumps(data)
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+        self.usage_metadata = None
+
+
+class _FakeStream:
+    """Mimics the async iterator returned by generate_content_async(stream=True)."""
+
+    def __init__(self, text: str, chunks: int = 6):
+        size = max(1, len(text) // chunks + 1)
+        self._parts = [text[i:i + size] for i in range(0, len(text), size)]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for part in self._parts:
+            # Time-to-first-chunk is the profile latency; later chunks trickle in.
+            await asyncio.sleep(LLM_PROFILE.sample_seconds() / len(self._parts))
+            yield _FakeResponse(part)
+
+
+class FakeGenerativeModel:
+    """Stand-in for genai.GenerativeModel with the same async call surface."""
+
+    def __init__(self, model_name: str, profile: LatencyProfile = LLM_PROFILE):
+        self.model_name = model_name
+        self.profile = profile
+
+    async def generate_content_async(self, prompt: Any, stream: bool = False, **kwargs: Any):
+        text = fake_generation_text(str(prompt))
+        if stream:
+            # Streams fail (if at all) before the first chunk, like a rejected request.
+            self.profile.maybe_fail()
+            return _FakeStream(text)
+        await self.profile.wait()
+        return _FakeResponse(text)
+
+    def start_chat(self, history: List[Any] = None) -> "FakeChatSession":
+        return FakeChatSession(self, history)
+
+
+class FakeChatSession:
+    def __init__(self, model: FakeGenerativeModel, history: List[Any] = None):
+        self.model = model
+        self.history: List[Any] = list(history or [])
+
+    async def send_message_async(self, content: Any, **kwargs: Any):
+        response = await self.model.generate_content_async(content)
+        self.history.extend([content, response.text])
+        return response
+
+
+_gemini_configured = False
+
+
+def generative_model(model_name: str):
+    """Every Gemini model is created here, so the API key is configured before whichever module asks first."""
+    global _gemini_configured
+    if USE_FAKE_PROVIDERS:
+        return FakeGenerativeModel(model_name)
+    import google.generativeai as genai
+    if not _gemini_configured:
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        _gemini_configured = True
+    return genai.GenerativeModel(model_name)
+
+# --- Azure Speech ---
+
+# 64 kbit/s MP3 (the configured output format) is 8000 bytes per second of audio.
+_FAKE_MP3_BYTES_PER_SECOND = 8000
+_FAKE_SPOKEN_CHARS_PER_SECOND = 15
+
+
+class FakeSpeech:
+    """
+    Local replacement for the Azure synthesizer and recognizer. The blocking
+    methods are meant to run on the speech executor so thread-pool pressure
+    matches production.
+    """
+
+    def __init__(self, tts: LatencyProfile = TTS_PROFILE, stt: LatencyProfile = STT_PROFILE):
+        self.tts = tts
+        self.stt = stt
+
+    @staticmethod
+    def fake_audio(text: str, voice_name: str) -> bytes:
+        seconds = max(1.0, len(text) / _FAKE_SPOKEN_CHARS_PER_SECOND)
+        seed = f"{voice_name}:{text}".encode("utf-8")
+        size = int(seconds * _FAKE_MP3_BYTES_PER_SECOND)
+        return b"ID3" + (seed * (size // len(seed) + 1))[:size]
+
+    def synthesize(self, text: str, voice_name: str) -> bytes:
+        self.tts.block()
+        return self.fake_audio(text, voice_name)
+
+    def recognize(self, audio_size: int) -> str:
+        self.stt.block()
+        # Roughly 2.5 words per second of 16 kHz, 16-bit mono audio.
+        words = max(1, int(audio_size / 32000 * 2.5))
+        return " ".join(["practice"] * min(words, 400))
+
+
+fake_speech = FakeSpeech() if USE_FAKE_PROVIDERS else None
+
+# --- SMTP ---
+
+
+class FakeSMTPClient:
+    """Stand-in for aiosmtplib.SMTP: connecting pays the handshake, sending only the message."""
+
+    def __init__(self, connect_profile: LatencyProfile = SMTP_CONNECT_PROFILE, send_profile: LatencyProfile = MAIL_PROFILE):
+        self.connect_profile = connect_profile
+        self.send_profile = send_profile
+        self.is_connected = False
+        self.sent = 0
+
+    async def connect(self) -> None:
+        await self.connect_profile.wait()
+        self.is_connected = True
+
+    async def login(self, username: Any, password: Any) -> None:
+        pass
+
+    async def send_message(self, message: Any) -> None:
+        if not self.is_connected:
+            raise FakeProviderError("Fake SMTP session is not connected")
+        await self.send_profile.wait()
+        self.sent += 1
+
+    async def quit(self) -> None:
+        self.is_connected = False
+
+    def close(self) -> None:
+        self.is_connected = False
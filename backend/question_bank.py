@@ -0,0 +1,257 @@
+# question_bank.py
+"""
+IELTS question bank: offline ingestion into the questions table, and an
+in-memory snapshot the API serves from.
+
+Ingest saved sources (no network access needed):
+
+    python question_bank.py ../frontend/Resources/IELTSTests.json saved/ieltsliz-part1.html
+
+JSON sources are either the app's IELTSTests.json (a list of tests with
+part1/part2/part3) or a flat list of {"part", "topic", "text", "cues"}
+records. HTML sources are saved ieltsliz.com Part 1 topic pages.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import crud
+from database import AsyncSessionLocal
+
+# How often the server checks whether ingestion changed the table.
+QUESTION_BANK_REFRESH_SECONDS = float(os.getenv("QUESTION_BANK_REFRESH_SECONDS", "300"))
+
+PARTS = (1, 2, 3)
+
+_NON_WORD = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(text: str) -> str:
+    """Dedup key: case, punctuation and spacing differences don't make a new question."""
+    return _WHITESPACE.sub(" ", _NON_WORD.sub(" ", text.casefold())).strip()
+
+
+def topic_key(topic: Optional[str]) -> str:
+    return (topic or "").strip().casefold()
+
+
+# --- Parsing ---
+
+def _record(part: int, topic: Optional[str], text: str, source: str, source_ref: Optional[str] = None,
+            cues: Optional[List[str]] = None) -> Dict[str, Any]:
+    return {
+        "part": part,
+        "topic": topic.strip() if topic else None,
+        "text": text.strip(),
+        "cues": cues,
+        "source": source,
+        "source_ref": source_ref,
+    }
+
+
+def parse_json_source(data: Any) -> List[Dict[str, Any]]:
+    records = []
+    for item in data:
+        if "part" in item:
+            records.append(_record(int(item["part"]), item.get("topic"), item["text"], "json", item.get("source_ref"), item.get("cues")))
+            continue
+        # IELTSTests.json: one mock test per item, Part 3 follows on from the Part 2 card.
+        test_id, topic = item.get("id"), item.get("topic")
+        for question in item.get("part1", []):
+            records.append(_record(1, topic, question, "ielts_tests_json", test_id))
+        if item.get("part2"):
+            card = item["part2"]
+            records.append(_record(2, topic, card["topic"], "ielts_tests_json", test_id, card.get("cues") or []))
+        for question in item.get("part3", []):
+            records.append(_record(3, topic, question, "ielts_tests_json", test_id))
+    return records
+
+
+def parse_html_source(content: bytes) -> List[Dict[str, Any]]:
+    from scraper import parse_ielts_liz_part1  # needs beautifulsoup4, only for HTML sources
+
+    return [_record(1, topic, question, "ieltsliz_html") for topic, question in parse_ielts_liz_part1(content)]
+
+
+def parse_source(path: str) -> List[Dict[str, Any]]:
+    with open(path, "rb") as f:
+        content = f.read()
+    if path.lower().endswith(".json"):
+        return parse_json_source(json.loads(content))
+    if path.lower().endswith((".html", ".htm")):
+        return parse_html_source(content)
+    raise ValueError(f"Unsupported question source (expected .json or .html): {path}")
+
+
+# --- Ingestion ---
+
+def dedupe(records: Iterable[Dict[str, Any]], existing: set) -> Tuple[List[Dict[str, Any]], int]:
+    """Drops records already in `existing` or repeated within the batch; returns (new, skipped)."""
+    new, skipped = [], 0
+    for record in records:
+        if not record["text"] or record["part"] not in PARTS:
+            skipped += 1
+            continue
+        key = (record["part"], normalize_question(record["text"]))
+        if key in existing:
+            skipped += 1
+            continue
+        existing.add(key)
+        new.append({
+            **record,
+            "normalized_text": key[1],
+            "cues": json.dumps(record["cues"], ensure_ascii=False) if record["cues"] is not None else None,
+        })
+    return new, skipped
+
+
+async def ingest(paths: List[str]) -> Tuple[int, int]:
+    records = [record for path in paths for record in parse_source(path)]
+    async with AsyncSessionLocal() as db:
+        new, skipped = dedupe(records, await crud.get_question_keys(db))
+        if new:
+            await crud.add_questions(db, new)
+    return len(new), skipped
+
+
+# --- Serving ---
+
+class QuestionSnapshot:
+    """
+    Immutable view of the questions table. Lookups by part, topic and source
+    group (the mock test a question came from) go through precomputed index
+    arrays of positions into `questions`, and response bodies are serialized
+    once per filter and reused.
+    """
+
+    def __init__(self, questions: List[Dict[str, Any]], fingerprint: Tuple[int, int],
+                 groups: Optional[List[Optional[str]]] = None):
+        self.questions = questions
+        self.fingerprint = fingerprint
+        self.part_index: Dict[int, array] = {part: array("I") for part in PARTS}
+        self.topic_index: Dict[int, Dict[str, array]] = {part: {} for part in PARTS}
+        self.group_index: Dict[int, Dict[str, array]] = {part: {} for part in PARTS}
+        self.groups = groups or [None] * len(questions)
+        for position, question in enumerate(questions):
+            part = question["part"]
+            self.part_index[part].append(position)
+            self.topic_index[part].setdefault(topic_key(question["topic"]), array("I")).append(position)
+            if self.groups[position]:
+                self.group_index[part].setdefault(self.groups[position], array("I")).append(position)
+        self.topic_keys: Dict[int, List[str]] = {part: list(self.topic_index[part]) for part in PARTS}
+
+        digest = hashlib.sha256(json.dumps(questions, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+        self.version = digest.hexdigest()[:20]
+        self.etag = f'"{self.version}"'
+        self._bodies: Dict[Tuple[Optional[int], Optional[str]], bytes] = {}
+        self._empty_body = self._serialize([])
+
+    def select(self, part: Optional[int] = None, topic: Optional[str] = None) -> List[Dict[str, Any]]:
+        if part is None and topic is None:
+            return self.questions
+        parts = [part] if part is not None else list(PARTS)
+        positions = []
+        for p in parts:
+            positions.extend(self.topic_index[p].get(topic_key(topic), ()) if topic is not None else self.part_index[p])
+        return [self.questions[position] for position in sorted(positions)]
+
+    def body(self, part: Optional[int] = None, topic: Optional[str] = None) -> bytes:
+        key = (part, topic_key(topic) if topic is not None else None)
+        body = self._bodies.get(key)
+        if body is None:
+            parts = [part] if part is not None else list(PARTS)
+            if key[1] is not None and not any(key[1] in self.topic_index[p] for p in parts):
+                # Unknown topics share one empty body, so arbitrary query strings can't grow the cache.
+                return self._empty_body
+            body = self._serialize(self.select(part, topic))
+            self._bodies[key] = body
+        return body
+
+    def _serialize(self, questions: List[Dict[str, Any]]) -> bytes:
+        return json.dumps(
+            {"version": self.version, "questions": questions},
+            ensure_ascii=False, separators=(",", ":"),
+        ).encode("utf-8")
+
+
+def _question_dict(question) -> Dict[str, Any]:
+    return {
+        "id": question.id,
+        "part": question.part,
+        "topic": question.topic,
+        "text": question.text,
+        "cues": json.loads(question.cues) if question.cues else None,
+    }
+
+
+class QuestionBank:
+    """
+    Holds the current QuestionSnapshot. Ingestion runs out of process, so the
+    table fingerprint is re-checked at most every QUESTION_BANK_REFRESH_SECONDS
+    and the snapshot swapped when it changes.
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self.snapshot = QuestionSnapshot([], (0, 0))
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self.reloads = 0
+
+    async def load(self) -> None:
+        async with AsyncSessionLocal() as db:
+            fingerprint = await crud.get_question_bank_fingerprint(db)
+            questions = await crud.get_questions(db)
+        self.snapshot = QuestionSnapshot(
+            [_question_dict(q) for q in questions],
+            fingerprint,
+            [f"{q.source}:{q.source_ref}" if q.source_ref else None for q in questions],
+        )
+        self._checked_at = time.monotonic()
+        self.reloads += 1
+        if questions:
+            print(f"✅ QUESTION BANK INFO: Loaded {len(questions)} questions (version {self.snapshot.version}).")
+        else:
+            print("⚠️ QUESTION BANK WARNING: No questions loaded. Run `python question_bank.py <sources>` to ingest.")
+
+    async def current(self) -> QuestionSnapshot:
+        if time.monotonic() - self._checked_at < self.refresh_seconds:
+            return self.snapshot
+        async with self._lock:
+            if time.monotonic() - self._checked_at >= self.refresh_seconds:
+                async with AsyncSessionLocal() as db:
+                    fingerprint = await crud.get_question_bank_fingerprint(db)
+                self._checked_at = time.monotonic()
+                if fingerprint != self.snapshot.fingerprint:
+                    await self.load()
+        return self.snapshot
+
+    def stats(self) -> dict:
+        return {"questions": len(self.snapshot.questions), "reloads": self.reloads}
+
+
+question_bank = QuestionBank(QUESTION_BANK_REFRESH_SECONDS)
+
+
+async def _main(paths: List[str]) -> int:
+    from database import run_migrations
+
+    await run_migrations()
+    inserted, skipped = await ingest(paths)
+    print(f"✅ QUESTION BANK INFO: Ingested {inserted} new questions, skipped {skipped} duplicate or empty records.")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest saved IELTS question sources into the question bank.")
+    parser.add_argument("paths", nargs="+", help=".json or .html files")
+    sys.exit(asyncio.run(_main(parser.parse_args().paths)))
@@ -0,0 +1,221 @@
+# rate_limiter.py
+
+import ipaddress
+import math
+import os
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Request
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+# "memory" (per process) or "redis" (shared by every worker; needs REDIS_URL and the redis package).
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_SWEEP_SECONDS = float(os.getenv("RATE_LIMIT_SWEEP_SECONDS", "60"))
+# Proxies whose X-Forwarded-For is believed: comma-separated IPs or CIDRs, or "*"
+# for any peer (platform routers with unpredictable addresses). Empty means the
+# TCP peer is the client. Behind a proxy this MUST be set, or every user shares
+# the proxy's IP and its login/register limits. The Dockerfile sets it.
+TRUSTED_PROXIES = os.getenv("TRUSTED_PROXIES", "")
+# Older switch, same as TRUSTED_PROXIES=*.
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "false").lower() in ("1", "true", "yes")
+
+
+def _parse_proxies(raw: str) -> Tuple[bool, List]:
+    trust_any, networks = TRUST_FORWARDED_FOR, []
+    for item in raw.split(","):
+        item = item.strip()
+        if item == "*":
+            trust_any = True
+        elif item:
+            networks.append(ipaddress.ip_network(item, strict=False))
+    return trust_any, networks
+
+
+TRUST_ANY_PEER, TRUSTED_PROXY_NETWORKS = _parse_proxies(TRUSTED_PROXIES)
+
+
+def _parse_limit(env_name: str, default: str) -> Tuple[int, float]:
+    """Reads "<requests>/<seconds>", e.g. RATE_LIMIT_LOGIN_IP=20/60."""
+    count, _, seconds = os.getenv(env_name, default).partition("/")
+    return int(count), float(seconds)
+
+# policy -> scope -> (burst capacity, seconds to refill it completely)
+RATE_LIMITS: Dict[str, Dict[str, Tuple[int, float]]] = {
+    "login": {
+        "ip": _parse_limit("RATE_LIMIT_LOGIN_IP", "20/60"),
+        "email": _parse_limit("RATE_LIMIT_LOGIN_EMAIL", "10/300"),
+    },
+    "register": {
+        "ip": _parse_limit("RATE_LIMIT_REGISTER_IP", "10/600"),
+        "email": _parse_limit("RATE_LIMIT_REGISTER_EMAIL", "3/600"),
+    },
+    "resend_verification": {
+        "ip": _parse_limit("RATE_LIMIT_RESEND_IP", "10/600"),
+        "email": _parse_limit("RATE_LIMIT_RESEND_EMAIL", "3/600"),
+    },
+    "send_reset_code": {
+        "ip": _parse_limit("RATE_LIMIT_RESET_IP", "10/600"),
+        "email": _parse_limit("RATE_LIMIT_RESET_EMAIL", "3/600"),
+    },
+}
+
+
+class RateLimitExceeded(Exception):
+    """Raised before any expensive work; surfaced as 429 with Retry-After."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Too many requests. Please try again later.")
+        self.retry_after = retry_after
+
+
+class MemoryRateLimitBackend:
+    """
+    Token buckets in a dict. Buckets that have refilled completely carry no
+    information, so a periodic sweep drops them to keep memory bounded by the
+    number of recently active keys.
+    """
+
+    def __init__(self, sweep_seconds: float):
+        self.sweep_seconds = sweep_seconds
+        # key -> (tokens, updated, refill rate per second, capacity)
+        self._buckets: Dict[str, Tuple[float, float, float, int]] = {}
+        self._last_sweep = time.monotonic()
+
+    async def hit(self, key: str, capacity: int, refill_per_second: float) -> float:
+        now = time.monotonic()
+        self._maybe_sweep(now)
+        tokens, updated, _, _ = self._buckets.get(key, (capacity, now, refill_per_second, capacity))
+        tokens = min(capacity, tokens + (now - updated) * refill_per_second)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now, refill_per_second, capacity)
+            return 0.0
+        self._buckets[key] = (tokens, now, refill_per_second, capacity)
+        return (1 - tokens) / refill_per_second
+
+    def _maybe_sweep(self, now: float) -> None:
+        if now - self._last_sweep < self.sweep_seconds:
+            return
+        self._last_sweep = now
+        full = [
+            key for key, (tokens, updated, rate, capacity) in self._buckets.items()
+            if tokens + (now - updated) * rate >= capacity
+        ]
+        for key in full:
+            del self._buckets[key]
+
+    def size(self) -> int:
+        return len(self._buckets)
+
+
+# Same bucket arithmetic as MemoryRateLimitBackend, done atomically inside Redis.
+_REDIS_TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local retry_after = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(retry_after)
+"""
+
+
+class RedisRateLimitBackend:
+    """Shared buckets for multi-worker deployments. Keys expire once they would be full."""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self._script = self._redis.register_script(_REDIS_TOKEN_BUCKET)
+
+    async def hit(self, key: str, capacity: int, refill_per_second: float) -> float:
+        retry_after = await self._script(keys=[f"ratelimit:{key}"], args=[capacity, refill_per_second, time.time()])
+        return float(retry_after)
+
+    def size(self) -> int:
+        return -1  # not tracked locally
+
+
+class RateLimiter:
+    def __init__(self, backend, limits: Dict[str, Dict[str, Tuple[int, float]]], enabled: bool = True):
+        self.backend = backend
+        self.limits = limits
+        self.enabled = enabled
+        self.rejected: Counter = Counter()
+
+    async def check(self, policy: str, ip: Optional[str] = None, email: Optional[str] = None) -> None:
+        """
+        Charges one request to each scope of `policy` and raises RateLimitExceeded
+        as soon as one is out of tokens. Call it first thing in the handler.
+        """
+        if not self.enabled:
+            return
+        subjects = {"ip": ip, "email": email.strip().lower() if email else None}
+        for scope, (capacity, period) in self.limits[policy].items():
+            subject = subjects.get(scope)
+            if not subject:
+                continue
+            try:
+                retry_after = await self.backend.hit(f"{policy}:{scope}:{subject}", capacity, capacity / period)
+            except Exception as e:
+                # A broken shared backend must not lock everyone out of logging in.
+                print(f"⚠️ RATE LIMITER WARNING: Backend unavailable, allowing request: {e}")
+                return
+            if retry_after > 0:
+                self.rejected[f"{policy}:{scope}"] += 1
+                raise RateLimitExceeded(retry_after)
+
+    def stats(self) -> dict:
+        return {"tracked_keys": self.backend.size(), "rejected": dict(self.rejected)}
+
+
+def _is_trusted_proxy(ip: str) -> bool:
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXY_NETWORKS)
+
+
+def client_ip(request: Request) -> Optional[str]:
+    """
+    The TCP peer, unless it is a trusted proxy: then X-Forwarded-For is read
+    from the right, skipping trusted proxies, and the first other hop is the
+    client. Hops left of it were supplied by the client and are ignored.
+    """
+    peer = request.client.host if request.client else None
+    if peer is None or not (TRUST_ANY_PEER or _is_trusted_proxy(peer)):
+        return peer
+    hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted_proxy(hop):
+            return hop
+    return hops[0] if hops else peer
+
+
+def retry_after_header(exc: RateLimitExceeded) -> str:
+    return str(max(1, math.ceil(exc.retry_after)))
+
+
+def _build_backend():
+    if RATE_LIMIT_BACKEND == "redis":
+        try:
+            return RedisRateLimitBackend(RATE_LIMIT_REDIS_URL)
+        except ImportError:
+            print("⚠️ RATE LIMITER WARNING: redis package not installed, using the in-process backend.")
+    return MemoryRateLimitBackend(RATE_LIMIT_SWEEP_SECONDS)
+
+
+rate_limiter = RateLimiter(_build_backend(), RATE_LIMITS, enabled=RATE_LIMIT_ENABLED)
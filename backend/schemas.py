@@ -1,6 +1,6 @@
 # schemas.py
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
@@ -96,10 +96,65 @@ class FeedbackResponse(BaseModel):
     pronunciation_score: int
     general_summary: str
     answer_analyses: List[AnswerAnalysis]
+    model_used: Optional[str] = None
+
+    class Config:
+        protected_namespaces = ()
+
+class FeedbackJobRead(BaseModel):
+    job_id: str
+    status: str
+    result: Optional[FeedbackResponse] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class ConversationSummary(BaseModel):
+    id: int
+    created_at: datetime
+    turn_count: int
+    topics: List[str]
+    parts: List[int]
+    overall_band_score: Optional[float] = None
+
+class ConversationPage(BaseModel):
+    items: List[ConversationSummary]
+    next_cursor: Optional[str] = None
+
+class QuestionRead(BaseModel):
+    id: int
+    part: int
+    topic: Optional[str] = None
+    text: str
+    cues: Optional[List[str]] = None  # Part 2 cue card points
+
+class QuestionBankRead(BaseModel):
+    version: str
+    questions: List[QuestionRead]
+
+class PracticeSession(BaseModel):
+    version: str  # question bank version the session was drawn from
+    part1: List[QuestionRead]
+    part2: Optional[QuestionRead] = None
+    part3: List[QuestionRead]
+
+class ExaminerSessionRead(BaseModel):
+    session_id: str
+    turn_count: int
+
+class ExaminerMessage(BaseModel):
+    message: str = Field(..., min_length=1, max_length=4000)
+
+class ExaminerReply(BaseModel):
+    session_id: str
+    reply: str
+    turn_count: int
 
 class ConversationCreate(BaseModel):
-    conversation: Dict[str, Any]
+    conversation: List[QuestionAnswerPairDTO]
+    overall_band_score: Optional[float] = None
     
 class TTSRequest(BaseModel):
     text: str
     voice: Optional[str] = None
+    stream: bool = False
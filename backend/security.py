@@ -1,10 +1,15 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dotenv import load_dotenv
 
+from metrics import track_dependency
+
 load_dotenv()
 
 # JWT Configuration
@@ -12,19 +17,133 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
-# Password hashing configuration
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing configuration. Changing BCRYPT_ROUNDS makes existing hashes
+# "need update"; they are re-hashed transparently on the next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "10"))
+# "process" keeps bcrypt entirely off the server process; "thread" avoids the worker startup cost.
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "process").lower()
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    """Verify a password against its hash. Blocking; async code should use verify_and_update_password."""
+    with track_dependency("bcrypt", "verify"):
+        return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Generate password hash."""
+    """Generate password hash. Blocking; async code should use hash_password."""
+    with track_dependency("bcrypt", "hash"):
+        return pwd_context.hash(password)
+
+def _hash_in_worker(password: str) -> str:
     return pwd_context.hash(password)
 
+def _verify_in_worker(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+class PasswordHasherSaturated(Exception):
+    """Raised when too many hashes are already waiting; surfaced as 503."""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a small dedicated pool so a login burst can't block the event
+    loop. At most `max_workers` hashes run at once, at most `max_queue` wait,
+    and a waiter gives up after `queue_timeout` seconds.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, queue_timeout: float, use_processes: bool):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.use_processes = use_processes
+        self._executor = None
+        self._slots = asyncio.Semaphore(max_workers)
+
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.use_processes:
+                # spawn, not fork: the server process already runs SDK and executor threads.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def run(self, operation: str, fn, *args):
+        if self._slots.locked() and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise PasswordHasherSaturated("Too many sign-in requests right now. Please try again.")
+
+        async with track_dependency("bcrypt", operation):
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise PasswordHasherSaturated("Timed out waiting for a password hashing worker.")
+            finally:
+                self.queued -= 1
+
+            self.in_flight += 1
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._get_executor(), fn, *args)
+            finally:
+                self.in_flight -= 1
+                self.completed += 1
+                self._slots.release()
+
+    async def warm_up(self) -> None:
+        """Starts the worker processes so the first login doesn't pay for the spawn."""
+        await asyncio.gather(*(self.run("hash", _hash_in_worker, "warm-up") for _ in range(self.max_workers)))
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "queue_depth": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(
+    PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE, PASSWORD_HASH_QUEUE_TIMEOUT,
+    use_processes=PASSWORD_HASH_EXECUTOR == "process",
+)
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.run("hash", _hash_in_worker, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    (valid, new_hash). `new_hash` is set when the stored hash uses outdated
+    parameters (e.g. a different BCRYPT_ROUNDS) and should replace it.
+    """
+    valid, new_hash = await password_hasher.run("verify", _verify_in_worker, plain_password, hashed_password)
+    if new_hash:
+        password_hasher.rehashed += 1
+    return valid, new_hash
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
-    """Create a new JWT access token."""
+    """Create a new JWT access token. Include "ver" (the user's token_version) so it can be revoked."""
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
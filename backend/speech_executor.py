@@ -0,0 +1,96 @@
+# speech_executor.py
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+SPEECH_EXECUTOR_WORKERS = int(os.getenv("SPEECH_EXECUTOR_WORKERS", "16"))
+SPEECH_EXECUTOR_MAX_QUEUE = int(os.getenv("SPEECH_EXECUTOR_MAX_QUEUE", "32"))
+SPEECH_EXECUTOR_QUEUE_TIMEOUT = float(os.getenv("SPEECH_EXECUTOR_QUEUE_TIMEOUT", "5"))
+
+
+class SpeechExecutorSaturated(Exception):
+    """Raised when the speech executor cannot accept more work; surfaced as 503."""
+
+
+class SpeechExecutor:
+    """
+    Runs blocking Azure Speech SDK calls on a dedicated thread pool so they can't
+    exhaust the default executor shared by the rest of the app. At most
+    `max_workers` calls run at once, at most `max_queue` wait for a slot, and a
+    waiter gives up after `queue_timeout` seconds.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, queue_timeout: float):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speech")
+        self._slots = asyncio.Semaphore(max_workers)
+
+        self.queued = 0
+        self.in_flight = 0
+        self.started = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self._slots.locked() and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise SpeechExecutorSaturated("Speech service is at capacity.")
+
+        self.queued += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise SpeechExecutorSaturated("Timed out waiting for a speech worker.")
+        finally:
+            self.queued -= 1
+
+        waited = time.monotonic() - started
+        self.started += 1
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+        self.in_flight += 1
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        except BaseException:
+            self._finished(None)
+            raise
+        # The slot follows the worker thread, not the awaiting coroutine: a cancelled
+        # caller can't stop a blocking SDK call, so the slot is only freed once it returns.
+        future.add_done_callback(self._finished)
+        return await asyncio.shield(future)
+
+    def _finished(self, future: Optional[asyncio.Future]) -> None:
+        if future is not None and not future.cancelled():
+            future.exception()  # retrieved here in case the caller was cancelled
+        self.in_flight -= 1
+        self.completed += 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "queue_depth": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_seconds": self.total_wait_seconds / self.started if self.started else 0.0,
+            "max_wait_seconds": self.max_wait_seconds,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+speech_executor = SpeechExecutor(
+    SPEECH_EXECUTOR_WORKERS, SPEECH_EXECUTOR_MAX_QUEUE, SPEECH_EXECUTOR_QUEUE_TIMEOUT
+)
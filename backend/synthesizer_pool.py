@@ -0,0 +1,182 @@
+# synthesizer_pool.py
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+import azure.cognitiveservices.speech as speechsdk
+
+from speech_executor import speech_executor
+
+TTS_POOL_SIZE_PER_VOICE = int(os.getenv("TTS_POOL_SIZE_PER_VOICE", "4"))
+TTS_POOL_WARM_PER_VOICE = int(os.getenv("TTS_POOL_WARM_PER_VOICE", "1"))
+
+
+class PooledSynthesizer:
+    """A synthesizer together with its pre-opened connection and health flag."""
+
+    def __init__(self, synthesizer: speechsdk.SpeechSynthesizer, connection: speechsdk.Connection):
+        self.synthesizer = synthesizer
+        self.connection = connection
+        self.healthy = True
+        # The SDK reports dropped websockets here; such instances are not reused.
+        connection.disconnected.connect(self._on_disconnected)
+
+    def _on_disconnected(self, evt):
+        self.healthy = False
+
+    def mark_unhealthy(self) -> None:
+        self.healthy = False
+
+    def reset_handlers(self) -> None:
+        """Drops per-request event callbacks before the instance goes back to the pool."""
+        for signal in (
+            self.synthesizer.synthesizing,
+            self.synthesizer.synthesis_completed,
+            self.synthesizer.synthesis_canceled,
+        ):
+            signal.disconnect_all()
+
+    def close(self) -> None:
+        try:
+            self.reset_handlers()
+            self.connection.close()
+        except Exception as e:
+            print(f"⚠️ AZURE TTS POOL WARNING: Failed to close synthesizer: {e}")
+
+
+class _VoicePool:
+    def __init__(self, speech_config: speechsdk.SpeechConfig, max_size: int):
+        self.speech_config = speech_config
+        self.max_size = max_size
+        self.idle: List[PooledSynthesizer] = []
+        self.size = 0
+        self.available = asyncio.Condition()
+
+
+class SynthesizerPool:
+    """
+    Keeps a bounded set of pre-connected synthesizers per voice. Each voice has
+    its own SpeechConfig, so concurrent requests can never swap voices.
+    """
+
+    def __init__(self, subscription: str, region: str, output_format, max_per_voice: int):
+        self.subscription = subscription
+        self.region = region
+        self.output_format = output_format
+        self.max_per_voice = max_per_voice
+        self._pools: Dict[str, _VoicePool] = {}
+
+        self.created = 0
+        self.evicted = 0
+
+    def _pool_for(self, voice_name: str) -> _VoicePool:
+        pool = self._pools.get(voice_name)
+        if pool is None:
+            config = speechsdk.SpeechConfig(subscription=self.subscription, region=self.region)
+            config.set_speech_synthesis_output_format(self.output_format)
+            config.speech_synthesis_voice_name = voice_name
+            pool = _VoicePool(config, self.max_per_voice)
+            self._pools[voice_name] = pool
+        return pool
+
+    @staticmethod
+    def _connect(speech_config: speechsdk.SpeechConfig) -> PooledSynthesizer:
+        synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+        connection = speechsdk.Connection.from_speech_synthesizer(synthesizer)
+        # Open the websocket up front so the first request skips the handshake.
+        connection.open(True)
+        return PooledSynthesizer(synthesizer, connection)
+
+    async def _create(self, pool: _VoicePool) -> PooledSynthesizer:
+        try:
+            item = await speech_executor.run(self._connect, pool.speech_config)
+        except BaseException:
+            # Includes cancellation (a client leaving mid-connect): the slot must come back.
+            async with pool.available:
+                pool.size -= 1
+                pool.available.notify()
+            raise
+        self.created += 1
+        return item
+
+    async def _acquire(self, voice_name: str) -> PooledSynthesizer:
+        pool = self._pool_for(voice_name)
+        async with pool.available:
+            while True:
+                while pool.idle:
+                    item = pool.idle.pop()
+                    if item.healthy:
+                        return item
+                    self._discard(pool, item)
+                if pool.size < pool.max_size:
+                    pool.size += 1
+                    break
+                await pool.available.wait()
+        return await self._create(pool)
+
+    def _discard(self, pool: _VoicePool, item: PooledSynthesizer) -> None:
+        pool.size -= 1
+        self.evicted += 1
+        item.close()
+
+    async def _release(self, voice_name: str, item: PooledSynthesizer) -> None:
+        pool = self._pools[voice_name]
+        async with pool.available:
+            if item.healthy:
+                item.reset_handlers()
+                pool.idle.append(item)
+            else:
+                print(f"⚠️ AZURE TTS POOL WARNING: Evicting unhealthy synthesizer for {voice_name}.")
+                self._discard(pool, item)
+            pool.available.notify()
+
+    @asynccontextmanager
+    async def checkout(self, voice_name: str):
+        """Borrows a synthesizer for `voice_name`, waiting if the voice is at capacity."""
+        item = await self._acquire(voice_name)
+        try:
+            yield item
+        except (GeneratorExit, asyncio.CancelledError):
+            # The caller went away; callers stop the synthesis before letting go, so
+            # the instance is still good. Real SDK failures are handled below.
+            raise
+        except BaseException:
+            item.mark_unhealthy()
+            raise
+        finally:
+            await self._release(voice_name, item)
+
+    async def warm_up(self, voice_names: List[str], per_voice: int) -> None:
+        """Pre-connects `per_voice` synthesizers for each voice at startup."""
+        for voice_name in voice_names:
+            pool = self._pool_for(voice_name)
+            for _ in range(min(per_voice, pool.max_size)):
+                async with pool.available:
+                    if pool.size >= pool.max_size:
+                        break
+                    pool.size += 1
+                try:
+                    item = await self._create(pool)
+                except Exception as e:
+                    print(f"⚠️ AZURE TTS POOL WARNING: Warm-up failed for {voice_name}: {e}")
+                    break
+                await self._release(voice_name, item)
+
+    def stats(self) -> dict:
+        return {
+            "created": self.created,
+            "evicted": self.evicted,
+            "voices": {
+                voice: {"size": pool.size, "idle": len(pool.idle)}
+                for voice, pool in self._pools.items()
+            },
+        }
+
+    def close(self) -> None:
+        for pool in self._pools.values():
+            for item in pool.idle:
+                item.close()
+            pool.idle.clear()
+            pool.size = 0
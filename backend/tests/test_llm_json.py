@@ -0,0 +1,56 @@
+# tests/test_llm_json.py
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_json import extract_json_object, repair_json_text, salvage_feedback  # noqa: E402
+
+
+def _analysis(question):
+    return {
+        "question": question,
+        "answer": "An answer.",
+        "grammar_feedback": [],
+        "vocabulary_feedback": [],
+        "fluency_feedback": "Fluent.",
+    }
+
+
+def test_missing_value_keeps_valid_prefix():
+    assert extract_json_object('{"a": {"b": }') == {"a": {}}
+
+
+def test_unescaped_quote_before_comma_keeps_valid_prefix():
+    data = extract_json_object('{"s": "he said "hi", then left", "n": 7}')
+    assert data == {"s": 'he said "hi'}
+
+
+def test_truncated_trailing_scalar_is_dropped():
+    assert extract_json_object('{"x": 1, "y": 2') == {"x": 1}
+    assert extract_json_object('{"x": 1, "y": tru') == {"x": 1}
+
+
+def test_common_glitches_are_repaired():
+    assert extract_json_object('Sure! {"a": [1, 2,], "b": "line\nbreak"} Hope this helps.') == {
+        "a": [1, 2],
+        "b": "line\nbreak",
+    }
+    assert extract_json_object("no json here") == {}
+    assert repair_json_text("no json here") is None
+
+
+def test_damaged_analysis_only_invalidates_itself_and_what_follows():
+    good = [json.dumps(_analysis(f"Q{i}")) for i in range(2)]
+    text = (
+        '{"overall_band_score": 6.5, "fluency_score": 6, "lexical_score": 7, "grammar_score": 6, '
+        '"pronunciation_score": 7, "general_summary": "Good.", "answer_analyses": ['
+        + ", ".join(good)
+        + ', {"question": "Q2", "answer": "I said "no", twice", "grammar_feedback": []}, '
+        + json.dumps(_analysis("Q3"))
+        + "]}"
+    )
+    scores, analyses = salvage_feedback(extract_json_object(text))
+    assert scores["overall_band_score"] == 6.5
+    assert [a["question"] if a else None for a in analyses] == ["Q0", "Q1", None]
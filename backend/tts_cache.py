@@ -0,0 +1,204 @@
+# tts_cache.py
+
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+TTS_CACHE_MEMORY_BYTES = int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+TTS_CACHE_DISK_BYTES = int(os.getenv("TTS_CACHE_DISK_BYTES", str(1024 * 1024 * 1024)))
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "./tts_cache")
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "true").lower() == "true"
+# Disk eviction goes down to this fraction of the limit, so a full cache isn't rescanned on every write.
+TTS_CACHE_DISK_LOW_WATER = 0.9
+
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace so trivially different prompts share one cache entry."""
+    return " ".join(text.split())
+
+
+def make_cache_key(text: str, voice_name: str, output_format: str) -> str:
+    """Content address for a synthesized clip: sha256 of (normalized text, voice, format)."""
+    material = "\x1f".join([normalize_text(text), voice_name, output_format])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """
+    Two-tier audio cache. The memory tier is an LRU bounded by total bytes,
+    the disk tier keeps one file per key so entries survive restarts. The
+    disk tier's size is a running total, taken from one scan at startup and
+    updated on every write; the directory is only walked again to evict once
+    that total passes the limit.
+    """
+
+    def __init__(self, memory_limit: int, disk_limit: int, directory: Optional[str]):
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        self.directory = directory
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = asyncio.Lock()
+        # Disk writes run on worker threads; this guards the running total.
+        self._disk_lock = threading.Lock()
+        self._disk_bytes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+            except OSError as e:
+                print(f"⚠️ TTS CACHE WARNING: Disk tier disabled, cannot create {self.directory}: {e}")
+                self.directory = None
+        if self.directory:
+            self._disk_bytes = sum(size for _, size, _ in self._disk_scan())
+
+    # --- Memory tier ---
+
+    def _memory_get(self, key: str) -> Optional[bytes]:
+        audio = self._memory.get(key)
+        if audio is not None:
+            self._memory.move_to_end(key)
+        return audio
+
+    def _memory_put(self, key: str, audio: bytes) -> None:
+        if len(audio) > self.memory_limit:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.memory_limit:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.memory_evictions += 1
+
+    # --- Disk tier ---
+
+    def _path_for(self, key: str) -> str:
+        # Two-level fan-out keeps directory listings small.
+        return os.path.join(self.directory, key[:2], f"{key}.mp3")
+
+    def _disk_read(self, key: str) -> Optional[bytes]:
+        path = self._path_for(key)
+        try:
+            with open(path, "rb") as f:
+                audio = f.read()
+            os.utime(path)  # Refresh mtime so disk eviction is approximately LRU.
+            return audio
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            print(f"⚠️ TTS CACHE WARNING: Failed to read {path}: {e}")
+            return None
+
+    def _disk_write(self, key: str, audio: bytes) -> None:
+        path = self._path_for(key)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file and rename so readers never see a partial clip.
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ TTS CACHE WARNING: Failed to write {path}: {e}")
+            return
+        with self._disk_lock:
+            self._disk_bytes += len(audio) - replaced
+            if self._disk_bytes > self.disk_limit:
+                self._disk_enforce_limit()
+
+    def _disk_scan(self):
+        """(mtime, size, path) of every cached clip."""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".mp3"):
+                    continue
+                full = os.path.join(root, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, full))
+        return entries
+
+    def _disk_enforce_limit(self) -> None:
+        """Evicts the least recently used clips down to the low-water mark; resyncs the running total."""
+        entries = self._disk_scan()
+        total = sum(size for _, size, _ in entries)
+        target = self.disk_limit * TTS_CACHE_DISK_LOW_WATER
+        if total > self.disk_limit:
+            entries.sort()
+            for _, size, full in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(full)
+                    total -= size
+                    self.disk_evictions += 1
+                except OSError:
+                    continue
+        self._disk_bytes = total
+
+    # --- Public API ---
+
+    async def get(self, key: str) -> Optional[bytes]:
+        async with self._lock:
+            audio = self._memory_get(key)
+            if audio is not None:
+                self.memory_hits += 1
+                return audio
+
+        if self.directory:
+            audio = await asyncio.to_thread(self._disk_read, key)
+            if audio is not None:
+                async with self._lock:
+                    self.disk_hits += 1
+                    self._memory_put(key, audio)
+                return audio
+
+        async with self._lock:
+            self.misses += 1
+        return None
+
+    async def put(self, key: str, audio: bytes) -> None:
+        if not audio:
+            return
+        async with self._lock:
+            self._memory_put(key, audio)
+        if self.directory:
+            await asyncio.to_thread(self._disk_write, key, audio)
+
+    def stats(self) -> dict:
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_evictions": self.memory_evictions,
+            "disk_evictions": self.disk_evictions,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_bytes": self._disk_bytes,
+        }
+
+
+tts_cache: Optional[TTSCache] = (
+    TTSCache(TTS_CACHE_MEMORY_BYTES, TTS_CACHE_DISK_BYTES, TTS_CACHE_DIR or None)
+    if TTS_CACHE_ENABLED else None
+)
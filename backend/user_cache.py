@@ -0,0 +1,72 @@
+# user_cache.py
+
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import models
+
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+
+# Everything read-only endpoints need from the authenticated user. The password
+# hash is deliberately left out.
+CACHED_FIELDS = ("id", "email", "name", "is_verified", "created_at", "voice_preference", "token_version")
+
+
+class UserCache:
+    """
+    TTL + size-bounded LRU of authenticated users, keyed by token subject (email).
+    Entries are plain snapshots; `get` hands out a fresh, session-less User so
+    requests never share ORM state.
+
+    The cache is per process: writes invalidate it here, and the token_version
+    check in get_current_user bounds how long another process can serve a
+    revoked token to the TTL.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, subject: str) -> Optional[models.User]:
+        entry = self._entries.get(subject)
+        if entry is not None and entry[0] < time.monotonic():
+            del self._entries[subject]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(subject)
+        return models.User(**entry[1])
+
+    def put(self, user: models.User) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        snapshot = {field: getattr(user, field) for field in CACHED_FIELDS}
+        self._entries[user.email] = (time.monotonic() + self.ttl_seconds, snapshot)
+        self._entries.move_to_end(user.email)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, subject: str) -> None:
+        if self._entries.pop(subject, None) is not None:
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+        }
+
+
+user_cache = UserCache(USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_ENTRIES)